@@ -0,0 +1,220 @@
+#-*- coding:utf-8 -*-
+
+#---------------------------------------------------------------
+# PyNLPl - Asynchronous network utilities
+#   by Maarten van Gompel
+#   Centre for Language Studies
+#   Radboud University Nijmegen
+#   http://www.github.com/proycon/pynlpl
+#   proycon AT anaproy DOT nl
+#
+#   Generic asyncio line-based server, with a pipelining client
+#   and a connection pool. Requires Python 3.
+#
+#----------------------------------------------------------------
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import socket
+import asyncio
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LineServer(object):
+    """Asynchronous line-based server.
+
+    Every line the client sends is a request, every request gets exactly one response, in order. Clients may
+    pipeline requests (send many without waiting for the responses); all complete lines that have arrived are
+    passed to handle() as one batch and the responses are written back in a single write.
+
+    Either pass a handler, a function taking a list of requests (strings) and returning a list of responses
+    (strings, which may themselves span multiple lines), or subclass and override handle().
+    """
+
+    def __init__(self, handler=None, port=0, host='', encoding='utf-8', delimiter="\r\n", readsize=65536):
+        self.handler = handler
+        self.port = port
+        self.host = host
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.readsize = readsize
+        self.server = None
+        self.loop = None
+        self.thread = None
+
+    def handle(self, requests):
+        """Handle a batch of requests, returns a list of responses of equal length"""
+        if self.handler is None:
+            raise NotImplementedError("No handler specified")
+        return self.handler(requests)
+
+    async def handleconnection(self, reader, writer):
+        buffer = b""
+        try:
+            while True:
+                data = await reader.read(self.readsize)
+                if not data:
+                    break
+                buffer += data
+                if b"\n" not in data:
+                    continue
+                lines = buffer.split(b"\n")
+                buffer = lines.pop()
+                responses = self.handle([ line.rstrip(b"\r").decode(self.encoding) for line in lines ])
+                writer.write("".join( response + self.delimiter for response in responses ).encode(self.encoding))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """Start listening (coroutine), sets the port attribute to the actual port"""
+        self.server = await asyncio.start_server(self.handleconnection, self.host or None, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    def run(self):
+        """Start the server and serve forever (blocking)"""
+        async def serve():
+            await self.start()
+            async with self.server:
+                await self.server.serve_forever()
+        asyncio.run(serve())
+
+    def runinbackground(self):
+        """Start the server in a background thread, returns once the server is listening"""
+        started = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        def serve():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.start())
+            started.set()
+            self.loop.run_forever()
+        self.thread = threading.Thread(target=serve)
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        """Stop a server started with runinbackground()"""
+        if self.loop is not None:
+            async def shutdown():
+                self.server.close()
+                tasks = [ task for task in asyncio.all_tasks() if task is not asyncio.current_task() ]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+
+
+def singleline(lines):
+    """End-of-response test for responses consisting of a single line"""
+    return True
+
+
+class LineClient(object):
+    """Blocking client for a LineServer (or any server that sends one response per request line), with pipelining.
+
+    Requests are sent in windows of the specified size without waiting for responses, after which the
+    responses of that window are read. ``responseend`` is a function that, given the lines of a response read
+    so far, returns whether the response is complete; by default every response is a single line.
+    """
+
+    def __init__(self, host="localhost", port=12346, timeout=120, encoding='utf-8', responseend=singleline, window=1000):
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.responseend = responseend
+        self.window = window
+        self.BUFSIZE = 65536
+        self.socket = socket.socket(socket.AF_INET,socket.SOCK_STREAM) #Create the socket
+        self.socket.settimeout(timeout)
+        self.socket.connect((host, port)) #Connect to server
+        self.buffer = b""
+
+    def readline(self):
+        while b"\n" not in self.buffer:
+            data = self.socket.recv(self.BUFSIZE)
+            if not data:
+                raise IOError("Connection to server closed")
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n",1)
+        return line.rstrip(b"\r").decode(self.encoding)
+
+    def query(self, requests):
+        """Send a list of requests, returns a list of responses. Single-line responses are strings, otherwise each response is a list of lines"""
+        responses = []
+        for begin in range(0, len(requests), self.window):
+            window = requests[begin:begin+self.window]
+            self.socket.sendall("".join( request + "\r\n" for request in window ).encode(self.encoding))
+            for _ in window:
+                lines = [self.readline()]
+                while not self.responseend(lines):
+                    lines.append(self.readline())
+                responses.append(lines[0] if self.responseend is singleline else lines)
+        return responses
+
+    def close(self):
+        self.socket.close()
+
+
+class ClientPool(object):
+    """A pool of LineClient connections to the same server.
+
+    Clients can be acquired and released by multiple threads, and query() distributes a batch of requests over
+    all connections in parallel, returning the responses in order. All keyword arguments are passed to LineClient.
+    """
+
+    def __init__(self, host="localhost", port=12346, size=4, **kwargs):
+        self.size = size
+        self.clients = queue.Queue()
+        for _ in range(size):
+            self.clients.put(LineClient(host, port, **kwargs))
+        self.executor = ThreadPoolExecutor(size)
+
+    def acquire(self):
+        """Take a client from the pool (blocks until one is available)"""
+        return self.clients.get()
+
+    def release(self, client):
+        """Return a client to the pool"""
+        self.clients.put(client)
+
+    def querychunk(self, requests):
+        client = self.acquire()
+        try:
+            return client.query(requests)
+        finally:
+            self.release(client)
+
+    def query(self, requests):
+        """Send a list of requests over all connections, returns the list of responses in order"""
+        if len(requests) <= 1 or self.size == 1:
+            return self.querychunk(requests)
+        chunksize = (len(requests) + self.size - 1) // self.size
+        responses = []
+        for result in self.executor.map(self.querychunk, [ requests[i:i+chunksize] for i in range(0, len(requests), chunksize) ]):
+            responses += result
+        return responses
+
+    def close(self):
+        self.executor.shutdown()
+        while not self.clients.empty():
+            self.clients.get().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
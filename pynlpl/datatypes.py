@@ -23,7 +23,9 @@ from __future__ import absolute_import
 from pynlpl.common import u
 
 import random
-import bisect
+import heapq
+import math
+from collections import OrderedDict
 import array
 from sys import version as PYTHONVERSION
 
@@ -71,6 +73,109 @@ class FIFOQueue(Queue): #adapted from AI: A Modern Appproach : http://aima.cs.be
             self.start = 0
         return e
 
+class MinMaxHeap(object):
+    """A double-ended priority queue (min-max heap): both the smallest and the largest element can be retrieved in constant time and removed in logarithmic time.
+    Elements on even levels are smaller than all their descendants, elements on odd levels are larger than all their descendants."""
+
+    def __init__(self, data=[]):
+        self.data = list(data)
+        for i in reversed(range(len(self.data) // 2)):
+            self._trickledown(i)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        """Iterates over all elements, in no particular order"""
+        return iter(self.data)
+
+    def min(self):
+        return self.data[0]
+
+    def max(self):
+        return self.data[self._maxindex()]
+
+    def _maxindex(self):
+        if len(self.data) < 3:
+            return len(self.data) - 1
+        elif self.data[2] > self.data[1]:
+            return 2
+        else:
+            return 1
+
+    def push(self, element):
+        """Adds an element to the heap"""
+        a = self.data
+        a.append(element)
+        i = len(a) - 1
+        if i == 0:
+            return
+        parent = (i - 1) // 2
+        if ((i + 1).bit_length() & 1): #i is on a min level (level = bit_length - 1)
+            if a[parent] < a[i]:
+                a[i], a[parent] = a[parent], a[i]
+                self._bubbleup(parent, True)
+            else:
+                self._bubbleup(i, False)
+        else:
+            if a[i] < a[parent]:
+                a[i], a[parent] = a[parent], a[i]
+                self._bubbleup(parent, False)
+            else:
+                self._bubbleup(i, True)
+
+    def _bubbleup(self, i, maxlevel):
+        a = self.data
+        while i > 2:
+            grandparent = (i - 3) // 4
+            if (a[grandparent] < a[i]) if maxlevel else (a[i] < a[grandparent]):
+                a[i], a[grandparent] = a[grandparent], a[i]
+                i = grandparent
+            else:
+                break
+
+    def popmin(self):
+        """Removes and returns the smallest element"""
+        return self._remove(0)
+
+    def popmax(self):
+        """Removes and returns the largest element"""
+        return self._remove(self._maxindex())
+
+    def _remove(self, i):
+        a = self.data
+        last = a.pop()
+        if i == len(a):
+            return last
+        element = a[i]
+        a[i] = last
+        self._trickledown(i)
+        return element
+
+    def _trickledown(self, i):
+        a = self.data
+        n = len(a)
+        maxlevel = not ((i + 1).bit_length() & 1)
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            #find the smallest (or largest on max levels) of the children and grandchildren
+            m = child
+            for j in (child + 1, 2 * child + 1, 2 * child + 2, 2 * child + 3, 2 * child + 4):
+                if j < n and ((a[m] < a[j]) if maxlevel else (a[j] < a[m])):
+                    m = j
+            if not ((a[i] < a[m]) if maxlevel else (a[m] < a[i])):
+                break
+            a[i], a[m] = a[m], a[i]
+            if m <= child + 1:
+                break #m is a child, we're done
+            parent = (m - 1) // 2
+            if (a[m] < a[parent]) if maxlevel else (a[parent] < a[m]):
+                a[m], a[parent] = a[parent], a[m]
+            i = m
+
+
 class PriorityQueue(Queue): #Heavily adapted/extended, originally from AI: A Modern Appproach : http://aima.cs.berkeley.edu/python/utils.html
     """A queue in which the maximum (or minumum) element is returned first,
     as determined by either an external score function f (by default calling
@@ -81,9 +186,11 @@ class PriorityQueue(Queue): #Heavily adapted/extended, originally from AI: A Mod
     blockworse can be set to true if you want to prohibit adding worse-scoring items to the queue. Only items scoring better than the *BEST* one are added.
     blockequal can be set to false if you also want to prohibit adding equally-scoring items to the queue.
     (Both parameters default to False)
+
+    The queue is implemented as a binary heap (or a min-max heap if length is set or minimize is False), so appending and popping
+    take logarithmic time. Accessing items other than the best one by index sorts the queue once (until it is modified again).
     """
     def __init__(self, data =[], f = lambda x: x.score, minimize=False, length=0, blockworse=False, blockequal=False,duplicates=True):
-        self.data = []
         self.f = f
         self.minimize=minimize
         self.length = length
@@ -91,9 +198,77 @@ class PriorityQueue(Queue): #Heavily adapted/extended, originally from AI: A Mod
         self.blockequal=blockequal
         self.duplicates= duplicates
         self.bestscore = None
+        self.data = []
         for item in data:
             self.append(item)
 
+    @property
+    def data(self):
+        """All (score, item) tuples, sorted from lowest to highest score"""
+        if self._sorted is None:
+            self._sorted = sorted(self.heap)
+        return self._sorted
+
+    @data.setter
+    def data(self, data):
+        data = list(data)
+        if self.minimize and not self.length:
+            heapq.heapify(data)
+            self.heap = data
+        else:
+            self.heap = MinMaxHeap(data)
+        self._sorted = None
+        if not self.duplicates:
+            self.members = set()
+            try:
+                for entry in data:
+                    self.members.add(entry)
+            except TypeError: #unhashable items, fall back to a linear search
+                self.members = None
+
+    def isduplicate(self, entry):
+        if self.members is not None:
+            try:
+                return entry in self.members
+            except TypeError:
+                self.members = None
+        for e in self.heap:
+            if e[0] == entry[0] and e[1] == entry[1]:
+                return True
+        return False
+
+    def _push(self, entry):
+        if isinstance(self.heap, MinMaxHeap):
+            self.heap.push(entry)
+        else:
+            heapq.heappush(self.heap, entry)
+        if not self.duplicates and self.members is not None:
+            try:
+                self.members.add(entry)
+            except TypeError:
+                self.members = None
+
+    def _popbest(self):
+        if isinstance(self.heap, MinMaxHeap):
+            entry = self.heap.popmin() if self.minimize else self.heap.popmax()
+        else:
+            entry = heapq.heappop(self.heap)
+        self._removed(entry)
+        return entry
+
+    def _popworst(self):
+        entry = self.heap.popmax() if self.minimize else self.heap.popmin()
+        self._removed(entry)
+        return entry
+
+    def _worst(self):
+        return self.heap.max() if self.minimize else self.heap.min()
+
+    def _removed(self, entry):
+        self._sorted = None
+        if not self.duplicates and self.members is not None:
+            self.members.discard(entry)
+
     def append(self, item):
         """Adds an item to the priority queue (in the right place), returns True if successfull, False if the item was blocked (because of a bad score)"""
         f = self.f(item)
@@ -101,21 +276,20 @@ class PriorityQueue(Queue): #Heavily adapted/extended, originally from AI: A Mod
             score = f()
         else:
             score = f
+        return self._append(score, item)
 
-        if not self.duplicates:
-            for s, i in self.data:
-                if s == score and item == i:
-                    #item is a duplicate, don't add it
-                    return False
+    def _append(self, score, item):
+        if not self.duplicates and self.isduplicate((score, item)):
+            #item is a duplicate, don't add it
+            return False
 
-        if self.length and len(self.data) == self.length:
+        if self.length and len(self.heap) == self.length:
                 #Fixed-length priority queue, abort when queue is full and new item scores worst than worst scoring item.
+                worstscore = self._worst()[0]
                 if self.minimize:
-                    worstscore = self.data[-1][0]
                     if score >= worstscore:
                         return False
                 else:
-                    worstscore = self.data[0][0]
                     if score <= worstscore:
                         return False
 
@@ -131,21 +305,19 @@ class PriorityQueue(Queue): #Heavily adapted/extended, originally from AI: A Mod
                 return False
         if (self.bestscore == None) or (self.minimize and score < self.bestscore) or (not self.minimize and score > self.bestscore):
             self.bestscore = score
-        bisect.insort(self.data, (score, item))
+        self._push((score, item))
+        self._sorted = None
         if self.length:
             #fixed length queue: queue is now too long, delete worst items
-            while len(self.data) > self.length:
-                if self.minimize:
-                    del self.data[-1]
-                else:
-                    del self.data[0]
+            while len(self.heap) > self.length:
+                self._popworst()
         return True
 
     def __exists__(self, item):
         return (item in self.data)
 
     def __len__(self):
-        return len(self.data)
+        return len(self.heap)
 
     def __iter__(self):
         """Iterate over all items, in order from best to worst!"""
@@ -164,38 +336,46 @@ class PriorityQueue(Queue): #Heavily adapted/extended, originally from AI: A Mod
                 return PriorityQueue([ self.data[j][1] for j in range(*indices) ],self.f, self.minimize, self.length, self.blockworse, self.blockequal)
             else:
                 return PriorityQueue([ self.data[(-1 * j) - 1][1] for j in range(*indices) ],self.f, self.minimize, self.length, self.blockworse, self.blockequal)
+        elif i == 0 and self.heap:
+            return self._best()[1]
         else:
             if self.minimize:
                 return self.data[i][1]
             else:
                 return self.data[(-1 * i) - 1][1]
 
+    def _best(self):
+        if isinstance(self.heap, MinMaxHeap):
+            return self.heap.min() if self.minimize else self.heap.max()
+        else:
+            return self.heap[0]
+
     def pop(self):
         """Retrieve the next element in line, this will remove it from the queue"""
-        if self.minimize:
-            return self.data.pop(0)[1]
-        else:
-            return self.data.pop()[1]
+        return self._popbest()[1]
 
 
     def score(self, i):
         """Return the score for item x (cheap lookup), Item 0 is always the best item"""
-        if self.minimize:
+        if i == 0 and self.heap:
+            return self._best()[0]
+        elif self.minimize:
             return self.data[i][0]
         else:
             return self.data[(-1 * i) - 1][0]
 
     def prune(self, n):
         """prune all but the first (=best) n items"""
-        if self.minimize:
-            self.data = self.data[:n]
-        else:
-            self.data = self.data[-1 * n:]
+        if n < len(self.heap):
+            if self.minimize:
+                self.data = heapq.nsmallest(n, self.heap)
+            else:
+                self.data = heapq.nlargest(n, self.heap)
 
 
     def randomprune(self,n):
         """prune down to n items at random, disregarding their score"""
-        self.data = random.sample(self.data, n)
+        self.data = random.sample(list(self.heap), n)
 
     def stochasticprune(self,n):
         """prune down to n items, chance of an item being pruned is reverse proportional to its score"""
@@ -214,19 +394,95 @@ class PriorityQueue(Queue): #Heavily adapted/extended, originally from AI: A Mod
                 f = lambda x: x[0] < score
             else:
                 f = lambda x: x[0] > score
-        self.data = filter(f, self.data)
+        self.data = filter(f, self.heap)
 
     def __eq__(self, other):
         return (self.data == other.data) and (self.minimize == other.minimize)
 
+    def __add__(self, other):
+        """Priority queues can be added up, as long as they all have minimize or maximize (rather than mixed). In case of fixed-length queues, the FIRST queue in the operation will be authorative for the fixed lengthness of the result! Items keep the score they had in their queue."""
+        assert (isinstance(other, PriorityQueue) and self.minimize == other.minimize)
+        pq = PriorityQueue([], self.f, self.minimize, self.length, self.blockworse, self.blockequal, self.duplicates)
+        for score, item in sorted(list(self.heap) + list(other.heap), reverse=self.minimize): #worst first, so blockworse does not reject the items that were already accepted
+            pq._append(score, item)
+        return pq
+
 
     def __repr__(self):
         return repr(self.data)
 
-    def __add__(self, other):
-        """Priority queues can be added up, as long as they all have minimize or maximize (rather than mixed). In case of fixed-length queues, the FIRST queue in the operation will be authorative for the fixed lengthness of the result!"""
-        assert (isinstance(other, PriorityQueue) and self.minimize == other.minimize)
-        return PriorityQueue(self.data + other.data, self.f, self.minimize, self.length, self.blockworse, self.blockequal)
+
+class LRUSet(object):
+    """A set of bounded size, when full the least recently added or queried key is evicted"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def add(self, key):
+        if key in self.data:
+            del self.data[key]
+        elif len(self.data) >= self.maxsize:
+            self.data.popitem(last=False)
+        self.data[key] = True
+
+    def __contains__(self, key):
+        if key in self.data:
+            #mark as recently used
+            del self.data[key]
+            self.data[key] = True
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+
+
+class BloomFilter(object):
+    """A Bloom filter: a set of fixed memory size that answers membership queries with possible false positives (but no false negatives).
+    The size is computed from the expected number of keys (capacity) and the desired false positive rate at that capacity. Keys must be hashable."""
+
+    def __init__(self, capacity, errorrate=0.001):
+        self.capacity = capacity
+        self.errorrate = errorrate
+        self.size = max(8, int(math.ceil(-capacity * math.log(errorrate) / (math.log(2) ** 2)))) #number of bits
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def indices(self, key):
+        x = (hash(key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF #spread the bits of the hash
+        h1 = x & 0xFFFFFFFF
+        h2 = (x >> 32) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key):
+        new = False
+        for i in self.indices(key):
+            if not self.bits[i >> 3] & (1 << (i & 7)):
+                self.bits[i >> 3] |= (1 << (i & 7))
+                new = True
+        if new:
+            self.count += 1
+
+    def __contains__(self, key):
+        for i in self.indices(key):
+            if not self.bits[i >> 3] & (1 << (i & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        """Number of keys added (approximate, keys that collide with earlier ones are not counted)"""
+        return self.count
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
+
 
 class Tree(object):
     """Simple tree structure. Nodes are themselves trees."""
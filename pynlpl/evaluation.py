@@ -198,6 +198,14 @@ class ClassEvaluation(object):
         self.classes.add(observation)
         self.computed = False
 
+    def __add__(self, other):
+        """Multiple evaluations (e.g. over different parts of a corpus) can be added together"""
+        assert isinstance(other, ClassEvaluation)
+        missing = dict(self.missing)
+        for cls, count in other.missing.items():
+            missing[cls] = missing.get(cls,0) + count
+        return self.__class__(self.goals + other.goals, self.observations + other.observations, missing, self.encoding)
+
     def precision(self, cls=None, macro=False):
         if not self.computed: self.compute()
         if cls:
@@ -15,7 +15,7 @@
 
 from __future__ import print_function, unicode_literals, division, absolute_import
 
-from pynlpl.fsa import State, NFA
+from pynlpl.fsa import State, NFA, DFA
 import re
 import sys
 
@@ -87,6 +87,7 @@ class TokenExpression(object):
     def __init__(self, attribexprs=[], interval=None):
         self.attribexprs = attribexprs
         self.interval = interval
+        self.compiled = None #list of (annotation type, negate, compiled regular expression), see compile()
 
     @staticmethod
     def parse(s,i):
@@ -186,9 +187,10 @@ class TokenExpression(object):
             return state
 
 
-    def match(self, value):
-        match = False
-        for _, attribexpr in enumerate(self):
+    def compile(self):
+        """Compiles the regular expressions of all attribute expressions (done only once)"""
+        self.compiled = []
+        for attribexpr in self:
             annottype = attribexpr.attribute
             if annottype == 'text': annottype = 'word'
             if attribexpr.operator == "!=":
@@ -202,6 +204,13 @@ class TokenExpression(object):
                 expr = re.compile("^(" + "|".join(attribexpr.valueexpr) + ")$")
             else:
                 expr = re.compile("^" + attribexpr.valueexpr[0] + '$')
+            self.compiled.append( (annottype, negate, expr) )
+        return self.compiled
+
+    def match(self, value):
+        if self.compiled is None:
+            self.compile()
+        for annottype, negate, expr in self.compiled:
             match = (expr.match(value[annottype]) is not None)
             if negate:
                 match = not match
@@ -214,6 +223,7 @@ class TokenExpression(object):
 class Query(object):
     def __init__(self, s):
         self.tokenexprs = []
+        self._dfa = None #compiled automaton, see dfa()
         i = 0
         l = len(s)
         while i < l:
@@ -242,19 +252,29 @@ class Query(object):
             nextstate = state
         return NFA(state)
 
+    def dfa(self):
+        """Returns the DFA for the expression, compiled once and reused for all subsequent executions"""
+        if self._dfa is None:
+            self._dfa = DFA(self.nfa())
+        return self._dfa
 
     def __call__(self, tokens, debug=False):
-        """Execute the CQL expression, pass a list of tokens/annotations using keyword arguments: word, pos, lemma, etc"""
+        """Execute the CQL expression, pass a list of tokens/annotations using keyword arguments: word, pos, lemma, etc. Returns all matches (lists of tokens), including overlapping ones"""
 
         if not tokens:
             raise Exception("Pass a list of tokens/annotation using keyword arguments! (word,pos,lemma, or others)")
 
-        #convert the expression into an NFA
-        nfa = self.nfa()
+        dfa = self.dfa()
         if debug:
-            print(repr(nfa), file=sys.stderr)
+            print(repr(dfa.nfa), file=sys.stderr)
+
+        return list(dfa.find(tokens))
 
-        return list(nfa.find(tokens,debug))
+    def batch(self, sentences):
+        """Execute the CQL expression on multiple sentences (lists of tokens/annotations, see __call__), with one compiled automaton. Yields the list of matches for each sentence"""
+        dfa = self.dfa()
+        for tokens in sentences:
+            yield list(dfa.find(tokens))
 
 
 
@@ -41,6 +41,14 @@ import multiprocessing
 import bz2
 import gzip
 import random
+import sqlite3
+import array
+import struct
+import json
+import gc
+import time
+import traceback
+import operator
 
 
 
@@ -111,12 +119,30 @@ for ordinal in range(0x20):
 class Mode:
     MEMORY = 0 #The entire FoLiA structure will be loaded into memory. This is the default and is required for any kind of document manipulation.
     XPATH = 1 #The full XML structure will be loaded into memory, but conversion to FoLiA objects occurs only upon querying. The full power of XPath is available.
+    LAZY = 2 #The full XML structure will be loaded into memory, texts, divisions and paragraphs are converted to FoLiA objects but their contents are only converted upon first access.
 
 class AnnotatorType:
     UNSET = None
     AUTO = "auto"
     MANUAL = "manual"
 
+class BinaryCode:
+    """Type codes of values in the binary representation of a document (see :meth:`Document.binary`)"""
+    STRING = 0
+    CHILD = 1 #element owned by the referring element
+    ELEMENT = 2 #reference to an element elsewhere in the document
+    REFERENCE = 3 #reference by ID to an element not in the document
+    #the above can occur as children, the following only as attribute values
+    NONE = 4
+    TRUE = 5
+    FALSE = 6
+    INT = 7
+    FLOAT = 8
+    DATETIME = 9
+    LIST = 10 #lists, tuples and dictionaries (of strings, numbers, booleans and lists) are stored as JSON
+    TUPLE = 11
+    DICT = 12
+
 
 #foliaspec:attributes
 #Defines all common FoLiA attributes (as part of the Attrib enumeration)
@@ -565,6 +591,20 @@ def xmltreefromfile(filename):
     except TypeError:
         return ElementTree.parse(filename, ElementTree.XMLParser()) #older lxml, may leak!!
 
+def tobytes(a):
+    """Internal function, returns the machine values of an array as bytes, deals with different Python versions"""
+    if sys.version < '3':
+        return a.tostring()
+    else:
+        return a.tobytes()
+
+def frombytes(a, s):
+    """Internal function, appends machine values from bytes to an array, deals with different Python versions"""
+    if sys.version < '3':
+        a.fromstring(s)
+    else:
+        a.frombytes(s)
+
 def makeelement(E, tagname, **kwargs):
     """Internal function"""
     if sys.version < '3':
@@ -657,6 +697,8 @@ class AbstractElement(object):
         :meth:`AbstractElement.__init__`
     """
 
+    textcache = None #will hold cached results of text() (per instance)
+
     def __init__(self, doc, *args, **kwargs):
         """Constructor for most FoLiA elements.
 
@@ -704,9 +746,43 @@ class AbstractElement(object):
         #overriding getattr so we can get defaults here rather than needing a copy on each element, saves memory
         if attr in ('set','cls','confidence','annotator','annotatortype','datetime','n','href','src','speaker','begintime','endtime','xlinktype','xlinktitle','xlinklabel','xlinkrole','xlinkshow','label', 'textclass', 'metadata'):
             return None
+        elif attr == 'data' and 'lazynode' in self.__dict__:
+            #element was loaded in lazy mode and its contents are accessed for the first time
+            self.materialize()
+            return self.data
         else:
             return super(AbstractElement, self).__getattribute__(attr)
 
+    def invalidate(self):
+        """Internal method. Should be called whenever the children of this element change, discards any cached results that may depend on it: the text of this element and its ancestors, the text of span annotations referring to any of these (and their ancestors), and queries on the document."""
+        spanindex = self.doc.spanindex if self.doc is not None else None
+        pending = [self]
+        done = set()
+        while pending:
+            e = pending.pop()
+            while isinstance(e, AbstractElement) and id(e) not in done:
+                done.add(id(e))
+                if e.textcache is not None:
+                    e.textcache = None
+                if spanindex:
+                    #span annotations are not ancestors of the words they cover, find them through the reverse index (may hold stale entries, clearing their cache is harmless)
+                    for key in (id(e), e.id):
+                        if key is not None and key in spanindex:
+                            pending += spanindex[key]
+                e = e.parent
+        if self.doc is not None and self.doc.selectcache:
+            self.doc.selectcache = {}
+
+    def materialize(self):
+        """Converts the XML contents of an element that was loaded in lazy mode (:attr:`Mode.LAZY`) into FoLiA elements. This is done automatically upon first access of the contents and never has to be called explicitly."""
+        node = self.__dict__.pop('lazynode', None)
+        if node is not None:
+            del self.doc.lazynodes[node]
+            self.data = []
+            for child in self.parsexmlchildren(node, self.doc):
+                self.append(child)
+            self.doc.pendingvalidation()
+
 
     #def __del__(self):
     #    if self.doc and self.doc.debug:
@@ -905,13 +981,14 @@ class AbstractElement(object):
             return self.textcontent(cls, correctionhandling).text(normalize_spaces=normalize_spaces)
 
         if self.TEXTCONTAINER:
-            s = ""
+            parts = []
             for e in self:
                 if isstring(e):
-                    s += e
+                    parts.append(e)
                 elif e.PRINTABLE:
-                    if s: s += e.TEXTDELIMITER #for AbstractMarkup, will usually be ""
-                    s += e.text()
+                    if parts: parts.append(e.TEXTDELIMITER) #for AbstractMarkup, will usually be ""
+                    parts.append(e.text())
+            s = "".join(parts)
             if normalize_spaces:
                 return norm_spaces(s)
             else:
@@ -919,34 +996,49 @@ class AbstractElement(object):
         elif not self.PRINTABLE: #only printable elements can hold text
             raise NoSuchText
         else:
-            #Get text from children first
-            delimiter = ""
-            s = ""
-            for e in self:
-                #was: e.PRINTABLE and not isinstance(e, TextContent) and not isinstance(e, String):
-                if isinstance(e, (AbstractStructureElement, Correction, AbstractSpanAnnotation)):   #AbstractSpanAnnotation is needed when requesting text() on nested span annotations
-                    try:
-                        s += e.text(cls,retaintokenisation, delimiter,False,correctionhandling)
+            #The text is cached, the cache is discarded whenever this element or any of its descendants change (see invalidate())
+            key = (cls, retaintokenisation, correctionhandling, False)
+            if self.textcache is not None and key in self.textcache:
+                s = self.textcache[key]
+            else:
+                #Get text from children first
+                delimiter = ""
+                parts = []
+                for e in self:
+                    #was: e.PRINTABLE and not isinstance(e, TextContent) and not isinstance(e, String):
+                    if isinstance(e, (AbstractStructureElement, Correction, AbstractSpanAnnotation)):   #AbstractSpanAnnotation is needed when requesting text() on nested span annotations
+                        try:
+                            parts.append(e.text(cls,retaintokenisation, delimiter,False,correctionhandling))
 
-                        #delimiter will be buffered and only printed upon next iteration, this prevents the delimiter being outputted at the end of a sequence and to be compounded with other delimiters
-                        delimiter = e.gettextdelimiter(retaintokenisation)
-                    except NoSuchText:
-                        #No text, that's okay, just continue
-                        continue
+                            #delimiter will be buffered and only printed upon next iteration, this prevents the delimiter being outputted at the end of a sequence and to be compounded with other delimiters
+                            delimiter = e.gettextdelimiter(retaintokenisation)
+                        except NoSuchText:
+                            #No text, that's okay, just continue
+                            continue
+                s = "".join(parts)
 
-            if not s and self.hastext(cls, correctionhandling):
-                s = self.textcontent(cls, correctionhandling).text()
+                if not s and self.hastext(cls, correctionhandling):
+                    s = self.textcontent(cls, correctionhandling).text()
 
-            if s and previousdelimiter:
+                if self.textcache is None: self.textcache = {}
+                self.textcache[key] = s
+
+            if not s:
+                #No text found at all :`(
+                raise NoSuchText
+            elif previousdelimiter:
                 s = previousdelimiter + s
-            if s:
                 if normalize_spaces:
                     return norm_spaces(s)
                 else:
                     return s
+            elif normalize_spaces:
+                key = (cls, retaintokenisation, correctionhandling, True)
+                if key not in self.textcache:
+                    self.textcache[key] = norm_spaces(s)
+                return self.textcache[key]
             else:
-                #No text found at all :`(
-                raise NoSuchText
+                return s
 
     def phoncontent(self, cls='current', correctionhandling=CorrectionHandling.CURRENT):
         """Get the phonetic content explicitly associated with this element (of the specified class).
@@ -1592,6 +1684,7 @@ class AbstractElement(object):
         else:
             raise ValueError("Unable to append object of type " + child.__class__.__name__ + " to " + self.__class__.__name__ + ". Type not allowed as child.")
 
+        self.invalidate()
         if dopostappend: child.postappend()
         return child
 
@@ -1668,6 +1761,7 @@ class AbstractElement(object):
         else:
             raise ValueError("Unable to append object of type " + child.__class__.__name__ + " to " + self.__class__.__name__ + ". Type not allowed as child.")
 
+        self.invalidate()
         child.postappend()
         return child
 
@@ -1779,6 +1873,7 @@ class AbstractElement(object):
                 elif isstring(child):
                     s += child
             self.data = [s]
+            self.invalidate()
 
     def replace(self, child, *args, **kwargs):
         """Appends a child element like ``append()``, but replaces any existing child element of the same type and set. If no such child element exists, this will act the same as append()
@@ -1805,6 +1900,7 @@ class AbstractElement(object):
         elif (self.TEXTCONTAINER or self.PHONCONTAINER) and isstring(child):
             #replace will replace ALL text content, removing text markup along the way!
             self.data = []
+            self.invalidate()
             return self.append(child, *args,**kwargs)
         else:
             Class = child.__class__
@@ -1826,6 +1922,7 @@ class AbstractElement(object):
                 #old version becomes alternative
                 if replace[0] in self.data:
                     self.data.remove(replace[0])
+                    self.invalidate()
                 alt = self.append(Alternative)
                 alt.append(replace[0])
                 del kwargs['alternative'] #has other meaning in append()
@@ -1984,38 +2081,18 @@ class AbstractElement(object):
             if self.xlinktitle:
                 attribs['{http://www.w3.org/1999/xlink}title'] = self.xlinktitle
 
-        omitchildren =  []
-
-        #Are there predetermined Features in ACCEPTED_DATA?
-        for c in self.ACCEPTED_DATA:
-            if issubclass(c, Feature) and c.SUBSET:
-                #Do we have any of those?
-                for c2 in self.data:
-                    if c2.__class__ is c and c.SUBSET == c2.SUBSET and c2.cls:
-                        #Yes, serialize them as attributes
-                        attribs[c2.SUBSET] = c2.cls
-                        omitchildren.append(c2) #and skip them as elements
-                        break #only one
+        omitchildren = self.xmlfeatures()
+        for c in omitchildren:
+            #serialize predetermined features as attributes
+            attribs[c.SUBSET] = c.cls
 
         e  = makeelement(E, '{' + NSFOLIA + '}' + self.XMLTAG, **attribs)
 
 
 
         if not skipchildren and self.data:
-            #append children,
-            # we want make sure that text elements are in the right order, 'current' class first
-            # so we first put them in  a list
-            textelements = []
-            otherelements = []
-            for child in self:
-                if isinstance(child, TextContent):
-                    if child.cls == 'current':
-                        textelements.insert(0, child)
-                    else:
-                        textelements.append(child)
-                elif not child in omitchildren:
-                    otherelements.append(child)
-            for child in textelements+otherelements:
+            #append children
+            for child in self.xmlchildren(omitchildren):
                 if (self.TEXTCONTAINER or self.PHONCONTAINER) and isstring(child):
                     if len(e) == 0:
                         if e.text:
@@ -2045,6 +2122,36 @@ class AbstractElement(object):
                     e.append(e2)
         return e
 
+    def xmlfeatures(self):
+        """Internal method. Returns the predetermined features (see ACCEPTED_DATA) that are serialised as XML attributes rather than as elements"""
+        features = []
+        #Are there predetermined Features in ACCEPTED_DATA?
+        for c in self.ACCEPTED_DATA:
+            if issubclass(c, Feature) and c.SUBSET:
+                #Do we have any of those?
+                for c2 in self.data:
+                    if c2.__class__ is c and c.SUBSET == c2.SUBSET and c2.cls:
+                        features.append(c2)
+                        break #only one
+        return features
+
+    def xmlchildren(self, omitchildren=None):
+        """Internal method. Returns the children in the order in which they are serialised to XML"""
+        if omitchildren is None: omitchildren = self.xmlfeatures()
+        # we want make sure that text elements are in the right order, 'current' class first
+        # so we first put them in  a list
+        textelements = []
+        otherelements = []
+        for child in self:
+            if isinstance(child, TextContent):
+                if child.cls == 'current':
+                    textelements.insert(0, child)
+                else:
+                    textelements.append(child)
+            elif not child in omitchildren:
+                otherelements.append(child)
+        return textelements+otherelements
+
 
     def json(self, attribs=None, recurse=True, ignorelist=False):
         """Serialises the FoLiA element and all its contents to a Python dictionary suitable for serialisation to JSON.
@@ -2150,54 +2257,52 @@ class AbstractElement(object):
 
         """
 
-        #if ignorelist is True:
-        #    ignorelist = default_ignore
-
-        if not node:
-            node = self
-        for e in self.data: #pylint: disable=too-many-nested-blocks
-            if (not self.TEXTCONTAINER and not self.PHONCONTAINER) or isinstance(e, AbstractElement):
-                if ignore is True:
+        #normalise the ignore argument once rather than for every element
+        if ignore is True:
+            ignoreauth = True
+            ignoreclasses = ()
+        elif ignore:
+            ignoreauth = any( c is True for c in ignore )
+            ignoreclasses = tuple( c for c in ignore if c is not True )
+        else:
+            ignoreauth = False
+            ignoreclasses = ()
+
+        #iterative depth-first traversal, each entry on the stack is an iterator over children, and
+        #a flag indicating whether it iterates over results of an element with its own select() implementation
+        stack = [(iter(self.data), False)]
+        while stack:
+            children, delegated = stack[-1]
+            for e in children:
+                if delegated:
+                    yield e
+                    continue
+                if not isinstance(e, AbstractElement):
+                    continue #text in text containers
+                if ignoreauth:
                     try:
                         if not e.auth:
                             continue
                     except AttributeError:
                         #not all elements have auth attribute..
                         pass
-                elif ignore: #list
-                    doignore = False
-                    for c in ignore:
-                        if c is True:
-                            try:
-                                if not e.auth:
-                                    doignore =True
-                                    break
-                            except AttributeError:
-                                #not all elements have auth attribute..
-                                pass
-                        elif c == e.__class__ or issubclass(e.__class__,c):
-                            doignore = True
-                            break
-                    if doignore:
-                        continue
+                if ignoreclasses and isinstance(e, ignoreclasses):
+                    continue
 
                 if isinstance(e, Class):
-                    if not set is None:
-                        try:
-                            if e.set != set:
-                                continue
-                        except AttributeError:
-                            continue
+                    if set is not None and e.set != set:
+                        continue
                     yield e
                 if recursive:
-                    for e2 in e.select(Class, set, recursive, ignore, e):
-                        if not set is None:
-                            try:
-                                if e2.set != set:
-                                    continue
-                            except AttributeError:
-                                continue
-                        yield e2
+                    #descend first, continue with the next sibling afterwards
+                    if e.__class__.select.__code__ is not AbstractElement.select.__code__:
+                        stack.append( (e.select(Class, set, recursive, ignore, e), True) )
+                        break
+                    elif e.data:
+                        stack.append( (iter(e.data), False) )
+                        break
+            else:
+                stack.pop()
 
     def count(self, Class, set=None, recursive=True,  ignore=True, node=None):
         """Like :meth:`AbstractElement.select`, but instead of returning the elements, it merely counts them.
@@ -2549,36 +2654,17 @@ class AbstractElement(object):
             return E.define( E.element(*(preamble + attribs), **{'name': cls.XMLTAG}), name=cls.XMLTAG, ns=NSFOLIA)
 
     @classmethod
-    def parsexml(Class, node, doc, **kwargs): #pylint: disable=bad-classmethod-argument
-        """Internal class method used for turning an XML element into an instance of the Class.
+    def parsexmlchildren(Class, node, doc): #pylint: disable=bad-classmethod-argument
+        """Internal class method used for turning the children of an XML element into FoLiA elements (and text, for text containers), to be passed to the constructor of the Class.
 
         Args:
             * ``node`` - XML Element
             * ``doc`` - Document
 
         Returns:
-            An instance of the current Class.
+            A list of instances (and strings)
         """
-
-        assert issubclass(Class, AbstractElement)
-
-        if doc.preparsexmlcallback:
-            result = doc.preparsexmlcallback(node)
-            if not result:
-                return None
-            if isinstance(result, AbstractElement):
-                return result
-
-
-
-        dcoi = node.tag.startswith('{' + NSDCOI + '}')
         args = []
-        if not kwargs: kwargs = {}
-        text = None #for dcoi support
-        if (Class.TEXTCONTAINER or Class.PHONCONTAINER) and node.text:
-            args.append(node.text)
-
-
         for subnode in node: #pylint: disable=too-many-nested-blocks
             #don't trip over comments
             if isinstance(subnode, ElementTree._Comment): #pylint: disable=protected-access
@@ -2613,9 +2699,42 @@ class AbstractElement(object):
                             args.append(e)
                 elif doc.debug >= 1:
                     print("[PyNLPl FoLiA DEBUG] Ignoring subnode outside of FoLiA namespace: " + subnode.tag,file=stderr)
+        return args
+
+    @classmethod
+    def parsexml(Class, node, doc, **kwargs): #pylint: disable=bad-classmethod-argument
+        """Internal class method used for turning an XML element into an instance of the Class.
+
+        Args:
+            * ``node`` - XML Element
+            * ``doc`` - Document
+
+        Returns:
+            An instance of the current Class.
+        """
+
+        assert issubclass(Class, AbstractElement)
+
+        if doc.preparsexmlcallback:
+            result = doc.preparsexmlcallback(node)
+            if not result:
+                return None
+            if isinstance(result, AbstractElement):
+                return result
 
 
 
+        dcoi = node.tag.startswith('{' + NSDCOI + '}')
+        args = []
+        if not kwargs: kwargs = {}
+        text = None #for dcoi support
+        if (Class.TEXTCONTAINER or Class.PHONCONTAINER) and node.text:
+            args.append(node.text)
+
+        lazy = doc.mode == Mode.LAZY and not dcoi and Class in (Text, Division, Paragraph)
+        if not lazy:
+            args += Class.parsexmlchildren(node, doc)
+
         if dcoi:
             dcoipos = dcoilemma = dcoicorrection = dcoicorrectionoriginal = None
         for key, value in node.attrib.items():
@@ -2667,6 +2786,11 @@ class AbstractElement(object):
 
         if doc.debug >= 1: print("[PyNLPl FoLiA DEBUG] Found " + node.tag[nslen:],file=stderr)
         instance = Class(doc, *args, **kwargs)
+        if lazy:
+            #contents will be parsed upon first access (see __getattr__)
+            del instance.data
+            instance.lazynode = node
+            doc.lazynodes[node] = instance
         #if id:
         #    if doc.debug >= 1: print >>stderr, "[PyNLPl FoLiA DEBUG] Adding to index: " + id
         #    doc.index[id] = instance
@@ -2703,6 +2827,7 @@ class AbstractElement(object):
         if child.parent == self:
             child.parent = None
         self.data.remove(child)
+        self.invalidate()
         #delete from index
         if child.id and self.doc and child.id in self.doc.index:
             del self.doc.index[child.id]
@@ -3465,6 +3590,7 @@ class TextContent(AbstractElement):
         self.data = [text]
         if not self.data:
             raise ValueError("Empty text content elements are not allowed")
+        self.invalidate()
         #if isstring(self.data[0]) and (self.data[0] != self.data[0].translate(ILLEGAL_UNICODE_CONTROL_CHARACTERS)):
         #    raise ValueError("There are illegal unicode control characters present in TextContent: " + repr(self.data[0]))
 
@@ -4008,13 +4134,23 @@ class Word(AbstractStructureElement, AllowCorrections):
         See also:
             :class:`AbstractElement.__init__`
         """
-        self.space = True
+        self._space = True
 
         if 'space' in kwargs:
-            self.space = kwargs['space']
+            self._space = kwargs['space']
             del kwargs['space']
         super(Word,self).__init__(doc, *args, **kwargs)
 
+    @property
+    def space(self):
+        """Indicates whether this token is followed by a space (bool)"""
+        return self._space
+
+    @space.setter
+    def space(self, value):
+        self._space = value
+        self.invalidate() #affects the text of the ancestors
+
 
     def sentence(self):
         """Obtain the sentence this word is a part of, otherwise return None"""
@@ -4163,29 +4299,8 @@ class Word(AbstractStructureElement, AllowCorrections):
         Yields:
             Matching span annotation instances (derived from :class:`AbstractSpanAnnotation`)
         """
-
-        if issubclass(type, AbstractAnnotationLayer):
-            layerclass = type
-        else:
-            layerclass = ANNOTATIONTYPE2LAYERCLASS[type.ANNOTATIONTYPE]
-        e = self
-        while True:
-            if not e.parent: break
-            e = e.parent
-            for layer in e.select(layerclass,set,False):
-                if type is layerclass:
-                    for e2 in layer.select(AbstractSpanAnnotation,set,True, (True, Word, Morpheme)):
-                        if not isinstance(e2, AbstractSpanRole) and self in e2.wrefs():
-                            yield e2
-                else:
-                    for e2 in layer.select(type,set,True, (True, Word, Morpheme)):
-                        if not isinstance(e2, AbstractSpanRole) and self in e2.wrefs():
-                            yield e2
-
-                #for e2 in layer:
-                #    if (type is layerclass and isinstance(e2, AbstractSpanAnnotation)) or (type is not layerclass and isinstance(e2, type)):
-                #        if self in e2.wrefs():
-                #            yield e2
+        for e in findspans(self, type, set):
+            yield e
 
 
 class Feature(AbstractElement):
@@ -4309,9 +4424,30 @@ class AbstractSpanAnnotation(AbstractElement, AllowGenerateID, AllowCorrections)
         if (isinstance(child, Word) or isinstance(child, Morpheme) or isinstance(child, Phoneme))  and WordReference in self.ACCEPTED_DATA:
             #Accept Word instances instead of WordReference, references will be automagically used upon serialisation
             self.data.append(child)
+            self.invalidate()
+            self.addtospanindex(child)
             return child
         else:
-            return super(AbstractSpanAnnotation,self).append(child, *args, **kwargs)
+            child = super(AbstractSpanAnnotation,self).append(child, *args, **kwargs)
+            if isinstance(child, WordReference):
+                self.addtospanindex(child)
+            return child
+
+    def addtospanindex(self, child):
+        """Internal method. Registers this span in the reverse index of the document (used by :meth:`Word.findspans`) as directly containing the specified word, morpheme, phoneme or unresolved word reference"""
+        if self.doc is not None:
+            key = child.id if isinstance(child, WordReference) else id(child) #words are indexed by identity, unresolved references by ID
+            try:
+                self.doc.spanindex[key].append(self)
+            except KeyError:
+                self.doc.spanindex[key] = [self]
+
+    def setdoc(self,newdoc):
+        """See :meth:`AbstractElement.setdoc`"""
+        super(AbstractSpanAnnotation,self).setdoc(newdoc)
+        for child in self.data:
+            if isinstance(child, (Word, Morpheme, Phoneme, WordReference)):
+                self.addtospanindex(child)
 
     def setspan(self, *args):
         """Sets the span of the span element anew, erases all data inside.
@@ -4320,6 +4456,7 @@ class AbstractSpanAnnotation(AbstractElement, AllowGenerateID, AllowCorrections)
             *args: Instances of :class:`Word`, :class:`Morpheme` or :class:`Phoneme`
         """
         self.data = []
+        self.invalidate()
         for child in args:
             self.append(child)
 
@@ -4426,6 +4563,7 @@ class AbstractSpanAnnotation(AbstractElement, AllowGenerateID, AllowCorrections)
             for wref in directwrefs:
                 try:
                     e.data.remove(wref)
+                    e.invalidate()
                 except ValueError:
                     pass
             e = e.parent
@@ -5461,20 +5599,12 @@ class Morpheme(AbstractStructureElement):
     """Morpheme element, represents one morpheme in morphological analysis, subtoken annotation element to be used in :class:`MorphologyLayer`"""
 
     def findspans(self, type,set=None):
-        """Find span annotation of the specified type that include this word"""
-        if issubclass(type, AbstractAnnotationLayer):
-            layerclass = type
-        else:
-            layerclass = ANNOTATIONTYPE2LAYERCLASS[type.ANNOTATIONTYPE]
-        e = self
-        while True:
-            if not e.parent: break
-            e = e.parent
-            for layer in e.select(layerclass,set,False):
-                for e2 in layer:
-                    if isinstance(e2, AbstractSpanAnnotation):
-                        if self in e2.wrefs():
-                            yield e2
+        """Find span annotation of the specified type that include this morpheme.
+
+        See :meth:`Word.findspans` for usage.
+        """
+        for e in findspans(self, type, set):
+            yield e
 
     def textvalidation(self, warnonly=None): #warnonly will change at some point in the future to be stricter
         return True
@@ -5483,24 +5613,13 @@ class Morpheme(AbstractStructureElement):
 class Phoneme(AbstractStructureElement):
     """Phone element, represents one phone in phonetic analysis, subtoken annotation element to be used in :class:`PhonologyLayer`"""
 
-    def findspans(self, type,set=None): #TODO: this is a copy of the methods in Morpheme in Word, abstract into separate class and inherit
+    def findspans(self, type,set=None):
         """Find span annotation of the specified type that include this phoneme.
 
         See :meth:`Word.findspans` for usage.
         """
-        if issubclass(type, AbstractAnnotationLayer):
-            layerclass = type
-        else:
-            layerclass = ANNOTATIONTYPE2LAYERCLASS[type.ANNOTATIONTYPE]
-        e = self
-        while True:
-            if not e.parent: break
-            e = e.parent
-            for layer in e.select(layerclass,set,False):
-                for e2 in layer:
-                    if isinstance(e2, AbstractSpanAnnotation):
-                        if self in e2.wrefs():
-                            yield e2
+        for e in findspans(self, type, set):
+            yield e
 
 #class Subentity(AbstractSubtokenAnnotation):
 #    """Subentity element, for named entities within a single token, subtoken annotation element to be used in SubentitiesLayer"""
@@ -6090,8 +6209,9 @@ this, first a trivial example of searching for one word::
     document. The entire document is loaded in memory and no special indices are involved.
     For single documents this is okay, but when iterating over a corpus of
     thousands of documents, this method is too slow, especially for real-time
-    applications. For huge corpora, clever indexing and database management systems
-    will be required. This however is beyond the scope of this library.
+    applications. For such corpora, build a :class:`CorpusIndex` once and query it
+    using :meth:`CorpusIndex.findwords`, which takes the very same patterns but only loads the
+    documents that may contain matches.
 
     """
 
@@ -6218,6 +6338,60 @@ class NativeMetaData(object):
         self.order.remove(key)
 
 
+BINARYMAGIC = b"FoLiAbin"
+BINARYVERSION = 2
+BINARYSKIPATTRIBS = ('doc','parent','data','textcache','lazynode') #instance attributes not stored in the binary representation
+#instance attributes stored in the binary representation, elements with any other attributes are stored as XML
+BINARYATTRIBS = ('id','set','cls','annotator','annotatortype','confidence','datetime','n','auth','_space','offset','ref','idref','subset','textclass','src','speaker','begintime','endtime','metadata','href','xlinklabel','xlinkrole','xlinkshow','xlinktitle','xlinktype','value','original','linenr','pagenr','newpage','maxid','format','type','t','split','merge')
+BINARYXMLCLASSES = (External, ForeignData) #elements stored as XML in the binary representation, as they hold references that can not be encoded
+
+def isbinaryplain(value, nested=False):
+    """Internal function, tests whether a value can be stored as JSON in the binary representation of a document (tuples only at the outer level, as JSON does not distinguish them from lists)"""
+    if value is None or isinstance(value, (bool, int, float)) or isstring(value):
+        return True
+    elif isinstance(value, list) or (isinstance(value, tuple) and not nested):
+        return all( isbinaryplain(x, True) for x in value )
+    elif isinstance(value, dict):
+        return all( isstring(key) and isbinaryplain(x, True) for key, x in value.items() )
+    return False
+
+def binaryclasskey(Class):
+    """Internal function, returns the key by which an element class is identified in the binary representation of a document: its XML tag, or for subclasses of :class:`Feature` the tag and the subset. Returns ``None`` if the class can not be identified."""
+    if XML2CLASS.get(Class.XMLTAG) is Class:
+        return Class.XMLTAG
+    elif Class in Feature.__subclasses__() and Class.SUBSET:
+        return Feature.XMLTAG + ":" + Class.SUBSET
+    return None
+
+def binaryclass(key):
+    """Internal function, returns the element class for a key obtained by :func:`binaryclasskey`"""
+    if ':' in key:
+        tag, subset = key.split(':',1)
+        if tag == Feature.XMLTAG:
+            for Class in Feature.__subclasses__():
+                if Class.SUBSET == subset:
+                    return Class
+    elif key in XML2CLASS:
+        return XML2CLASS[key]
+    raise Exception("Invalid binary FoLiA document, unknown element: " + key)
+
+def isbinarystorable(e):
+    """Internal function, tests whether an element can be encoded in the binary representation of a document, if not it is stored as XML"""
+    if isinstance(e, BINARYXMLCLASSES) or binaryclasskey(e.__class__) is None:
+        return False
+    for key, value in e.__dict__.items():
+        if key in BINARYSKIPATTRIBS:
+            continue
+        if key not in BINARYATTRIBS:
+            return False
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                return False
+        elif not isbinaryplain(value):
+            return False
+    return True
+XMLSTREAMCLASSES = (Text, Speech, Division, Paragraph) #elements whose children are serialised one at a time when writing XML to file
+
 class Document(object):
     """This is the FoLiA Document and holds all its data in memory.
 
@@ -6251,12 +6425,15 @@ class Document(object):
 
              * folia.Mode.MEMORY - The entire FoLiA Document will be loaded into memory. This is the default mode and the only mode in which documents can be manipulated and saved again.
              * folia.Mode.XPATH - The full XML tree will still be loaded into memory, but conversion to FoLiA classes occurs only when queried. This mode can be used when the full power of XPath is required.
+             * folia.Mode.LAZY - The full XML tree will still be loaded into memory, texts, divisions and paragraphs are converted to FoLiA classes but their contents are only converted when first accessed (by iteration, ``select()``, or obtaining an element by ID). This mode is suited for touching only small parts of huge documents.
 
         Keyword Arguments:
 
+            binary (bool): The file or string holds the binary representation of a document (see :meth:`Document.binary`) rather than XML (default: False). Only load binary documents from trusted sources.
             setdefinition (dict):  A dictionary of set definitions, the key corresponds to the set name, the value is a SetDefinition instance
             loadsetdefinitions (bool):  download and load set definitions (default: False)
             deepvalidation (bool): Do deep validation of the document (default: False), implies ``loadsetdefinitions``
+            setdefinitioncache (str): Directory in which compiled set definitions are cached, so they need not be parsed again on subsequent runs (default: None, no caching)
             textvalidation (bool): Do validation of text consistency (default: False)``
             preparsexmlcallback (function):  Callback for a function taking one argument (``node``, an lxml node). Will be called whenever an XML element is parsed into FoLiA. The function should return an instance inherited from folia.AbstractElement, or None to abort parsing this element (and all its children)
             parsexmlcallback (function):  Callback for a function taking one argument (``element``, a FoLiA element). Will be called whenever an XML element is parsed into FoLiA. The function should return an instance inherited from folia.AbstractElement, or None to abort adding this element (and all its children)
@@ -6279,6 +6456,9 @@ class Document(object):
         self.annotationdefaults[AnnotationType.PHON] = {'undefined': {} }
 
         self.index = {} #all IDs go here
+        self.spanindex = {} #reverse index of span annotations: id(word/morpheme/phoneme) (or the ID of an unresolved word reference) => spans that directly contain it, may hold stale entries, see findspans()
+        self.selectcache = {} #cached results of select() on the document: (Class, set, recursive, ignore) => list of elements, discarded whenever the document changes
+        self.lazynodes = {} #XML nodes of elements whose contents have not been parsed yet (lxml node => element), only used in Mode.LAZY
         self.declareprocessed = False # Will be set to True when declarations have been processed
 
         self.metadata = NativeMetaData() #will point to XML Element holding native metadata
@@ -6350,6 +6530,11 @@ class Document(object):
         if self.deepvalidation:
             self.loadsetdefinitions = True
 
+        if 'setdefinitioncache' in kwargs:
+            self.setdefinitioncache = kwargs['setdefinitioncache']
+        else:
+            self.setdefinitioncache = None
+
 
         if 'textvalidation' in kwargs:
             self.textvalidation = bool(kwargs['textvalidation'])
@@ -6387,27 +6572,40 @@ class Document(object):
             self.id = kwargs['id']
         elif 'file' in kwargs:
             self.filename = kwargs['file']
+            binary = kwargs.get('binary', False)
             if self.filename[-4:].lower() == '.bz2':
                 f = bz2.BZ2File(self.filename)
                 contents = f.read()
                 f.close()
-                self.tree = xmltreefromstring(contents)
-                del contents
-                self.parsexml(self.tree.getroot())
+                if binary:
+                    self.parsebinary(contents)
+                elif contents[:len(BINARYMAGIC)] == BINARYMAGIC:
+                    raise Exception(self.filename + " holds a binary FoLiA document, pass binary=True to load it")
+                else:
+                    self.tree = xmltreefromstring(contents)
+                    del contents
+                    self.parsexml(self.tree.getroot())
             elif self.filename[-3:].lower() == '.gz':
                 f = gzip.GzipFile(self.filename) #pylint: disable=redefined-variable-type
                 contents = f.read()
                 f.close()
-                self.tree = xmltreefromstring(contents)
-                del contents
-                self.parsexml(self.tree.getroot())
+                if binary:
+                    self.parsebinary(contents)
+                elif contents[:len(BINARYMAGIC)] == BINARYMAGIC:
+                    raise Exception(self.filename + " holds a binary FoLiA document, pass binary=True to load it")
+                else:
+                    self.tree = xmltreefromstring(contents)
+                    del contents
+                    self.parsexml(self.tree.getroot())
             else:
-                self.load(self.filename)
+                self.load(self.filename, binary)
+        elif 'string' in kwargs and kwargs.get('binary', False):
+            self.parsebinary(kwargs['string'])
         elif 'string' in kwargs:
             self.tree = xmltreefromstring(kwargs['string'])
             del kwargs['string']
             self.parsexml(self.tree.getroot())
-            if self.mode != Mode.XPATH:
+            if self.mode == Mode.MEMORY:
                 #XML Tree is now obsolete (only needed when partially loaded for xpath queries)
                 self.tree = None
         elif 'tree' in kwargs:
@@ -6415,8 +6613,8 @@ class Document(object):
         else:
             raise Exception("No ID, filename or tree specified")
 
-        if self.mode != Mode.XPATH:
-            #XML Tree is now obsolete (only needed when partially loaded for xpath queries), free memory
+        if self.mode == Mode.MEMORY:
+            #XML Tree is now obsolete (only needed when partially loaded for xpath queries or lazy loading), free memory
             self.tree = None
 
     #def __del__(self):
@@ -6425,11 +6623,12 @@ class Document(object):
     #        del child
     #    del self.data
 
-    def load(self, filename):
-        """Load a FoLiA XML file.
+    def load(self, filename, binary=False):
+        """Load a FoLiA XML file, or a FoLiA document in binary representation (see :meth:`Document.binary`).
 
         Argument:
             filename (str): The file to load
+            binary (bool): The file holds the binary representation rather than XML, only load binary documents from trusted sources
         """
         #if LXE and self.mode != Mode.XPATH:
         #    #workaround for xml:id problem (disabled)
@@ -6438,9 +6637,16 @@ class Document(object):
         #    #f.close()
         #    self.tree = ElementTree.parse(filename)
         #else:
+        if binary:
+            with open(filename,'rb') as f:
+                self.parsebinary(f.read())
+            return
+        with open(filename,'rb') as f:
+            if f.read(len(BINARYMAGIC)) == BINARYMAGIC:
+                raise Exception(filename + " holds a binary FoLiA document, pass binary=True to load it")
         self.tree = xmltreefromfile(filename)
         self.parsexml(self.tree.getroot())
-        if self.mode != Mode.XPATH:
+        if self.mode == Mode.MEMORY:
             #XML Tree is now obsolete (only needed when partially loaded for xpath queries)
             self.tree = None
 
@@ -6477,27 +6683,31 @@ class Document(object):
         for x in findwords(self,self.words,*args,**kwargs):
             yield x
 
-    def save(self, filename=None):
+    def save(self, filename=None, binary=None):
         """Save the document to file.
 
         Arguments:
             * filename (str): The filename to save to. If not set (``None``, default), saves to the same file as loaded from.
+            * binary (bool): Save the compact binary representation (see :meth:`Document.binary`) rather than XML. If not set (``None``, default), the binary representation is used if the filename has the extension ``.bin`` (optionally followed by ``.gz`` or ``.bz2``). Binary files are loaded by ``Document(file=..., binary=True)``.
         """
         if not filename:
             filename = self.filename
         if not filename:
             raise Exception("No filename specified")
+        if binary is None:
+            binary = filename.lower().replace('.bz2','').replace('.gz','').endswith('.bin')
         if filename[-4:].lower() == '.bz2':
             f = bz2.BZ2File(filename,'wb')
-            f.write(self.xmlstring().encode('utf-8'))
-            f.close()
         elif filename[-3:].lower() == '.gz':
             f = gzip.GzipFile(filename,'wb') #pylint: disable=redefined-variable-type
-            f.write(self.xmlstring().encode('utf-8'))
-            f.close()
         else:
-            f = io.open(filename,'w',encoding='utf-8')
-            f.write(self.xmlstring())
+            f = io.open(filename,'wb')
+        try:
+            if binary:
+                f.write(self.binary())
+            else:
+                self.writexml(f)
+        finally:
             f.close()
 
 
@@ -6520,6 +6730,8 @@ class Document(object):
         """Tests if the specified element ID is in the document index"""
         if key in self.index:
             return True
+        elif self.lazynodes and self.materializeid(key):
+            return True
         elif self.subdocs:
             for subdoc in self.subdocs.values():
                 if key in subdoc:
@@ -6528,6 +6740,20 @@ class Document(object):
         else:
             return False
 
+    def materializeid(self, id):
+        """Internal method. Converts the lazily loaded elements (see :attr:`Mode.LAZY`) that contain the element with the specified ID, so that it ends up in the index.
+
+        Returns:
+            bool: ``True`` if the element was found, ``False`` otherwise
+        """
+        lazynode = next(iter(self.lazynodes))
+        for node in lazynode.getroottree().iterfind('.//*[@{http://www.w3.org/XML/1998/namespace}id="' + id.replace('"','') + '"]'):
+            for ancestor in reversed(list(node.iterancestors())): #outermost first, each materialisation adds the lazy nodes of the next level
+                if ancestor in self.lazynodes:
+                    self.lazynodes[ancestor].materialize()
+            return id in self.index
+        return False
+
     def __getitem__(self, key):
         """Obtain an element by ID from the document index.
 
@@ -6541,6 +6767,8 @@ class Document(object):
             try:
                 return self.index[key]
             except KeyError:
+                if self.lazynodes and self.materializeid(key):
+                    return self.index[key]
                 if self.subdocs: #perhaps the key is in one of our subdocs?
                     for subdoc in self.subdocs.values():
                         try:
@@ -6573,6 +6801,7 @@ class Document(object):
         else:
             assert isinstance(text, Text) or isinstance(text, Speech)
         self.data.append(text)
+        self.selectcache = {}
         return text
 
     def add(self,text):
@@ -6663,9 +6892,12 @@ class Document(object):
                 raise Exception("Invalid annotation type")
         return l
 
-    def xml(self):
+    def xml(self, skipchildren=False):
         """Serialise the document to XML.
 
+        Arguments:
+            skipchildren (bool): Only serialise the header (declarations and metadata), not the texts
+
         Returns:
             lxml.etree.Element
 
@@ -6701,8 +6933,9 @@ class Document(object):
                 **metadataattribs
             )
             , **attribs)
-        for text in self.data:
-            e.append(text.xml())
+        if not skipchildren:
+            for text in self.data:
+                e.append(text.xml())
         return e
 
     def json(self):
@@ -6799,7 +7032,7 @@ class Document(object):
                 if set and self.loadsetdefinitions and set not in self.setdefinitions:
                     if set[:7] == "http://" or set[:8] == "https://" or set[:6] == "ftp://":
                         try:
-                            self.setdefinitions[set] = SetDefinition(set,verbose=self.verbose) #will raise exception on error
+                            self.setdefinitions[set] = SetDefinition(set,verbose=self.verbose,cachedir=self.setdefinitioncache) #will raise exception on error
                         except DeepValidationError:
                             print("WARNING: Set " + set + " could not be downloaded, ignoring!",file=sys.stderr) #warning and ignore
 
@@ -6932,7 +7165,7 @@ class Document(object):
             self.annotations.append( (annotationtype,set) )
             if set and self.loadsetdefinitions and not set in self.setdefinitions:
                 if set[:7] == "http://" or set[:8] == "https://" or set[:6] == "ftp://":
-                    self.setdefinitions[set] = SetDefinition(set,verbose=self.verbose) #will raise exception on error
+                    self.setdefinitions[set] = SetDefinition(set,verbose=self.verbose,cachedir=self.setdefinitioncache) #will raise exception on error
         if not annotationtype in self.annotationdefaults:
             self.annotationdefaults[annotationtype] = {}
         self.annotationdefaults[annotationtype][set] = kwargs
@@ -7267,7 +7500,7 @@ class Document(object):
                 for subnode in node:
                     if subnode.tag == '{' + NSFOLIA + '}metadata':
                         self.parsemetadata(subnode)
-                    elif (subnode.tag == '{' + NSFOLIA + '}text' or subnode.tag == '{' + NSFOLIA + '}speech') and self.mode == Mode.MEMORY:
+                    elif (subnode.tag == '{' + NSFOLIA + '}text' or subnode.tag == '{' + NSFOLIA + '}speech') and self.mode in (Mode.MEMORY, Mode.LAZY):
                         if self.debug >= 1: print("[PyNLPl FoLiA DEBUG] Found Text",file=stderr)
                         e = self.parsexml(subnode)
                         if e is not None:
@@ -7354,22 +7587,33 @@ class Document(object):
 
 
     def select(self, Class, set=None, recursive=True,  ignore=True):
-        """See :meth:`AbstractElement.select`"""
-        if self.mode == Mode.MEMORY:
-            for t in self.data:
-                if Class.__name__ == 'Text':
-                    yield t
-                else:
-                    for e in t.select(Class,set,recursive,ignore):
-                        yield e
+        """See :meth:`AbstractElement.select`.
+
+        The results are cached in the document, so subsequent identical queries return the elements from the cache (in O(results)), until the document is modified."""
+        if self.mode != Mode.XPATH:
+            for e in self.selectlist(Class, set, recursive, ignore):
+                yield e
+
+    def selectlist(self, Class, set=None, recursive=True,  ignore=True):
+        """Like :meth:`select`, but returns a list. The list is shared with the query cache of the document and should not be modified!"""
+        key = (Class, set, recursive, tuple(ignore) if isinstance(ignore, list) else ignore)
+        try:
+            return self.selectcache[key]
+        except KeyError:
+            pass
+        elements = []
+        for t in self.data:
+            if Class.__name__ == 'Text':
+                elements.append(t)
+            else:
+                elements += t.select(Class,set,recursive,ignore)
+        self.selectcache[key] = elements
+        return elements
 
     def count(self, Class, set=None, recursive=True,ignore=True):
         """See :meth:`AbstractElement.count`"""
-        if self.mode == Mode.MEMORY:
-            s = 0
-            for t in self.data:
-                s +=  sum( 1 for e in t.select(Class,recursive,True ) )
-            return s
+        if self.mode != Mode.XPATH:
+            return len(self.selectlist(Class, set, recursive, ignore))
 
     def paragraphs(self, index = None):
         """Return a generator of all paragraphs found in the document.
@@ -7378,13 +7622,7 @@ class Document(object):
         if index is None:
             return self.select(Paragraph)
         else:
-            if index < 0:
-                index = sum(t.count(Paragraph) for t in self.data) + index
-            for t in self.data:
-                for i,e in enumerate(t.select(Paragraph)) :
-                    if i == index:
-                        return e
-            raise IndexError
+            return self.selectlist(Paragraph)[index]
 
     def sentences(self, index = None):
         """Return a generator of all sentence found in the document. Except for sentences in quotes.
@@ -7393,13 +7631,7 @@ class Document(object):
         if index is None:
             return self.select(Sentence,None,True,[Quote])
         else:
-            if index < 0:
-                index = sum(t.count(Sentence,None,True,[Quote]) for t in self.data) + index
-            for t in self.data:
-                for i,e in enumerate(t.select(Sentence,None,True,[Quote])) :
-                    if i == index:
-                        return e
-            raise IndexError
+            return self.selectlist(Sentence,None,True,[Quote])[index]
 
 
     def words(self, index = None):
@@ -7409,13 +7641,7 @@ class Document(object):
         if index is None:
             return self.select(Word,None,True,default_ignore_structure)
         else:
-            if index < 0:
-                index = sum(t.count(Word,None,True,default_ignore_structure) for t in self.data)  + index
-            for t in self.data:
-                for i, e in enumerate(t.select(Word,None,True,default_ignore_structure)):
-                    if i == index:
-                        return e
-            raise IndexError
+            return self.selectlist(Word,None,True,default_ignore_structure)[index]
 
 
 
@@ -7455,6 +7681,341 @@ class Document(object):
         return s
 
 
+    def writexml(self, stream):
+        """Serialise the document to XML and write it to a stream (a file, or gzip/bz2 file, opened in binary mode).
+
+        The output is identical to that of :meth:`xmlstring` (encoded as UTF-8), but the document is written incrementally: texts, speeches, divisions and paragraphs are not serialised as a whole but one child at a time, so memory usage remains proportional to the largest of those children rather than to the entire document. Used by :meth:`save`.
+        """
+        self.pendingvalidation()
+
+        root = self.xml(skipchildren=True)
+        header = self.xmlfixnamespaces(ElementTree.tostring(root, xml_declaration=True, pretty_print=True, encoding='utf-8'))
+        if not self.data:
+            stream.write(header)
+            return
+        end = header.rindex(b'</')
+        stream.write(header[:end])
+        for child in list(root):
+            root.remove(child) #the metadata has been written already
+
+        #The chain holds the XML elements (without children) of the root and the elements we are currently writing the children of,
+        #along with their closing tag once their opening tag has been written
+        chain = [ [root, header[end:]] ]
+        for text in self.data:
+            self.writexmlelement(stream, text, chain)
+        stream.write(header[end:])
+
+    def writexmlelement(self, stream, element, chain):
+        """Internal method, writes an element as a child of the last element in the chain, invoked by :meth:`writexml`"""
+        if isinstance(element, XMLSTREAMCLASSES) and element.__class__.xml.__code__ is AbstractElement.xml.__code__ and all( isinstance(child, AbstractElement) for child in element.data ):
+            #write the children one by one
+            shallow = element.xml(skipchildren=True)
+            chain[-1][0].append(shallow)
+            chain.append( [shallow, None] )
+            for child in element.xmlchildren():
+                self.writexmlelement(stream, child, chain)
+            _, closing = chain.pop()
+            chain[-1][0].remove(shallow)
+            if closing is not None:
+                stream.write(closing)
+                return
+            xml = shallow #no children have been written, write the empty element
+        else:
+            xml = element.xml()
+            if xml is None:
+                return
+
+        #serialise the chain with the element, so we obtain the exact indentation and namespaces as in the full document
+        chain[-1][0].append(xml)
+        s = self.xmlfixnamespaces(ElementTree.tostring(chain[0][0], pretty_print=True, encoding='utf-8'))
+        chain[-1][0].remove(xml)
+        #the first and last lines are the opening and closing tags of the chain
+        begin = 0
+        end = len(s)
+        for level in chain:
+            linebegin = begin
+            begin = s.index(b'\n', begin) + 1
+            lineend = end
+            end = s.rindex(b'\n', 0, end - 1) + 1
+            if level[1] is None:
+                stream.write(s[linebegin:begin])
+                level[1] = s[end:lineend]
+        stream.write(s[begin:end])
+
+    @staticmethod
+    def xmlfixnamespaces(s):
+        """Internal method, removes namespace prefixes from serialised XML (bytes)"""
+        return s.replace(b'ns0:',b'').replace(b':ns0',b'') #ugly patch to get rid of namespace prefix
+
+    def binary(self):
+        """Serialise the document to the compact binary representation.
+
+        The binary representation holds the document header (declarations and metadata) as XML, followed by a table of all distinct strings (IDs, sets, classes, text) and the element tree encoded in integer arrays. Loading it is considerably faster than parsing the XML as no XML has to be parsed for the body of the document, whereas :meth:`xmlstring` on the loaded document yields the same XML as on the original one. Note that the format is specific to this library (and version), it is meant as a cache and not as a replacement for FoLiA XML. It is loaded with ``Document(file=..., binary=True)`` (or ``string=``), never detected automatically.
+
+        Returns:
+            bytes
+
+        See also:
+            :meth:`Document.save`
+        """
+        self.pendingvalidation()
+
+        strings = {}
+        def stringindex(s):
+            try:
+                return strings[s]
+            except KeyError:
+                strings[s] = len(strings)
+                return strings[s]
+
+        #number all elements (depth-first), elements are numbered before their children
+        elements = []
+        numbers = {}
+        stack = list(reversed(self.data))
+        while stack:
+            e = stack.pop()
+            numbers[id(e)] = len(elements)
+            elements.append(e)
+            if isbinarystorable(e):
+                for child in reversed(e.data):
+                    if isinstance(child, AbstractElement) and child.parent is e:
+                        stack.append(child)
+
+        classes = {}
+        classarray = array.array('i')
+        shapes = {} #shape (attribute names and value types) => index
+        records = array.array('i')
+        floats = array.array('d')
+        fallbacks = array.array('i')
+        for n, e in enumerate(elements):
+            if not isbinarystorable(e):
+                #stored as XML
+                classarray.append(-1)
+                fallbacks.append(n)
+                fallbacks.append(stringindex(u(self.xmlfixnamespaces(ElementTree.tostring(e.xml(), encoding='utf-8')),'utf-8')))
+                continue
+            try:
+                classarray.append(classes[e.__class__])
+            except KeyError:
+                classes[e.__class__] = len(classes)
+                classarray.append(classes[e.__class__])
+            shape = []
+            payloads = []
+            for key in BINARYATTRIBS:
+                if key not in e.__dict__:
+                    continue
+                value = e.__dict__[key]
+                if value is None:
+                    shape.append( (stringindex(key), BinaryCode.NONE) )
+                elif value is True:
+                    shape.append( (stringindex(key), BinaryCode.TRUE) )
+                elif value is False:
+                    shape.append( (stringindex(key), BinaryCode.FALSE) )
+                elif isstring(value):
+                    shape.append( (stringindex(key), BinaryCode.STRING) )
+                    payloads.append(stringindex(value))
+                elif isinstance(value, int) and -2147483648 <= value <= 2147483647:
+                    shape.append( (stringindex(key), BinaryCode.INT) )
+                    payloads.append(value)
+                elif isinstance(value, float):
+                    shape.append( (stringindex(key), BinaryCode.FLOAT) )
+                    payloads.append(len(floats))
+                    floats.append(value)
+                elif isinstance(value, datetime):
+                    shape.append( (stringindex(key), BinaryCode.DATETIME) )
+                    payloads.append(stringindex(value.strftime("%Y-%m-%dT%H:%M:%S.%f")))
+                else: #list, tuple or dict (see isbinarystorable()), or an integer too large for the records
+                    shape.append( (stringindex(key), BinaryCode.TUPLE if isinstance(value, tuple) else BinaryCode.DICT if isinstance(value, dict) else BinaryCode.LIST) )
+                    payloads.append(stringindex(json.dumps(value)))
+            shape = tuple(shape)
+            try:
+                records.append(shapes[shape])
+            except KeyError:
+                shapes[shape] = len(shapes)
+                records.append(shapes[shape])
+            records.extend(payloads)
+            records.append(len(e.data))
+            for child in e.data:
+                #children are encoded as a single integer: index * 4 + code
+                if isstring(child):
+                    records.append(stringindex(child) * 4 + BinaryCode.STRING)
+                elif id(child) in numbers:
+                    records.append(numbers[id(child)] * 4 + (BinaryCode.CHILD if child.parent is e else BinaryCode.ELEMENT))
+                elif isinstance(child, AbstractElement) and child.id:
+                    #reference to an element that is not part of the document (anymore)
+                    records.append(stringindex(child.id) * 4 + BinaryCode.REFERENCE)
+                else:
+                    raise ValueError("Unable to serialise element " + repr(child) + " in " + repr(e))
+
+        shapearray = array.array('i')
+        for shape, _ in sorted(shapes.items(), key=lambda x: x[1]):
+            shapearray.append(len(shape))
+            for key, code in shape:
+                shapearray.append(key)
+                shapearray.append(code)
+        indexed = array.array('i', ( numbers[id(e)] for key, e in self.index.items() if id(e) in numbers and e.id == key ) )
+        toplevel = array.array('i', ( numbers[id(e)] for e in self.data ) )
+        stringtable = [None] * len(strings)
+        for s, i in strings.items():
+            stringtable[i] = s
+
+        header = self.xmlfixnamespaces(ElementTree.tostring(self.xml(skipchildren=True), encoding='utf-8'))
+        sections = [
+            header,
+            "\0".join(stringtable).encode('utf-8'),
+            "\0".join( binaryclasskey(cls) for cls, _ in sorted(classes.items(), key=lambda x: x[1]) ).encode('utf-8'),
+            "\0".join(sorted(self.textclasses)).encode('utf-8'),
+            tobytes(classarray),
+            tobytes(shapearray),
+            tobytes(records),
+            tobytes(floats),
+            tobytes(indexed),
+            tobytes(toplevel),
+            tobytes(fallbacks),
+        ]
+        return BINARYMAGIC + struct.pack('<BB', BINARYVERSION, sys.byteorder == 'little') + b"".join( struct.pack('<Q', len(section)) + section for section in sections )
+
+    def parsebinary(self, data):
+        """Internal method.
+
+        Loads a document from its binary representation, see :meth:`Document.binary`. Only element classes known by their XML tag and the attributes in ``BINARYATTRIBS`` are accepted."""
+        if data[:len(BINARYMAGIC)] != BINARYMAGIC:
+            raise Exception("Not a binary FoLiA document")
+        if self.mode == Mode.XPATH:
+            raise ModeError("Binary FoLiA documents can not be loaded in XPath mode")
+        version, littleendian = struct.unpack('<BB', data[len(BINARYMAGIC):len(BINARYMAGIC)+2])
+        if version != BINARYVERSION:
+            raise Exception("Unsupported version of binary FoLiA document: " + str(version))
+        sections = []
+        offset = len(BINARYMAGIC) + 2
+        while offset < len(data):
+            length = struct.unpack('<Q', data[offset:offset+8])[0]
+            sections.append(data[offset+8:offset+8+length])
+            offset += 8 + length
+        if len(sections) != 11:
+            raise Exception("Invalid binary FoLiA document")
+        header, stringtable, classtable, textclasses, classarray, shapearray, records, floats, indexed, toplevel, fallbacks = sections
+
+        #header: declarations and metadata
+        self.parsexml(xmltreefromstring(header).getroot())
+
+        strings = u(stringtable,'utf-8').split("\0")
+        classtable = [ binaryclass(key) for key in u(classtable,'utf-8').split("\0") if key ]
+        self.textclasses.update( cls for cls in u(textclasses,'utf-8').split("\0") if cls )
+        arrays = []
+        for section, typecode in ((classarray,'i'), (shapearray,'i'), (records,'i'), (floats,'d'), (indexed,'i'), (toplevel,'i'), (fallbacks,'i')):
+            a = array.array(typecode)
+            frombytes(a, section)
+            if bool(littleendian) != (sys.byteorder == 'little'):
+                a.byteswap()
+            arrays.append(a.tolist())
+        classarray, shapearray, records, floats, indexed, toplevel, fallbacks = arrays
+
+        shapes = [] #(constant attributes, attributes with a payload)
+        pos = 0
+        while pos < len(shapearray):
+            constant = {'doc': self}
+            variable = []
+            for i in range(pos+1, pos+1+shapearray[pos]*2, 2):
+                key, code = strings[shapearray[i]], shapearray[i+1]
+                if key not in BINARYATTRIBS:
+                    raise Exception("Invalid binary FoLiA document, unknown attribute: " + key)
+                if code == BinaryCode.NONE:
+                    constant[key] = None
+                elif code == BinaryCode.TRUE:
+                    constant[key] = True
+                elif code == BinaryCode.FALSE:
+                    constant[key] = False
+                else:
+                    variable.append( (key, code) )
+            shapes.append( (constant, variable) )
+            pos += 1 + shapearray[pos]*2
+
+        gcenabled = gc.isenabled()
+        gc.disable() #we create many objects but no garbage, spare the garbage collector the effort
+        try:
+            self.parsebinaryelements(strings, classtable, classarray, shapes, records, floats, indexed, toplevel, fallbacks)
+        finally:
+            if gcenabled: gc.enable()
+
+    def parsebinaryelements(self, strings, classtable, classarray, shapes, records, floats, indexed, toplevel, fallbacks):
+        """Internal method, reconstructs the elements from their binary representation, invoked by :meth:`parsebinary`"""
+        elements = [ classtable[c].__new__(classtable[c]) if c >= 0 else None for c in classarray ]
+        #elements stored as XML and references by ID are only filled in once the index is complete, as they may refer to any other element
+        pendingelements = [] #(data, position, element number, parent or None)
+        pendingreferences = [] #(data, position, ID, parent)
+        datetimes = {}
+        pos = 0
+        for e in elements:
+            if e is None: continue #element stored as XML, parsed later
+            d = e.__dict__
+            constant, variable = shapes[records[pos]]
+            pos += 1
+            d.update(constant)
+            for key, code in variable:
+                payload = records[pos]
+                pos += 1
+                if code == BinaryCode.STRING:
+                    d[key] = strings[payload]
+                else:
+                    if code == BinaryCode.INT:
+                        d[key] = payload
+                    elif code == BinaryCode.FLOAT:
+                        d[key] = floats[payload]
+                    elif code == BinaryCode.DATETIME:
+                        try:
+                            d[key] = datetimes[payload]
+                        except KeyError:
+                            d[key] = datetimes[payload] = datetime.strptime(strings[payload], "%Y-%m-%dT%H:%M:%S.%f")
+                    elif code == BinaryCode.TUPLE:
+                        d[key] = tuple(json.loads(strings[payload]))
+                    elif code in (BinaryCode.LIST, BinaryCode.DICT):
+                        d[key] = json.loads(strings[payload])
+                    else:
+                        raise Exception("Invalid binary FoLiA document, unknown type of value for " + key)
+            nchildren = records[pos]
+            pos += 1
+            data = d['data'] = []
+            for value in records[pos:pos+nchildren]:
+                code = value & 3
+                if code == BinaryCode.STRING:
+                    data.append(strings[value >> 2])
+                elif code == BinaryCode.CHILD or code == BinaryCode.ELEMENT:
+                    child = elements[value >> 2]
+                    if child is None:
+                        pendingelements.append( (data, len(data), value >> 2, e if code == BinaryCode.CHILD else None) )
+                    elif code == BinaryCode.CHILD:
+                        child.__dict__['parent'] = e
+                    data.append(child)
+                else: #BinaryCode.REFERENCE
+                    pendingreferences.append( (data, len(data), strings[value >> 2], e) )
+                    data.append(None)
+            pos += nchildren
+
+        for n in indexed:
+            if elements[n] is not None:
+                self.index[elements[n].id] = elements[n]
+        for i in range(0, len(fallbacks), 2):
+            elements[fallbacks[i]] = self.parsexml(xmltreefromstring(strings[fallbacks[i+1]]).getroot()) #registers its own IDs in the index
+        for data, i, n, parent in pendingelements:
+            data[i] = elements[n]
+            if parent is not None:
+                data[i].parent = parent
+        for data, i, id, parent in pendingreferences:
+            try:
+                data[i] = self[id]
+            except KeyError:
+                data[i] = WordReference(self, id=id)
+                data[i].parent = parent
+        for n in toplevel:
+            elements[n].parent = None
+            self.data.append(elements[n])
+        for e in elements:
+            if isinstance(e, AbstractSpanAnnotation):
+                for child in e.data:
+                    if isinstance(child, (Word, Morpheme, Phoneme, WordReference)):
+                        e.addtospanindex(child)
+
     def __unicode__(self):
         """Returns the text of the entire document"""
         return self.text()
@@ -7549,7 +8110,7 @@ class CorpusFiles(Corpus):
 
 
 class CorpusProcessor(object):
-    """Processes a corpus of various FoLiA documents using a parallel processing. Calls a user-defined function with the three-tuple (filename, args, kwargs) for each file in the corpus. The user-defined function is itself responsible for instantiating a FoLiA document! args and kwargs, as received by the custom function, are set through the run() method, which yields the result of the custom function on each iteration."""
+    """Processes a corpus of various FoLiA documents using a parallel processing. Calls a user-defined function with the three-tuple (filename, args, kwargs) for each file in the corpus. The user-defined function is itself responsible for instantiating a FoLiA document! args and kwargs, as received by the custom function, are set through the run() method, which yields the result of the custom function on each iteration. For aggregating results over a corpus, consider :class:`CorpusMapReduce` instead."""
 
     def __init__(self,corpusdir, function, threads = None, extension = 'xml', restrict_to_collection = "", conditionf=lambda x: True, maxtasksperchild=100, preindex = False, ordered=True, chunksize = 1):
         self.function = function
@@ -7583,17 +8144,426 @@ class CorpusProcessor(object):
             self.index = CorpusFiles(self.corpusdir, self.extension, self.restrict_to_collection, self.conditionf, True) #generator
         pool = multiprocessing.Pool(self.threads,None,None, self.maxtasksperchild)
         if self.ordered:
-            return pool.imap( self.function,  ( (filename, args, kwargs) for filename in self.index), self.chunksize)
+            results = pool.imap( self.function,  ( (filename, args, kwargs) for filename in self.index), self.chunksize)
         else:
-            return pool.imap_unordered( self.function,  ( (filename, args, kwargs) for filename in self.index), self.chunksize)
-        #pool.close()
+            results = pool.imap_unordered( self.function,  ( (filename, args, kwargs) for filename in self.index), self.chunksize)
+        pool.close() #no more tasks, workers exit once all submitted tasks are done
+        return results
 
 
 
     def __iter__(self):
         return self.run()
 
+class CorpusFileReport(object):
+    """Report on the processing of a single file by :class:`CorpusMapReduce`.
+
+    Attributes:
+        filename (str): The file that was processed
+        size (int): The size of the file in bytes
+        duration (float): Time (in seconds) spent on loading the document and running the mapper on it
+        error (str or None): Description of the error (including the traceback) if processing failed, ``None`` otherwise
+    """
+
+    def __init__(self, filename, size, duration, error=None):
+        self.filename = filename
+        self.size = size
+        self.duration = duration
+        self.error = error
+
+    def ok(self):
+        """Returns ``True`` if the file was processed successfully"""
+        return self.error is None
+
+    def __str__(self):
+        if self.error is None:
+            return self.filename + "\tOK\t" + str(self.size) + "\t" + "%.3f" % self.duration
+        else:
+            return self.filename + "\tFAILED\t" + str(self.size) + "\t" + "%.3f" % self.duration + "\t" + self.error.strip().split("\n")[-1]
+
+
+def mapreducechunk(task):
+    """Processes a chunk of files for :class:`CorpusMapReduce` (runs in the worker processes): applies the mapper to each document and reduces the results locally, so only the partial result and the reports are sent back to the master process."""
+    mapper, reducer, filenames, load, documentkwargs = task
+    result = None
+    empty = True
+    reports = []
+    for filename, size in filenames:
+        begintime = time.time()
+        try:
+            if load:
+                doc = Document(file=filename, **documentkwargs)
+                r = mapper(doc)
+                del doc
+            else:
+                r = mapper(filename)
+        except Exception: #pylint: disable=broad-except
+            reports.append( CorpusFileReport(filename, size, time.time() - begintime, traceback.format_exc()) )
+            continue
+        if empty:
+            result = r
+            empty = False
+        else:
+            result = reducer(result, r)
+        reports.append( CorpusFileReport(filename, size, time.time() - begintime) )
+    return empty, result, reports
+
+
+class CorpusMapReduce(object):
+    """Processes a corpus of FoLiA documents in parallel, following a map/reduce scheme.
+
+    A user-defined *mapper* function is called on each document (a :class:`Document` instance, loaded in a worker process) and returns a partial result. The partial results are combined using the user-defined *reducer* function, which takes two results and returns a combined one. The reducer must be associative, as results are reduced locally in the worker processes first (so documents are never sent between processes), and the partial results of the workers are in turn reduced in the master process as they come in. Results such as :class:`pynlpl.statistics.FrequencyList` or :class:`pynlpl.evaluation.ClassEvaluation` instances can be reduced using addition, which is the default reducer.
+
+    Both mapper and reducer must be picklable, i.e. defined at the module level.
+
+    Example::
+
+        def wordfrequencies(doc):
+            freqlist = FrequencyList()
+            for word in doc.words():
+                freqlist.count(word.text())
+            return freqlist
+
+        mapreduce = folia.CorpusMapReduce(folia.CorpusFiles('/path/to/corpus'), wordfrequencies)
+        freqlist = mapreduce.run()
+        for report in mapreduce.failed():
+            print(report)
+
+    Arguments:
+        corpus: The files to process, a :class:`CorpusFiles` instance or any iterable of filenames
+        mapper: The function to call on each document, returns a result
+        reducer: The function combining two results into one (default: addition)
+
+    Keyword Arguments:
+        initial: The initial result, the result of the reduction if no files could be processed successfully (default: ``None``)
+        threads (int or None): The number of worker processes, defaults to the number of available cores. If set to 1, the corpus is processed in the current process.
+        maxtasksperchild (int): The number of chunks a worker process handles before it is replaced by a fresh one, this keeps memory leaks (lxml!) in check.
+        chunksize (int or None): The number of files submitted to a worker at once. If ``None`` (default), chunks are formed by total file size instead, so each worker gets about four chunks of comparable size.
+        balance (bool): Process the largest files first (default: ``True``) so that large files do not end up straggling at the end
+        load (bool): Load the documents and pass the :class:`Document` to the mapper (default: ``True``). If set to ``False``, the mapper gets the filename instead and is itself responsible for instantiating (or streaming) the document.
+        ignoreerrors (bool): Carry on if processing a file fails (default: ``True``), failures are available through :meth:`failed`. If set to ``False``, an exception is raised after the run instead.
+        progress: A function that is called in the master process with a :class:`CorpusFileReport` each time a file has been processed
+        Any other keyword arguments will be passed to :class:`Document` when loading a document (e.g. ``mode=folia.Mode.LAZY``).
+
+    Attributes:
+        reports (list): A :class:`CorpusFileReport` for each file processed during the last run
+    """
+
+    def __init__(self, corpus, mapper, reducer=operator.add, initial=None, threads=None, maxtasksperchild=100, chunksize=None, balance=True, load=True, ignoreerrors=True, progress=None, **kwargs):
+        self.corpus = corpus
+        self.mapper = mapper
+        self.reducer = reducer
+        self.initial = initial
+        self.threads = threads if threads else multiprocessing.cpu_count()
+        self.maxtasksperchild = maxtasksperchild #This should never be set too high due to lxml leaking memory!!!
+        self.chunksize = chunksize
+        self.balance = balance
+        self.load = load
+        self.ignoreerrors = ignoreerrors
+        self.progress = progress
+        self.documentkwargs = kwargs
+        self.reports = []
+
+    def chunks(self):
+        """Divides the corpus into chunks of files, returns a list of lists of ``(filename, size)`` tuples"""
+        files = [ (filename, os.path.getsize(filename)) for filename in self.corpus ]
+        if self.balance:
+            files.sort(key=lambda x: -x[1])
+        if self.chunksize:
+            return [ files[i:i+self.chunksize] for i in range(0, len(files), self.chunksize) ]
+        maxsize = sum( size for _, size in files ) / (self.threads * 4)
+        chunks = []
+        chunk = []
+        chunksize = 0
+        for filename, size in files:
+            if chunk and chunksize + size > maxsize:
+                chunks.append(chunk)
+                chunk = []
+                chunksize = 0
+            chunk.append( (filename, size) )
+            chunksize += size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def run(self):
+        """Processes the corpus and returns the reduced result. Per-file reports are stored in ``self.reports`` afterwards."""
+        self.reports = []
+        tasks = ( (self.mapper, self.reducer, chunk, self.load, self.documentkwargs) for chunk in self.chunks() )
+        if self.threads == 1:
+            pool = None
+            partials = ( mapreducechunk(task) for task in tasks )
+        else:
+            pool = multiprocessing.Pool(self.threads, None, None, self.maxtasksperchild)
+            partials = pool.imap_unordered(mapreducechunk, tasks)
+        result = self.initial
+        empty = self.initial is None
+        try:
+            for partialempty, partial, reports in partials:
+                if not partialempty:
+                    if empty:
+                        result = partial
+                        empty = False
+                    else:
+                        result = self.reducer(result, partial)
+                for report in reports:
+                    self.reports.append(report)
+                    if self.progress: self.progress(report)
+            if pool is not None:
+                pool.close()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        failed = self.failed()
+        if failed and not self.ignoreerrors:
+            raise Exception("Processing of " + str(len(failed)) + " file(s) failed, first failure: " + failed[0].filename + "\n" + failed[0].error)
+        return result
+
+    def failed(self):
+        """Returns the reports (:class:`CorpusFileReport`) of all files that failed to process in the last run"""
+        return [ report for report in self.reports if report.error is not None ]
+
+    def duration(self):
+        """Returns the total processing time of all files in the last run (summed over all workers)"""
+        return sum( report.duration for report in self.reports )
+
+
+
+class CorpusIndex(object):
+    """Persistent inverted index over a corpus of FoLiA documents, stored on disk as an SQLite database.
+
+    The index records, for every word in every indexed document, its position along with its text and the classes of its token annotations (e.g. PoS tags, lemmas). It can be built once and is subsequently used to answer :class:`Pattern` queries without parsing the entire corpus: the index determines which documents contain candidate matches and only those documents are loaded and searched.
+
+    Example::
+
+        index = folia.CorpusIndex('corpus.index')
+        index.build(folia.CorpusFiles('/path/to/corpus'))
+        for match in index.findwords( folia.Pattern('a',True,'house') ):
+            for word in match:
+                print word.doc.filename, word.id
+
+    Arguments:
+        filename (str): The file holding the index, will be created if it does not exist yet.
+        annotations (tuple): Token annotation classes to index (in addition to the text of the words), defaults to all token annotations.
+
+    Keyword arguments:
+        Any other keyword arguments will be passed to :class:`Document` when loading a document from the corpus.
+    """
+
+    def __init__(self, filename, annotations=(AbstractTokenAnnotation,), **kwargs):
+        self.filename = filename
+        self.annotations = tuple(annotations)
+        self.documentkwargs = kwargs
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (id INTEGER PRIMARY KEY, filename TEXT UNIQUE, docid TEXT, mtime REAL, words INTEGER);
+            CREATE TABLE IF NOT EXISTS terms (id INTEGER PRIMARY KEY, field TEXT, annotationset TEXT, value TEXT, lvalue TEXT, UNIQUE(field, annotationset, value));
+            CREATE INDEX IF NOT EXISTS terms_lvalue ON terms (field, lvalue);
+            CREATE TABLE IF NOT EXISTS postings (term INTEGER, document INTEGER, position INTEGER);
+            CREATE INDEX IF NOT EXISTS postings_term ON postings (term, document);
+            CREATE INDEX IF NOT EXISTS postings_document ON postings (document);
+        """)
+        self.terms = {}
 
+    def __len__(self):
+        """Returns the number of indexed documents"""
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def __iter__(self):
+        """Iterates over the filenames of all indexed documents"""
+        for (filename,) in self.connection.execute("SELECT filename FROM documents ORDER BY id"):
+            yield filename
+
+    def __contains__(self, filename):
+        return self.connection.execute("SELECT id FROM documents WHERE filename=?", (filename,)).fetchone() is not None
+
+    def close(self):
+        self.connection.close()
+
+    def build(self, corpus, force=False):
+        """Add all documents of a corpus to the index.
+
+        Arguments:
+            corpus: A :class:`Corpus` or :class:`CorpusFiles` instance, or any iterable over filenames or :class:`Document` instances.
+            force (bool): Reindex documents that are already in the index and have not been modified since. Defaults to ``False``.
+        """
+        for item in corpus:
+            if isinstance(item, Document):
+                self.add(item.filename, item, force)
+            else:
+                self.add(item, None, force)
+
+    def add(self, filename, doc=None, force=False):
+        """Add a single document to the index. Documents that were indexed before are reindexed if they have been modified on disk (or if ``force`` is set).
+
+        Arguments:
+            filename (str): The filename of the document
+            doc (:class:`Document`): The loaded document, will be loaded from ``filename`` if not provided.
+            force (bool): Reindex even if the document has not been modified since it was last indexed
+
+        Returns:
+            bool: ``True`` if the document was (re)indexed, ``False`` if it was up to date
+        """
+        if not filename:
+            raise ValueError("Documents can only be indexed if they are associated with a file")
+        filename = os.path.abspath(filename)
+        mtime = os.path.getmtime(filename)
+        row = self.connection.execute("SELECT id, mtime FROM documents WHERE filename=?", (filename,)).fetchone()
+        if row is not None and row[1] == mtime and not force:
+            return False
+        if doc is None:
+            doc = Document(file=filename, **self.documentkwargs)
+        with self.connection:
+            if row is not None:
+                docnr = row[0]
+                self.connection.execute("DELETE FROM postings WHERE document=?", (docnr,))
+            else:
+                docnr = self.connection.execute("INSERT INTO documents (filename) VALUES (?)", (filename,)).lastrowid
+            postings = []
+            position = -1
+            for position, word in enumerate(doc.words()):
+                try:
+                    postings.append( (self._term('t', '', word.text()), docnr, position) )
+                except NoSuchText:
+                    pass
+                #findwords only matches annotations that occur exactly once (for the set in question), the same holds for the index
+                values = {}
+                for annotation in word.select(self.annotations, None, True, [Original, Suggestion, Alternative]):
+                    key = (annotation.XMLTAG, annotation.set if annotation.set else '')
+                    values[key] = None if key in values else annotation.cls
+                for (field, annotationset), value in values.items():
+                    if value is not None:
+                        postings.append( (self._term(field, annotationset, value), docnr, position) )
+            self.connection.executemany("INSERT INTO postings (term, document, position) VALUES (?,?,?)", postings)
+            self.connection.execute("UPDATE documents SET docid=?, mtime=?, words=? WHERE id=?", (doc.id, mtime, position+1, docnr))
+        return True
+
+    def remove(self, filename):
+        """Remove a document from the index"""
+        filename = os.path.abspath(filename)
+        with self.connection:
+            row = self.connection.execute("SELECT id FROM documents WHERE filename=?", (filename,)).fetchone()
+            if row is None:
+                raise KeyError(filename)
+            self.connection.execute("DELETE FROM postings WHERE document=?", (row[0],))
+            self.connection.execute("DELETE FROM documents WHERE id=?", (row[0],))
+
+    def _term(self, field, annotationset, value):
+        """Returns the ID for a term (adding it if it is new)"""
+        key = (field, annotationset, value)
+        try:
+            return self.terms[key]
+        except KeyError:
+            row = self.connection.execute("SELECT id FROM terms WHERE field=? AND annotationset=? AND value=?", key).fetchone()
+            if row is None:
+                termid = self.connection.execute("INSERT INTO terms (field, annotationset, value, lvalue) VALUES (?,?,?,?)", key + (value.lower(),)).lastrowid
+            else:
+                termid = row[0]
+            self.terms[key] = termid
+            return termid
+
+    def _matchingterms(self, pattern, item):
+        """Returns the IDs of all terms that may match the pattern item, or ``None`` if the item does not constrain the match at all"""
+        if item is True or item == '*':
+            return None
+        if pattern.matchannotation:
+            if not issubclass(pattern.matchannotation, self.annotations):
+                return None #annotation not indexed
+            field = pattern.matchannotation.XMLTAG
+        else:
+            field = 't'
+        query = "SELECT id, value, lvalue FROM terms WHERE field=?"
+        params = [field]
+        if pattern.matchannotation and pattern.matchannotationset:
+            #(if no set is specified, findwords uses the default set of each document, so we can't restrict on set here)
+            query += " AND annotationset=?"
+            params.append(pattern.matchannotationset)
+        if isinstance(item, RegExp):
+            return [ termid for termid, value, lvalue in self.connection.execute(query, params) if item.regexp.match(value if pattern.casesensitive else lvalue) ]
+        if not isinstance(item, (tuple, list)):
+            item = (item,)
+        if pattern.casesensitive:
+            query += " AND value IN (" + ",".join("?" * len(item)) + ")"
+            params += [ u(x) for x in item ]
+        else:
+            query += " AND lvalue IN (" + ",".join("?" * len(item)) + ")"
+            params += [ u(x).lower() for x in item ]
+        return [ termid for termid, _, _ in self.connection.execute(query, params) ]
+
+    def _postings(self, termids):
+        """Returns all (document, position) tuples for the specified terms"""
+        postings = set()
+        for i in range(0, len(termids), 500): #stay below SQLite's limit on the number of query parameters
+            chunk = termids[i:i+500]
+            postings.update(self.connection.execute("SELECT document, position FROM postings WHERE term IN (" + ",".join("?" * len(chunk)) + ")", chunk))
+        return postings
+
+    def _constraints(self, patterns):
+        """Yields, for each position in the patterns, the postings that may match there (or ``None`` if unconstrained).
+
+        When multiple patterns are provided, findwords() skips patterns whose annotation a word does not carry, a word matching any one pattern at a position is therefore a candidate"""
+        for i in range(len(patterns[0])):
+            termids = []
+            for pattern in patterns:
+                matchingterms = self._matchingterms(pattern, pattern.sequence[i])
+                if matchingterms is None:
+                    termids = None
+                    break
+                termids += matchingterms
+            if termids is None:
+                yield i, None
+            else:
+                yield i, self._postings(termids)
+
+    def candidates(self, *patterns):
+        """Returns the filenames of the documents that may contain matches for the specified patterns, in index order. All documents that do contain matches are guaranteed to be returned.
+
+        Arguments:
+            *patterns: The :class:`Pattern` instances, as passed to :meth:`findwords`
+        """
+        if not patterns:
+            raise ValueError("Expected at least one pattern")
+        for pattern in patterns:
+            if not isinstance(pattern, Pattern):
+                raise TypeError("You must pass instances of Pattern to findwords")
+
+        documents = None
+        if any( len(pattern) != len(patterns[0]) for pattern in patterns ):
+            pass #findwords() will refuse these, nothing to restrict
+        elif all( pattern.variablesize() for pattern in patterns ):
+            #variable-size patterns (with aligned wildcards): all constraints must occur in the document
+            for _, postings in self._constraints(patterns):
+                if postings is None: continue
+                postings = set( document for document, _ in postings )
+                documents = postings if documents is None else documents & postings
+                if not documents: return []
+        else:
+            #fixed-size patterns (any * wildcards act as single-word wildcards): intersect the start positions of the match candidates
+            starts = None
+            for i, postings in self._constraints(patterns):
+                if postings is None: continue
+                postings = set( (document, position - i) for document, position in postings if position >= i )
+                starts = postings if starts is None else starts & postings
+                if not starts: return []
+            if starts is not None:
+                documents = set( document for document, _ in starts )
+
+        filenames = []
+        for docnr, filename in self.connection.execute("SELECT id, filename FROM documents ORDER BY id"):
+            if documents is None or docnr in documents:
+                filenames.append(filename)
+        return filenames
+
+    def findwords(self, *args, **kwargs):
+        """Find patterns of words in the indexed corpus, only documents that contain candidate matches will be loaded.
+
+        Takes the same arguments as :meth:`Document.findwords` and yields all matches, each match being a list of :class:`Word` instances (the document can be obtained through their ``doc`` attribute).
+        """
+        for filename in self.candidates(*args):
+            doc = Document(file=filename, **self.documentkwargs)
+            for match in doc.findwords(*args, **kwargs):
+                yield match
 
 
 
@@ -7703,6 +8673,82 @@ def relaxng(filename=None):
 
 
 
+def childindex(parent, child):
+    """Returns the position of the child in its parent (by identity rather than by equality)"""
+    for i, c in enumerate(parent.data):
+        if c is child:
+            return i
+    raise ValueError("Element not found in parent")
+
+def findspans(element, type, set=None):
+    """Returns the span annotation elements of the specified type that include the specified word, morpheme or phoneme, in the order in which :meth:`Word.findspans` yields them (used by the latter).
+
+    Rather than searching all span annotation layers in scope, this uses the reverse index maintained by the document: candidates are the spans directly containing the element and the spans enclosing those.
+    """
+    if issubclass(type, AbstractAnnotationLayer):
+        layerclass = type
+        spanclass = AbstractSpanAnnotation
+    else:
+        layerclass = ANNOTATIONTYPE2LAYERCLASS[type.ANNOTATIONTYPE]
+        spanclass = type
+    if element.doc is None:
+        return []
+
+    #collect the spans that directly contain the element, pruning stale index entries along the way
+    direct = []
+    for key in (id(element), element.id):
+        if key is None or key not in element.doc.spanindex: continue
+        spans = []
+        for span in element.doc.spanindex[key]:
+            if any( span is s for s in spans ): continue
+            for c in span.data:
+                if c is element or (isinstance(c, WordReference) and c.id == element.id and element.doc.index.get(c.id) is element):
+                    spans.append(span)
+                    break
+        if spans:
+            element.doc.spanindex[key] = spans
+        else:
+            del element.doc.spanindex[key]
+        direct += spans
+
+    #spans enclosing these also include the element (see AbstractSpanAnnotation.wrefs())
+    candidates = []
+    for span in direct:
+        while span is not None:
+            if not any( span is c for c in candidates ):
+                candidates.append(span)
+            parent = span.parent
+            if isinstance(parent, AbstractCorrectionChild) and parent.auth and isinstance(parent.parent, Correction) and parent.parent.auth:
+                parent = parent.parent.parent
+            span = parent if isinstance(parent, AbstractSpanAnnotation) else None
+
+    ancestors = {} #id(ancestor) => distance
+    e = element
+    while e.parent:
+        e = e.parent
+        ancestors[id(e)] = len(ancestors)
+
+    results = []
+    for span in candidates:
+        if not isinstance(span, spanclass) or isinstance(span, AbstractSpanRole) or not span.auth or (set is not None and span.set != set):
+            continue
+        #the span must be reachable from a layer in scope of the element, without passing non-authoritative elements, words or morphemes
+        path = [span]
+        e = span.parent
+        while e is not None and not isinstance(e, layerclass):
+            if isinstance(e, (Word, Morpheme)) or not e.auth or (set is not None and isinstance(e, spanclass) and e.set != set):
+                e = None
+            else:
+                path.append(e)
+                e = e.parent
+        if e is None or not e.auth or (set is not None and e.set != set) or id(e.parent) not in ancestors:
+            continue
+        path.append(e)
+        key = [ancestors[id(e.parent)]] + [ childindex(p.parent, p) for p in reversed(path) ]
+        results.append( (key, span) )
+    results.sort(key=lambda x: x[0])
+    return [ span for _, span in results ]
+
 def findwords(doc, worditerator, *args, **kwargs):
     if 'leftcontext' in kwargs:
         leftcontext = int(kwargs['leftcontext'])
@@ -7790,7 +8836,7 @@ def findwords(doc, worditerator, *args, **kwargs):
                         items = list(word.select(pattern.matchannotation, pattern.matchannotationset, True, [Original, Suggestion, Alternative]))
                     else:
                         try:
-                            set = doc.defaultset(pattern.matchannotation.ANNOTATIONTYPE)
+                            set = word.doc.defaultset(pattern.matchannotation.ANNOTATIONTYPE)
                             items = list(word.select(pattern.matchannotation, set, True, [Original, Suggestion, Alternative] ))
                         except KeyError:
                             continue
@@ -7822,7 +8868,10 @@ def findwords(doc, worditerator, *args, **kwargs):
 class Reader(object):
     """Streaming FoLiA reader.
 
-    The reader allows you to read a FoLiA Document without holding the whole tree structure in memory. The document will be read and the elements you seek returned as they are found. If you are querying a corpus of large FoLiA documents for a specific structure, then it is strongly recommend to use the Reader rather than the standard Document!"""
+    The reader allows you to read a FoLiA Document without holding the whole tree structure in memory. The document will be read and the elements you seek returned as they are found. If you are querying a corpus of large FoLiA documents for a specific structure, then it is strongly recommend to use the Reader rather than the standard Document!
+
+    The metadata and the elements are read in a single pass over the XML. Everything that has been returned is subsequently discarded from the XML tree (along with everything preceding it), so memory consumption remains constant regardless of the size of the document. For the same reason, the returned elements are not added to the document index (``reader.doc``) beyond the iteration in which they are returned.
+    """
 
 
     def __init__(self, filename, target, *args, **kwargs):
@@ -7830,76 +8879,122 @@ class Reader(object):
 
         Arguments:
 
-            * ``filename``: The filename of the document to read
-            * ``target``: The FoLiA element(s) you want to read (with everything contained in its scope). Passed as a class. For example: ``folia.Sentence``, or a tuple of multiple element classes. Can also be set to ``None`` to return all elements, but that would load the full tree structure into memory.
+            * ``filename``: The filename of the document to read (may be compressed with gzip or bzip2), or a list of filenames, or a :class:`CorpusFiles` instance, to read multiple documents one after another.
+            * ``target``: The FoLiA element(s) you want to read (with everything contained in its scope). Passed as a class. For example: ``folia.Sentence``, or a tuple of multiple element classes. If target elements are nested, only the outermost ones are returned.
 
+        After construction, ``reader.doc`` holds the :class:`Document` (with metadata, but without any contents) of the file currently being read.
         """
 
+        self.stream = None
+        self.parser = None #parser for the current file, metadata already processed, elements pending
         self.target = target
-        if not (isinstance(self.target, tuple) or isinstance(self.target, list) or issubclass(self.target, AbstractElement)):
+        if isinstance(self.target, list):
+            self.target = tuple(self.target)
+        if not ((isinstance(self.target, tuple) and all( inspect.isclass(t) and issubclass(t, AbstractElement) for t in self.target )) or (inspect.isclass(self.target) and issubclass(self.target, AbstractElement))):
             raise ValueError("Target must be subclass of FoLiA element")
         if 'bypassleak' in kwargs:
             self.bypassleak = False
-        self.stream = io.open(filename,'rb')
-        self.initdoc()
-
+        if isstring(filename):
+            self.filenames = [filename]
+        else:
+            self.filenames = filename
+        self.filename = None
+        self.doc = None
+        if isinstance(self.filenames, (list, tuple)) and self.filenames:
+            #read the metadata of the first document already, so it is available
+            self.initdoc(self.filenames[0])
 
     def findwords(self, *args, **kwargs):
-        self.target = Word
+        if self.target is not Word:
+            self.target = Word
+            self.close() #any prepared parser was looking for a different target
         for x in findwords(self.doc,self.__iter__,*args,**kwargs):
             yield x
 
-    def initdoc(self):
+    def targettags(self):
+        if isinstance(self.target, tuple):
+            return [ "{" + NSFOLIA + "}" + Class.XMLTAG for Class in self.target ]
+        else:
+            return [ "{" + NSFOLIA + "}" + self.target.XMLTAG ]
+
+    def initdoc(self, filename):
+        """Opens the specified file and reads its metadata, creating the document (``self.doc``). The parser is left at the end of the metadata."""
+        self.close()
+        self.filename = filename
+        if filename[-4:].lower() == '.bz2':
+            self.stream = bz2.BZ2File(filename)
+        elif filename[-3:].lower() == '.gz':
+            self.stream = gzip.GzipFile(filename) #pylint: disable=redefined-variable-type
+        else:
+            self.stream = io.open(filename,'rb')
+
         self.doc = None
-        metadata = False
-        for action, node in ElementTree.iterparse(self.stream, events=("start","end")):
+        self.parser = ElementTree.iterparse(self.stream, events=("start","end"), tag=["{" + NSFOLIA + "}FoLiA", "{" + NSFOLIA + "}metadata"] + self.targettags())
+        for action, node in self.parser:
             if action == "start" and node.tag == "{" + NSFOLIA + "}FoLiA":
                 if '{http://www.w3.org/XML/1998/namespace}id' in node.attrib:
                     id = node.attrib['{http://www.w3.org/XML/1998/namespace}id']
+                else:
+                    raise MalformedXMLError("FoLiA Document has no ID!")
                 self.doc = Document(id=id)
                 if 'version' in node.attrib:
                     self.doc.version = node.attrib['version']
-            if action == "end" and node.tag == "{" + NSFOLIA + "}metadata":
+            elif action == "end" and node.tag == "{" + NSFOLIA + "}metadata":
                 if not self.doc:
                     raise MalformedXMLError("Metadata found, but no document? Impossible")
-                metadata = True
                 self.doc.parsemetadata(node)
+                return
+            elif node.tag != "{" + NSFOLIA + "}metadata":
                 break
 
-
         if not self.doc:
             raise MalformedXMLError("No FoLiA Document found!")
-        elif not metadata:
+        else:
             raise MalformedXMLError("No metadata found!")
 
-        self.stream.seek(0)
-
+    def close(self):
+        """Closes the file currently being read"""
+        self.parser = None
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
 
     def __iter__(self):
-        """Iterating over a Reader instance will cause the FoLiA document to be read. This is a generator yielding instances of the object you specified"""
-
-        if not isinstance(self.target, tuple) or isinstance(self.target,list):
-            target = "{" + NSFOLIA + "}" + self.target.XMLTAG
-            Class = self.target
-            multitargets = False
-        else:
-            multitargets = True
-
-        for action, node in ElementTree.iterparse(self.stream, events=("end",), tag=target):
-            if not multitargets or (multitargets and node.tag.startswith('{' + NSFOLIA + '}')):
-                if not multitargets: Class = XML2CLASS[node.tag[nslen:]]
-                if not multitargets or (multitargets and Class in self.targets):
-                    element = Class.parsexml(node, self.doc)
-                    node.clear() #clean up children
-                    # Also eliminate now-empty references from the root node to
-                    # elem (http://www.ibm.com/developerworks/xml/library/x-hiperfparse/)
-                    #for ancestor in node.xpath('ancestor-or-self::*'):
-                    while node.getprevious() is not None:
-                        del node.getparent()[0]  # clean up preceding siblings
+        """Iterating over a Reader instance will cause the FoLiA document(s) to be read. This is a generator yielding instances of the object you specified"""
+        for filename in self.filenames:
+            if self.parser is None or filename != self.filename:
+                self.initdoc(filename)
+            parser = self.parser
+            self.parser = None #a subsequent iteration will have to start anew
+
+            depth = 0 #depth of nested target elements
+            for action, node in parser:
+                if node.tag == "{" + NSFOLIA + "}metadata" or node.tag == "{" + NSFOLIA + "}FoLiA":
+                    continue
+                if action == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth > 0:
+                    continue #nested in another target element, will be returned as part of it
+
+                element = XML2CLASS[node.tag[nslen:]].parsexml(node, self.doc)
+                # Eliminate the processed element and everything preceding it, including now-empty references from the root node
+                # (http://www.ibm.com/developerworks/xml/library/x-hiperfparse/)
+                node.clear()
+                for n in itertools.chain((node,), node.iterancestors()):
+                    parent = n.getparent()
+                    if parent is None:
+                        break #root node (may be preceded by processing instructions that must stay)
+                    while n.getprevious() is not None:
+                        del parent[0]  # clean up preceding siblings
+                if element is not None:
                     yield element
+                self.doc.index.clear() #the elements are no longer retained in the document
+            self.close()
 
     def __del__(self):
-        self.stream.close()
+        self.close()
 
 def isncname(name):
     #not entirely according to specs http://www.w3.org/TR/REC-xml/#NT-Name , but simplified:
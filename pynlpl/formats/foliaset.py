@@ -25,6 +25,9 @@ from __future__ import absolute_import
 
 import sys
 import io
+import os
+import json
+import hashlib
 import rdflib
 from lxml import etree as ElementTree
 if sys.version < '3':
@@ -235,15 +238,26 @@ def xmltreefromstring(s):
             return ElementTree.parse(BytesIO(s), ElementTree.XMLParser()) #older lxml, may leak!!!!
 
 class SetDefinition(object):
-    def __init__(self, url, format=None, basens="",verbose=False):
-        self.graph = rdflib.Graph()
+    """A FoLiA Set Definition, loaded into an RDF graph.
+
+    For deep validation, the main set and its subsets are compiled into hashed tables mapping class IDs to URIs (see
+    :meth:`SetDefinition.compile`), so testing a class requires no queries on the graph. If a cache directory is
+    specified, compiled tables are stored there, keyed by URL and a hash of the contents of the set definition, and
+    loaded from there on subsequent use; the RDF graph is then only parsed when it is actually needed.
+    """
+
+    COMPILEDVERSION = 1 #version of the format of compiled set definitions in the cache
+
+    def __init__(self, url, format=None, basens="",verbose=False, cachedir=None):
+        self.url = url
         self.basens = basens
         self.mainsetcache = {}
         self.subsetcache = {}
         self.set_id_uri_cache = {}
         self.verbose = verbose
-        self.graph.bind( 'fsd', NSFOLIASETDEFINITION+'#', override=True)
-        self.graph.bind( 'skos', NSSKOS+'#', override=True)
+        self.cachedir = cachedir
+        self.compiled = None #compiled class tables, see compile()
+        self._graph = None
         if not format:
             #try to guess format from URL
             if url.endswith('.ttl'):
@@ -254,57 +268,149 @@ class SetDefinition(object):
                 format = 'application/rdf+xml'
             elif url.endswith('.xml'): #other XML will be considered legacy
                 format = 'application/foliaset+xml' #legacy
+        self.format = format
 
+        if cachedir:
+            data = self.fetch()
+            self.cachefile = os.path.join(cachedir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.' + hashlib.sha1(data).hexdigest() + '.json')
+            if self.loadcompiled(self.cachefile):
+                if self.verbose:
+                    print("Loaded compiled set " + url + " from cache",file=sys.stderr)
+            else:
+                self.loadgraph(data)
+                self.compile()
+                self.savecompiled(self.cachefile)
+        else:
+            self.loadgraph()
+
+    @property
+    def graph(self):
+        """The RDF graph, parsed on first access if the set definition was loaded from the cache"""
+        if self._graph is None:
+            self.loadgraph()
+        return self._graph
+
+    def fetch(self):
+        """Returns the contents of the set definition (bytes)"""
+        if self.url[0] == '/' or self.url[0] == '.':
+            #local file
+            f = io.open(self.url,'rb')
+        else:
+            #remote URL
+            try:
+                f = urlopen(self.url)
+            except:
+                raise DeepValidationError("Unable to download " + self.url)
+        try:
+            return f.read()
+        except IOError:
+            raise DeepValidationError("Unable to download " + self.url)
+        finally:
+            f.close()
+
+    def loadgraph(self, data=None):
+        """Loads the set definition into an RDF graph, data is the contents of the set definition and will be fetched if not provided"""
+        url = self.url
+        format = self.format
+        self._graph = rdflib.Graph()
+        self._graph.bind( 'fsd', NSFOLIASETDEFINITION+'#', override=True)
+        self._graph.bind( 'skos', NSSKOS+'#', override=True)
         if format in ('application/foliaset+xml','legacy',None):
             #legacy format, has some checks and fallbacks if the format turns out to be RDF anyway
             self.legacyset = None
-            if url[0] == '/' or url[0] == '.':
-                #local file
-                f = io.open(url,'r',encoding='utf-8')
-            else:
-                #remote URL
-                if not self.basens:
-                    self.basens = url
-                try:
-                    f = urlopen(url)
-                except:
-                    raise DeepValidationError("Unable to download " + url)
-            try:
-                data = f.read()
-            except IOError:
-                raise DeepValidationError("Unable to download " + url)
-            finally:
-                f.close()
+            if url[0] != '/' and url[0] != '.' and not self.basens:
+                self.basens = url
+            if data is None:
+                data = self.fetch()
             if data[0] in ('@',b'@',64):
                 #this is not gonna be valid XML, but looks like turtle/n3 RDF
-                self.graph.parse(location=url, format='text/turtle')
+                self._graph.parse(data=data, format='text/turtle')
                 if self.verbose:
-                    print("Loaded set " + url + " (" + str(len(self.graph)) + " triples)",file=sys.stderr)
+                    print("Loaded set " + url + " (" + str(len(self._graph)) + " triples)",file=sys.stderr)
                 return
             tree = xmltreefromstring(data)
             root = tree.getroot()
             if root.tag != '{' + NSFOLIA + '}set':
                 if root.tag.lower().find('rdf') != 1:
                     #well, this is RDF after all...
-                    self.graph.parse(location=url, format='rdf')
+                    self._graph.parse(location=url, format='rdf')
                     return
                 else:
                     raise SetDefinitionError("Not a FoLiA Set Definition! Unexpected root tag:"+ root.tag)
             legacyset = LegacySetDefinition.parsexml(root)
-            legacyset.rdf(self.graph, self.basens)
+            legacyset.rdf(self._graph, self.basens)
             if self.verbose:
-                print("Loaded legacy set " + url + " (" + str(len(self.graph)) + " triples)",file=sys.stderr)
+                print("Loaded legacy set " + url + " (" + str(len(self._graph)) + " triples)",file=sys.stderr)
         else:
             try:
-                self.graph.parse(location=url, format=format)
+                if data is None:
+                    self._graph.parse(location=url, format=format)
+                else:
+                    self._graph.parse(data=data, format=format)
             except HTTPError:
                 raise DeepValidationError("Unable to download " + url)
             if self.verbose:
-                print("Loaded set " + url + " (" + str(len(self.graph)) + " triples)",file=sys.stderr)
+                print("Loaded set " + url + " (" + str(len(self._graph)) + " triples)",file=sys.stderr)
+
+    def classtable(self, set_uri):
+        """Returns a dictionary mapping class IDs to class URIs for the specified set"""
+        return dict( (classid, classinfo['uri']) for classid, classinfo in self.classes(set_uri).items() )
+
+    def compile(self):
+        """Compiles the main set and all its subsets into tables mapping class IDs to class URIs (along with the open/empty flags), used by :meth:`SetDefinition.testclass` and :meth:`SetDefinition.testsubclass`"""
+        mainsetinfo = dict(self.mainset())
+        compiled = {'version': self.COMPILEDVERSION, 'mainset': mainsetinfo, 'classes': {}, 'subsets': {}}
+        if not mainsetinfo['open'] and not mainsetinfo['empty']:
+            compiled['classes'] = self.classtable(mainsetinfo['uri'])
+        for subsetinfo in self.subsets():
+            subsetinfo['classes'] = {} if subsetinfo['open'] else self.classtable(subsetinfo['uri'])
+            compiled['subsets'][subsetinfo['id']] = subsetinfo
+        self.compiled = compiled
+        return compiled
+
+    def loadcompiled(self, filename):
+        """Loads compiled tables from the specified file, returns False if the file does not exist or is outdated"""
+        if not os.path.exists(filename):
+            return False
+        with io.open(filename,'r',encoding='utf-8') as f:
+            compiled = json.load(f)
+        if compiled.get('version') != self.COMPILEDVERSION:
+            return False
+        self.compiled = compiled
+        self.mainsetcache = dict(compiled['mainset'])
+        for subset_id, subsetinfo in compiled['subsets'].items():
+            self.subsetcache[subset_id] = dict( (key, value) for key, value in subsetinfo.items() if key != 'classes' )
+        return True
+
+    def savecompiled(self, filename):
+        """Saves the compiled tables to the specified file"""
+        if self.compiled is None:
+            self.compile()
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmpfilename = filename + '.' + str(os.getpid()) + '.tmp'
+        with io.open(tmpfilename,'wb') as f:
+            f.write(json.dumps(self.compiled).encode('ascii'))
+        os.rename(tmpfilename, filename) #atomic, so concurrent validation runs never see a partial file
+
+    def compiledsubset(self, subset_id):
+        """Returns the compiled information on a subset, including its table of classes"""
+        if self.compiled is None:
+            self.compile()
+        try:
+            return self.compiled['subsets'][subset_id]
+        except KeyError:
+            subsetinfo = dict(self.subset(subset_id))
+            subsetinfo['classes'] = {} if subsetinfo['open'] or not subsetinfo['uri'] else self.classtable(subsetinfo['uri'])
+            self.compiled['subsets'][subset_id] = subsetinfo
+            return subsetinfo
 
     def testclass(self,cls):
         """Test for the presence of the class, returns the full URI or raises an exception"""
-        mainsetinfo = self.mainset()
+        if self.compiled is None:
+            self.compile()
+        mainsetinfo = self.compiled['mainset']
         if mainsetinfo['open']:
             return cls #everything is okay
         elif mainsetinfo['empty']:
@@ -314,25 +420,23 @@ class SetDefinition(object):
             if not cls:
                 raise DeepValidationError("No class specified")
             #closed set
-            set_uri = mainsetinfo['uri']
-            for row in self.graph.query("SELECT ?c WHERE { ?c rdf:type skos:Concept ; skos:notation \"" + cls + "\". <" + str(set_uri) + "> skos:member ?c }"):
-                return str(row.c)
-            raise DeepValidationError("Not a valid class: " + cls)
+            try:
+                return self.compiled['classes'][cls]
+            except KeyError:
+                raise DeepValidationError("Not a valid class: " + cls)
 
     def testsubclass(self, cls, subset, subclass):
         """Test for the presence of a class in a subset (used with features), returns the full URI or raises an exception"""
-        subsetinfo = self.subset(subset)
+        subsetinfo = self.compiledsubset(subset)
         if subsetinfo['open']:
             return subclass #everything is okay
         else:
-            subset_uri = subsetinfo['uri']
-            if not subset_uri:
+            if not subsetinfo['uri']:
                 raise DeepValidationError("Not a valid subset: " + subset)
-
-            query = "SELECT ?c WHERE { ?c rdf:type skos:Concept ; skos:notation \"" + subclass + "\" . <" + str(subset_uri) + "> skos:member ?c }"
-            for row in self.graph.query(query):
-                return str(row.c)
-            raise DeepValidationError("Not a valid class in subset " + subset + ": " + subclass)
+            try:
+                return subsetinfo['classes'][subclass]
+            except KeyError:
+                raise DeepValidationError("Not a valid class in subset " + subset + ": " + subclass)
 
     def get_set_uri(self, set_id=None):
         if set_id in self.set_id_uri_cache:
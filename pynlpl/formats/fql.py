@@ -26,8 +26,14 @@ from copy import copy
 import json
 import re
 import sys
+import os
 import random
 import datetime
+import time
+import traceback
+import multiprocessing
+import threading
+from collections import OrderedDict
 
 OPERATORS = ('=','==','!=','>','<','<=','>=','CONTAINS','NOTCONTAINS','MATCHES','NOTMATCHES')
 MASK_NORMAL = 0
@@ -51,11 +57,39 @@ def getrandomid(query,prefix=""):
         randomid =  prefix + "%08x" % random.getrandbits(32) #generate a random ID
     return randomid
 
+class Parameter(object):
+    """A placeholder (``?``) in a prepared query, the value is bound when the query is executed (see :meth:`Query.bind`). The parts of the parsed query that hold the value are registered as references and updated when a value is bound."""
+    def __init__(self, index):
+        self.index = index #position amongst the placeholders of the query
+        self.value = None
+        self.bound = False
+        self.references = []
+
+    def refer(self, obj, key, convert=None):
+        """Registers that the value is to be set as the specified attribute of the object (or item, for a dictionary)"""
+        self.references.append( (obj, key, convert) )
+
+    def bind(self, value):
+        self.value = value
+        self.bound = True
+        for obj, key, convert in self.references:
+            if convert is not None:
+                value = convert(self.value)
+            if isinstance(obj, dict):
+                obj[key] = value
+            else:
+                setattr(obj, key, value)
+
+    def __str__(self):
+        return "?"
+
+
 class UnparsedQuery(object):
     """This class takes care of handling grouped blocks in parentheses and handling quoted values"""
-    def __init__(self, s, i=0):
+    def __init__(self, s, i=0, parameters=None):
         self.q = []
         self.mask = []
+        self.parameters = [] if parameters is None else parameters #placeholders, shared with nested blocks
         l = len(s)
         begin = 0
         while i < l:
@@ -63,15 +97,11 @@ class UnparsedQuery(object):
             if c == " ":
                 #process previous word
                 if begin < i:
-                    w = s[begin:i]
-                    self.q.append(w)
-                    self.mask.append(MASK_NORMAL)
+                    self.append(s[begin:i])
                 begin = i + 1
             elif i == l - 1:
                 #process last word
-                w = s[begin:]
-                self.q.append(w)
-                self.mask.append(MASK_NORMAL)
+                self.append(s[begin:])
 
             if c == '(': #groups
                 #find end quote and process block
@@ -93,7 +123,7 @@ class UnparsedQuery(object):
                             else:
                                 level -= 1
                 if s2:
-                    self.q.append(UnparsedQuery(s2))
+                    self.q.append(UnparsedQuery(s2, 0, self.parameters))
                     self.mask.append(MASK_EXPRESSION)
                     i = j
                     begin = i+1
@@ -122,9 +152,14 @@ class UnparsedQuery(object):
         remove = []
         #process shortcut notation
         for i, (w,m) in enumerate(zip(self.q,self.mask)):
-            if m == MASK_NORMAL and w[0] == ':':
+            if m == MASK_NORMAL and not isinstance(w, Parameter) and w[0] == ':':
                 #we have shortcut notation for a HAS statement, rewrite:
-                self.q[i] = UnparsedQuery(w[1:] + " HAS class " + self.q[i+1] + " \"" + self.q[i+2] + "\"")
+                if isinstance(self.q[i+2], Parameter):
+                    self.q[i] = UnparsedQuery(w[1:] + " HAS class " + self.q[i+1] + " \"?\"")
+                    self.q[i].q[-1] = self.q[i+2]
+                    self.q[i].mask[-1] = MASK_NORMAL
+                else:
+                    self.q[i] = UnparsedQuery(w[1:] + " HAS class " + self.q[i+1] + " \"" + self.q[i+2] + "\"")
                 self.mask[i] = MASK_EXPRESSION
                 remove += [i+1,i+2]
 
@@ -136,6 +171,21 @@ class UnparsedQuery(object):
 
 
 
+    def instantiate(self, parameters):
+        """Returns a copy of the query in which the placeholders are replaced by the specified :class:`Parameter` instances (matched by index)"""
+        copy = UnparsedQuery.__new__(UnparsedQuery)
+        copy.q = [ parameters[w.index] if isinstance(w, Parameter) else w.instantiate(parameters) if isinstance(w, UnparsedQuery) else w for w in self.q ]
+        copy.mask = list(self.mask)
+        copy.parameters = parameters
+        return copy
+
+    def append(self, w):
+        if w == "?":
+            w = Parameter(len(self.parameters))
+            self.parameters.append(w)
+        self.q.append(w)
+        self.mask.append(MASK_NORMAL)
+
     def __iter__(self):
         for w in self.q:
             yield w
@@ -173,7 +223,7 @@ class UnparsedQuery(object):
         s = []
         for w,m in zip(self.q,self.mask):
             if m == MASK_NORMAL:
-                s.append(w)
+                s.append(str(w))
             elif m == MASK_LITERAL:
                 s.append('"' + w.replace('"','\\"') + '"')
             elif m == MASK_EXPRESSION:
@@ -232,26 +282,35 @@ class Filter(object): #WHERE ....
                     cnv = float
                 else:
                     cnv =  lambda x: x
-                if operator == '=' or operator == '==':
-                    filters.append( lambda x,y=q[i+2],v=v : v(x) == y )
+                if isinstance(q[i+2], Parameter):
+                    condition = parametercondition(operator, q[i+2], v, cnv)
+                    q[i+2].refer(condition, 'value')
+                elif operator == '=' or operator == '==':
+                    condition = lambda x,y=q[i+2],v=v : v(x) == y
                 elif operator == '!=':
-                    filters.append( lambda x,y=q[i+2],v=v : v(x) != y )
+                    condition = lambda x,y=q[i+2],v=v : v(x) != y
                 elif operator == '>':
-                    filters.append( lambda x,y=cnv(q[i+2]),v=v : False if v(x) is None else v(x) > y )
+                    condition = lambda x,y=cnv(q[i+2]),v=v : False if v(x) is None else v(x) > y
                 elif operator == '<':
-                    filters.append( lambda x,y=cnv(q[i+2]),v=v : False if v(x) is None else v(x) < y )
+                    condition = lambda x,y=cnv(q[i+2]),v=v : False if v(x) is None else v(x) < y
                 elif operator == '>=':
-                    filters.append( lambda x,y=cnv(q[i+2]),v=v : False if v(x) is None else v(x) >= y )
+                    condition = lambda x,y=cnv(q[i+2]),v=v : False if v(x) is None else v(x) >= y
                 elif operator == '<=':
-                    filters.append( lambda x,y=cnv(q[i+2]),v=v : False if v(x) is None else v(x) <= y )
+                    condition = lambda x,y=cnv(q[i+2]),v=v : False if v(x) is None else v(x) <= y
                 elif operator == 'CONTAINS':
-                    filters.append( lambda x,y=q[i+2],v=v : v(x).find( y ) != -1 )
+                    condition = lambda x,y=q[i+2],v=v : v(x).find( y ) != -1
                 elif operator == 'NOTCONTAINS':
-                    filters.append( lambda x,y=q[i+2],v=v : v(x).find( y ) == -1 )
+                    condition = lambda x,y=q[i+2],v=v : v(x).find( y ) == -1
                 elif operator == 'MATCHES':
-                    filters.append( lambda x,y=re.compile(q[i+2]),v=v : y.search(v(x)) is not None  )
+                    condition = lambda x,y=re.compile(q[i+2]),v=v : y.search(v(x)) is not None
                 elif operator == 'NOTMATCHES':
-                    filters.append( lambda x,y=re.compile(q[i+2]),v=v : y.search(v(x)) is None  )
+                    condition = lambda x,y=re.compile(q[i+2]),v=v : y.search(v(x)) is None
+                #keep the parts of the condition, for the query planner:
+                condition.attribute = q[i]
+                condition.operator = operator
+                condition.value = q[i+2]
+                condition.getter = v
+                filters.append(condition)
 
                 if q.kw(i+3,("AND","OR")):
                     if logop and q[i+3] != logop:
@@ -277,6 +336,18 @@ class Filter(object): #WHERE ....
 
         return Filter(filters, negation, logop == "OR"), i
 
+    def plan(self):
+        """Orders the conditions so the cheapest ones are tested first (the outcome of a conjunction or disjunction does not depend on the order), and plans nested filters and selectors"""
+        for filter in self.filters:
+            if isinstance(filter, Filter):
+                filter.plan()
+            elif isinstance(filter, tuple):
+                _, selector, subfilter = filter
+                selector.plan()
+                if subfilter:
+                    subfilter.plan()
+        self.filters.sort(key=filtercost)
+
     def __call__(self, query, element, debug=False):
         """Tests the filter on the specified element, returns a boolean"""
         match = True
@@ -342,12 +413,57 @@ class Filter(object): #WHERE ....
             elif isinstance(filter, tuple):
                 modifier,selector,subfilter = filter
                 q += "(" + modifier + " " + str(selector) + " HAS " + str(subfilter) + ") "
+            elif hasattr(filter, 'operator'):
+                if isinstance(filter.value, Parameter):
+                    q += filter.attribute + " " + filter.operator + " ? "
+                else:
+                    q += filter.attribute + " " + filter.operator + " \"" + filter.value + "\" "
             else:
                 #original filter can't be reconstructed, place dummy:
                 q += "...\"" + str(filter.__defaults__[0]) +"\""
         return q.strip()
 
 
+def parametercondition(operator, parameter, v, cnv):
+    """Returns a condition for a filter that compares against the value bound to a parameter of a prepared query"""
+    if operator == '=' or operator == '==':
+        return lambda x,p=parameter,v=v : v(x) == p.value
+    elif operator == '!=':
+        return lambda x,p=parameter,v=v : v(x) != p.value
+    elif operator == '>':
+        return lambda x,p=parameter,v=v : False if v(x) is None else v(x) > cnv(p.value)
+    elif operator == '<':
+        return lambda x,p=parameter,v=v : False if v(x) is None else v(x) < cnv(p.value)
+    elif operator == '>=':
+        return lambda x,p=parameter,v=v : False if v(x) is None else v(x) >= cnv(p.value)
+    elif operator == '<=':
+        return lambda x,p=parameter,v=v : False if v(x) is None else v(x) <= cnv(p.value)
+    elif operator == 'CONTAINS':
+        return lambda x,p=parameter,v=v : v(x).find( p.value ) != -1
+    elif operator == 'NOTCONTAINS':
+        return lambda x,p=parameter,v=v : v(x).find( p.value ) == -1
+    elif operator == 'MATCHES':
+        return lambda x,p=parameter,v=v : re.search(p.value, v(x)) is not None
+    elif operator == 'NOTMATCHES':
+        return lambda x,p=parameter,v=v : re.search(p.value, v(x)) is None
+
+
+CONDITIONCOST = {'=': 1, '==': 1, '!=': 2, '>': 2, '<': 2, '>=': 2, '<=': 2, 'CONTAINS': 3, 'NOTCONTAINS': 3, 'MATCHES': 4, 'NOTMATCHES': 4}
+
+def filtercost(filter):
+    """Estimates the relative cost of testing a condition of a filter, used by the query planner"""
+    if isinstance(filter, Filter):
+        return 10 + max([0] + [ filtercost(f) for f in filter.filters ])
+    elif isinstance(filter, tuple):
+        #context expressions and HAS statements need to select other elements
+        return 30 if filter[0] == "CHILD" else 20
+    else:
+        cost = CONDITIONCOST.get(getattr(filter, 'operator', None), 5)
+        if getattr(filter, 'attribute', None) in ("text","value","phon"):
+            cost += 0.5 #text needs to be obtained from the content of the element
+        return cost
+
+
 
 
 class SpanSet(list):
@@ -374,7 +490,19 @@ class Selector(object):
         self.filter = filter
         self.nextselector =  nextselector #selectors can be chained
         self.expansion = expansion #{min,max} occurrence interval, allowed only in Span and evaluated there instead of here
+        self.index = None #condition of the filter for which candidates are looked up in an index (set by the query planner)
 
+    def plan(self):
+        """Chooses how candidates are obtained: if the filter requires the id, text or class of elements to be equal to a value, candidates are looked up in an index on that attribute rather than all being tested"""
+        self.index = None
+        if self.filter:
+            self.filter.plan()
+            if not self.filter.negation and not self.filter.disjunction and self.Class and self.Class != "ALL" and not issubclass(self.Class, folia.AbstractSpanAnnotation):
+                for attributes in (("id",), ("text","value"), ("class",)):
+                    for filter in self.filter.filters:
+                        if getattr(filter, 'operator', None) in ('=','==') and filter.attribute in attributes:
+                            self.index = filter
+                            return
 
     def chain(self, targets):
         assert targets[0] is self
@@ -441,7 +569,11 @@ class Selector(object):
                 #something we don't handle
                 break
 
-        return Selector(Class,set,id,filter, None, expansion), i
+        selector = Selector(Class,set,id,filter, None, expansion)
+        for value, key in ((set,'set'), (id,'id')):
+            if isinstance(value, Parameter):
+                value.refer(selector, key)
+        return selector, i
 
     def __call__(self, query, contextselector, recurse=True, debug=False): #generator, lazy evaluation!
         if isinstance(contextselector,tuple) and len(contextselector) == 2:
@@ -500,15 +632,23 @@ class Selector(object):
                         yield e, e
                     else:
                         #print("DEBUG: doing select " + selector.Class.__name__ + " (recurse=" + str(recurse)+") on " + repr(e))
-                        for candidate  in e.select(selector.Class, selector.set, recurse):
+                        if selector.index is not None and recurse and any( e is root for root in query.doc.data ):
+                            if debug: print("[FQL EVALUATION DEBUG] Select - Looking up candidates in index on " + selector.index.attribute,file=sys.stderr)
+                            candidates = query.lookup(e, selector)
+                        else:
+                            candidates = e.select(selector.Class, selector.set, recurse)
+                        stats = query.stats.get(id(selector)) if query.profile else None
+                        for candidate in candidates:
+                            if stats is not None: stats[0] += 1
                             try:
-                                if candidate.changedbyquery is query:
+                                if candidate.changedbyquery is query.execution:
                                     #this candidate has been added/modified by the query, don't select it again
                                     continue
                             except AttributeError:
                                 pass
                             if not selector.filter or  selector.filter(query,candidate, debug):
                                 if debug: print("[FQL EVALUATION DEBUG] Select - Yielding ", repr(candidate), " in ", repr(e),file=sys.stderr)
+                                if stats is not None: stats[1] += 1
                                 yield candidate, e
 
                 if selector.nextselector is None:
@@ -584,6 +724,10 @@ class Span(object):
 
         return Span(targets), i
 
+    def plan(self):
+        for target in self.targets:
+            target.plan()
+
     def __call__(self, query, contextselector, recurse=True,debug=False): #returns a list of element in a span
         if debug: print("[FQL EVALUATION DEBUG] Span  - Building span from target selectors (" + str(len(self.targets)) + ")",file=sys.stderr)
 
@@ -828,6 +972,11 @@ class Target(object): #FOR/IN... expression
 
         return Target(targets,strict,nested,start,end,endinclusive, repeat), i
 
+    def plan(self):
+        for selector in self.targets + [self.nested, self.start, self.end]:
+            if selector is not None:
+                selector.plan()
+
 
     def __call__(self, query, contextselector, recurse, debug=False): #generator, lazy evaluation!
         if self.nested:
@@ -1331,10 +1480,15 @@ def getassignments(q, i, assignments,  focus=None):
                 assignments[q[i]] = None
             else:
                 assignments[q[i]] = q[i+1]
+                if isinstance(q[i+1], Parameter):
+                    q[i+1].refer(assignments, q[i])
             i+=2
         elif q.kw(i,'confidence'):
             if q[i+1] == 'NONE':
                 assignments[q[i]] = None
+            elif isinstance(q[i+1], Parameter):
+                assignments[q[i]] = q[i+1]
+                q[i+1].refer(assignments, q[i], float)
             else:
                 try:
                     assignments[q[i]] = float(q[i+1])
@@ -1359,9 +1513,13 @@ def getassignments(q, i, assignments,  focus=None):
             else:
                 key = 'text'
             assignments[key] = q[i+1]
+            if isinstance(q[i+1], Parameter):
+                q[i+1].refer(assignments, key)
             i+=2
         elif q.kw(i, 'datetime'):
-            if q[i+1] == "now":
+            if isinstance(q[i+1], Parameter):
+                raise SyntaxError("Placeholders are not supported for datetime")
+            elif q[i+1] == "now":
                 assignments[q[i]] = datetime.datetime.now()
             elif q[i+1] == "NONE":
                 assignments[q[i]] = None
@@ -1523,6 +1681,8 @@ class Action(object): #Action expression
                 focusselection = []
                 constrainedtargetselection = [] #selecting focus elements constrains the target selection
                 processed_form = []
+                focusids = set() #identities of the elements in the above lists, for quick lookup
+                targetids = set()
 
                 if substitution and action.action != "SUBSTITUTE":
                     raise QueryError("SUBSTITUTE can not be chained with " + action.action)
@@ -1550,16 +1710,18 @@ class Action(object): #Action expression
                                 if not target.partof(constrainedtargetselection):
                                     if debug: print("[FQL EVALUATION DEBUG] Action - Got target result (spanset), adding ", repr(target),file=sys.stderr)
                                     constrainedtargetselection.append(target)
-                            elif not any(x is target for x in constrainedtargetselection):
+                            elif id(target) not in targetids:
                                 if debug: print("[FQL EVALUATION DEBUG] Action - Got target result, adding ", repr(target),file=sys.stderr)
                                 constrainedtargetselection.append(target)
+                                targetids.add(id(target))
 
 
                         if action.form and action.action != "SUBSTITUTE":
                             #Delegate action to form (= correction or alternative)
-                            if not any(x is focus for x in  processed_form):
+                            if id(focus) not in focusids:
                                 if debug: print("[FQL EVALUATION DEBUG] Action - Got focus result, processing using form ", repr(focus),file=sys.stderr)
                                 processed_form.append(focus)
+                                focusids.add(id(focus))
                                 focusselection += list(action.form(query, action,focus,target,debug))
                             else:
                                 if debug: print("[FQL EVALUATION DEBUG] Action - Focus result already obtained, skipping... ", repr(focus),file=sys.stderr)
@@ -1572,9 +1734,10 @@ class Action(object): #Action expression
                                 else:
                                     if debug: print("[FQL EVALUATION DEBUG] Action - Focus result (spanset) already obtained, skipping... ", repr(target),file=sys.stderr)
                                     continue
-                            elif not any(x is focus for x in  focusselection):
+                            elif id(focus) not in focusids:
                                 if debug: print("[FQL EVALUATION DEBUG] Action - Got focus result, adding ", repr(focus),file=sys.stderr)
                                 focusselection.append(focus)
+                                focusids.add(id(focus))
                             else:
                                 if debug: print("[FQL EVALUATION DEBUG] Action - Focus result already obtained, skipping... ", repr(focus),file=sys.stderr)
                                 continue
@@ -1623,6 +1786,7 @@ class Action(object): #Action expression
                                 if debug: print("[FQL EVALUATION DEBUG] Action - Applying SUBSTITUTE to target ", repr(focus),file=sys.stderr)
                                 if not isinstance(target,SpanSet) or not target: raise QueryError("SUBSTITUTE requires a target SPAN")
                                 focusselection.remove(focus)
+                                focusids.discard(id(focus))
 
                                 if not substitution:
                                     #this is the first SUBSTITUTE in a chain
@@ -1702,8 +1866,9 @@ class Action(object): #Action expression
                         if isinstance(target, SpanSet):
                             if not target.partof(constrainedtargetselection):
                                 constrainedtargetselection.append(target)
-                        elif not any(x is target for x in constrainedtargetselection):
+                        elif id(target) not in targetids:
                             constrainedtargetselection.append(target)
+                            targetids.add(id(target))
 
                     if focusselection and action.span: #process SPAN keyword (ADD .. SPAN .. FOR .. rather than ADD ... FOR SPAN ..)
                         if not isspan: raise QueryError("Can only use SPAN with span annotation elements!")
@@ -1722,19 +1887,23 @@ class Action(object): #Action expression
                 if len(actions) > 1:
                     #consolidate results:
                     focusselection_all = []
+                    consolidated = set()
                     for e in focusselection:
                         if isinstance(e, SpanSet):
                             if not e.partof(focusselection_all):
                                 focusselection_all.append(e)
-                        elif not any(x is e for x in focusselection_all):
+                        elif id(e) not in consolidated:
                             focusselection_all.append(e)
+                            consolidated.add(id(e))
                     constrainedtargetselection_all = []
+                    consolidated = set()
                     for e in constrainedtargetselection:
                         if isinstance(e, SpanSet):
                             if not e.partof(constrainedtargetselection_all):
                                 constrainedtargetselection_all.append(e)
-                        elif not any(x is e for x in constrainedtargetselection_all):
+                        elif id(e) not in consolidated:
                             constrainedtargetselection_all.append(e)
+                            consolidated.add(id(e))
 
             if substitution:
                 constrainedtargetselection_all = []
@@ -1777,6 +1946,12 @@ class Context(object):
         self.request = "all"
         self.defaults = {}
         self.defaultsets = {}
+        self.optimize = True #plan queries, see Query.plan()
+
+    def key(self):
+        """Returns a hashable representation of the context"""
+        request = tuple(self.request) if isinstance(self.request, list) else self.request
+        return (self.format, self.returntype, request, tuple(sorted(self.defaults.items())), tuple(sorted(self.defaultsets.items())), self.optimize)
 
 class Query(object):
     """This class represents an FQL query.
@@ -1825,11 +2000,21 @@ class Query(object):
 
     We have just covered just the **SELECT** keyword, FQL has other keywords for manipulating documents, such as **EDIT**, **ADD**, **APPEND** and **PREPEND**.
 
+    Results can also be obtained one by one, as soon as they are found, using :meth:`Query.stream`::
+
+        query = fql.Query('SELECT w WHERE text = "house" FORMAT json')
+        for word in query.stream(doc):
+            print(word) #a json string for every word
+
+    Prefixing a query with **EXPLAIN** returns a description of how it is evaluated (see :meth:`Query.explainplan`) rather than its results.
+
     Note:
         Consult the FQL documentation at https://github.com/proycon/foliadocserve/blob/master/README.rst for further documentation on the language.
 
     """
     def __init__(self, q, context=Context()):
+        self.text = str(q) if isinstance(q, UnparsedQuery) else q #the query as a string
+        self.context = context
         self.action = None
         self.targets = None
         self.declarations = []
@@ -1838,13 +2023,33 @@ class Query(object):
         self.request = copy(context.request)
         self.defaults = copy(context.defaults)
         self.defaultsets = copy(context.defaultsets)
+        self.optimize = context.optimize
+        self.explain = False #explain the plan of the query rather than returning results (EXPLAIN keyword)
+        self.profile = False #count the candidates examined by each selector (in stats)
+        self.stats = {}
+        self.timings = {}
+        self.parameters = [] #placeholders (Parameter instances) of a prepared query, in order
+        self.execution = object() #marks the elements changed by the current execution of the query
+        self.indices = {}
+        begin = time.time()
         self.parse(q)
+        self.timings['parse'] = time.time() - begin
+        begin = time.time()
+        if self.optimize:
+            self.plan()
+        self.timings['plan'] = time.time() - begin
 
     def parse(self, q, i=0):
         if not isinstance(q,UnparsedQuery):
             q = UnparsedQuery(q)
+        self.unparsed = q
+        self.parameters = q.parameters
 
         l = len(q)
+        if q.kw(i,"EXPLAIN"):
+            self.explain = True
+            i += 1
+
         if q.kw(i,"DECLARE"):
             try:
                 Class = folia.XML2CLASS[q[i+1]]
@@ -1893,27 +2098,142 @@ class Query(object):
         if i != l:
             raise SyntaxError("Expected end of query, got " + str(q[i]) + " in: " + str(q))
 
+    def plan(self):
+        """Plans the evaluation of all selectors in the query, see :meth:`Selector.plan` and :meth:`Filter.plan`"""
+        for selector in self.selectors():
+            selector.plan()
+
+    def selectors(self):
+        """Returns all (top-level) selectors of the query, with the actions and targets they belong to, in order of appearance"""
+        selectors = []
+        actions = [self.action] if self.action else []
+        while actions:
+            action = actions.pop(0)
+            if action.focus:
+                selectors.append(action.focus)
+            actions = action.subactions + actions
+            if action.nextaction:
+                actions.append(action.nextaction)
+        target = self.targets
+        if target:
+            for selector in target.targets:
+                if isinstance(selector, Span):
+                    selectors += selector.targets
+                else:
+                    selectors.append(selector)
+            for selector in (target.nested, target.start, target.end):
+                if selector is not None:
+                    selectors.append(selector)
+        return selectors
+
+    def lookup(self, element, selector):
+        """Returns the elements under the specified element that are of the class and set of the selector and of which the indexed attribute (see :meth:`Selector.plan`) has the desired value. The index is built on first use and kept for the remainder of the current execution only, as the document may change in ways it is not notified of (such as an assigned class)."""
+        condition = selector.index
+        if condition.attribute == "id":
+            #use the ID index of the document, and verify the element is one select() would have found
+            try:
+                candidate = self.doc[condition.value]
+            except KeyError:
+                return []
+            if not isinstance(candidate, selector.Class) or (selector.set is not None and candidate.set != selector.set):
+                return []
+            e = candidate
+            while e is not None and e is not element:
+                if not getattr(e, 'auth', True):
+                    return []
+                e = e.parent
+            return [candidate] if e is element else []
+
+        key = (id(element), selector.Class, selector.set, condition.attribute)
+        try:
+            index = self.indices[key]
+        except KeyError:
+            index = {}
+            for candidate in element.select(selector.Class, selector.set, True):
+                try:
+                    index.setdefault(condition.getter(candidate), []).append(candidate)
+                except (folia.NoSuchText, folia.NoSuchPhon, TypeError):
+                    pass
+            self.indices[key] = index
+        return index.get(condition.value, [])
+
+    def targetselector(self, doc, debug=False):
+        if self.targets and not (isinstance(self.targets.targets[0], Selector) and self.targets.targets[0].Class in ("ALL", folia.Text)):
+            return (self.targets, (self, doc, True, debug)) #function recipe to get the generator for the targets, (f, *args) (first is always recursive)
+        else:
+            return doc
+
     def __call__(self, doc, wrap=True,debug=False):
         """Execute the query on the specified document"""
-
+        if self.explain:
+            return self.explainplan(doc, debug)
+        responseselection = self.execute(doc, debug)
+        if self.returntype == "nothing": #we're done
+            return ""
+        return self.formatresponse(responseselection, wrap, debug)
+
+    def bind(self, *values):
+        """Binds values to the placeholders (``?``) of a prepared query, in order of appearance, and returns a new query holding these values. Values are used as they are, so they need no quoting or escaping. The query text is tokenised only once and the query may be bound any number of times with different values::
+
+            query = fql.Query('SELECT w WHERE text = ? FOR s ID ?')
+            for word in query.bind("house", "s.1")(doc):
+                print(word)
+
+        The query itself is left unchanged, so a single query (such as one obtained from a :class:`QueryCache`) can be bound and executed by multiple threads at once, each executing its own bound query. A :class:`Query` instance itself must not be executed by multiple threads at once.
+        """
+        if len(values) != len(self.parameters):
+            raise QueryError("Query has " + str(len(self.parameters)) + " placeholder(s), got " + str(len(values)) + " value(s)")
+        parameters = [ Parameter(parameter.index) for parameter in self.parameters ]
+        query = Query(self.unparsed.instantiate(parameters), self.context)
+        query.text = self.text
+        for parameter, value in zip(parameters, values):
+            parameter.bind(value)
+        return query
+
+    def declare(self, doc, debug=False):
+        if not all( parameter.bound for parameter in self.parameters ):
+            raise QueryError("No values bound to the placeholders of the query, see Query.bind()")
         self.doc = doc
-
-        if debug: print("[FQL EVALUATION DEBUG] Query  - Starting on document ", doc.id,file=sys.stderr)
-
+        self.execution = object()
+        self.indices = {} #indices built by lookup() during this execution
         if self.declarations:
             for Class, decset, defaults in self.declarations:
                 if debug: print("[FQL EVALUATION DEBUG] Processing declaration for ", Class.__name__, "of",str(decset),file=sys.stderr)
                 doc.declare(Class,decset,**defaults)
 
+    def modifies(self):
+        """Returns ``True`` if the query (potentially) changes the document it is executed on"""
+        actions = [self.action] if self.action else []
+        while actions:
+            action = actions.pop()
+            if action.action != "SELECT":
+                return True
+            actions += action.subactions
+            if action.nextaction:
+                actions.append(action.nextaction)
+        return False
+
+    def execute(self, doc, debug=False, scope=None):
+        """Execute the query on the specified document and returns the selection of elements to respond with (according to the return type), prior to conversion to the output format.
+
+        The query is evaluated on the whole document, unless a list of elements is passed as ``scope``, in which case it is evaluated within these elements only."""
+
+        if debug: print("[FQL EVALUATION DEBUG] Query  - Starting on document ", doc.id,file=sys.stderr)
+
+        begin = time.time()
+        self.declare(doc, debug)
+        self.timings['declarations'] = time.time() - begin
+
+        begin = time.time()
         if self.action:
-            targetselector = doc
-            if self.targets and not (isinstance(self.targets.targets[0], Selector) and self.targets.targets[0].Class in ("ALL", folia.Text)):
-                targetselector = (self.targets, (self, targetselector, True, debug)) #function recipe to get the generator for the targets, (f, *args) (first is always recursive)
+            focusselection, targetselection = self.action(self, self.targetselector(doc if scope is None else scope, debug), debug) #selecting focus elements further constrains the target selection (if any), return values will be lists
 
-            focusselection, targetselection = self.action(self, targetselector, debug) #selecting focus elements further constrains the target selection (if any), return values will be lists
+            if self.modifies():
+                #the document may have changed in ways that do not invalidate the select cache (such as a changed set)
+                doc.selectcache = {}
 
             if self.returntype == "nothing":
-                return ""
+                responseselection = []
             elif self.returntype == "focus":
                 responseselection = focusselection
             elif self.returntype == "target" or self.returntype == "inner-target":
@@ -1946,11 +2266,27 @@ class Query(object):
 
         else:
             responseselection = []
+        self.timings['execution'] = time.time() - begin
 
-        if self.returntype == "nothing": #we're done
-            return ""
+        return responseselection
 
-        #convert response selection to proper format and return
+    def formatresult(self, e):
+        """Converts a single element of the response selection to the output format (for non-single formats)"""
+        if self.format == "xml":
+            if isinstance(e, SpanSet):
+                return "<result>\n" + "".join( e2.xmlstring(True) + "\n" for e2 in e ) + "</result>\n"
+            else:
+                return "<result>\n" + e.xmlstring(True) + "</result>\n"
+        elif self.format == "json":
+            if isinstance(e, SpanSet):
+                return json.dumps([ e2.json() for e2 in e ] )
+            else:
+                return json.dumps(e.json())
+        else: #python and undefined formats
+            return e
+
+    def formatresponse(self, responseselection, wrap=True, debug=False):
+        """Converts the response selection to the output format"""
         if self.format.startswith('single'):
             if len(responseselection) > 1:
                 raise QueryError("A single response was expected, but multiple are returned")
@@ -1993,13 +2329,7 @@ class Query(object):
                     else:
                         r = ""
                     for e in responseselection:
-                        if isinstance(e, SpanSet):
-                            r += "<result>\n"
-                            for e2 in e:
-                                r += "" + e2.xmlstring(True) + "\n"
-                            r += "</result>\n"
-                        else:
-                            r += "<result>\n" + e.xmlstring(True) + "</result>\n"
+                        r += self.formatresult(e)
                     if wrap:
                         r += "</results>\n"
                     return r
@@ -2016,10 +2346,7 @@ class Query(object):
                     else:
                         s = ""
                     for e in responseselection:
-                        if isinstance(e, SpanSet):
-                            s += json.dumps([ e2.json() for e2 in e ] ) + ", "
-                        else:
-                            s += json.dumps(e.json()) + ", "
+                        s += self.formatresult(e) + ", "
                     s = s.strip(", ")
                     if wrap:
                         s += "]"
@@ -2030,12 +2357,298 @@ class Query(object):
 
         return QueryError("Invalid format: " + self.format)
 
+    def stream(self, doc, debug=False):
+        """Execute the query on the specified document and yield the results one by one, each converted to the output format (as an item of a non-single format, so without the wrapping list in the json and xml formats).
+
+        Results of a query that merely selects a focus are yielded as soon as they are found, without the full selection being held in memory. Other queries are executed first."""
+        if self.format.startswith('single'):
+            raise QueryError("Results can not be streamed in format " + self.format)
+
+        action = self.action
+        if action and action.action == "SELECT" and action.focus and not action.form and not action.nextaction and self.returntype == "focus":
+            self.declare(doc, debug)
+            targetselector = self.targetselector(doc, debug)
+            if not (targetselector is doc and action.focus.Class in ('ALL',folia.Text)):
+                strict = self.targets and self.targets.strict
+                seen = set()
+                for focus, target in action.focus(self, targetselector, not strict, debug):
+                    if isinstance(focus, SpanSet):
+                        yield self.formatresult(target)
+                    elif id(focus) not in seen:
+                        seen.add(id(focus))
+                        yield self.formatresult(focus)
+                return
+
+        for e in self.execute(doc, debug):
+            yield self.formatresult(e)
+
+    def explainplan(self, doc=None, debug=False):
+        """Returns a description of how the query is evaluated: for each selector how candidates are obtained and in what order the conditions of its filter are tested. This is what a query starting with the ``EXPLAIN`` keyword returns.
+
+        If a document is specified, the query is also executed on it (so it will be changed by queries that do so!) and the time spent in each stage is reported, as well as the number of candidates examined by each selector and how many of those matched."""
+        if doc is not None:
+            self.profile = True
+            self.stats = dict( (id(selector), [0,0]) for selector in self.selectors() )
+            try:
+                responseselection = self.execute(doc, debug)
+                begin = time.time()
+                self.formatresponse(responseselection, True, debug)
+                self.timings['formatting'] = time.time() - begin
+            finally:
+                self.profile = False
+
+        lines = []
+        for selector in self.selectors():
+            if selector.id:
+                access = "document index on ID " + str(selector.id)
+            elif selector.Class == "ALL":
+                access = "all elements"
+            elif not selector.Class:
+                access = "none"
+            elif issubclass(selector.Class, folia.AbstractSpanAnnotation):
+                access = "span annotations of referenced elements"
+            elif selector.index is not None:
+                if selector.index.attribute == "id":
+                    access = "document index on " + selector.index.attribute + " = \"" + str(selector.index.value) + "\""
+                else:
+                    access = "index on " + selector.index.attribute + " = \"" + str(selector.index.value) + "\""
+            else:
+                access = "select"
+            label = "ALL" if selector.Class == "ALL" else selector.Class.XMLTAG if selector.Class else "ID " + str(selector.id)
+            if selector.set:
+                label += " OF " + str(selector.set)
+            lines.append(label + "\n    access: " + access)
+            if selector.filter:
+                lines.append("    filter: " + str(selector.filter))
+            if doc is not None and id(selector) in self.stats:
+                examined, matched = self.stats[id(selector)]
+                lines.append("    candidates: " + str(examined) + " examined, " + str(matched) + " matched")
+        if not self.optimize:
+            lines.append("planning: disabled")
+        lines.append("timing:")
+        for stage in ('parse','plan','declarations','execution','formatting'):
+            if stage in self.timings and (doc is not None or stage in ('parse','plan')):
+                lines.append("    " + stage + ": " + "%.6f" % self.timings[stage] + "s")
+        if doc is not None:
+            lines.append("results: " + str(len(responseselection)))
+        return "\n".join(lines)
+
     def _touch(self, *args):
+        self.indices = {} #changed elements may no longer be where the indices have them
         for e in args:
             if isinstance(e, folia.AbstractElement):
-                e.changedbyquery = self
+                e.changedbyquery = self.execution
                 self._touch(*e.data)
 
 
 
+class QueryCache(object):
+    """A cache of parsed queries, keyed by the query text (and context), holding the most recently used ones.
+
+    Parsing a query is relatively expensive, services that execute the same queries repeatedly should obtain them from a cache, preferably as prepared queries with placeholders (see :meth:`Query.bind`) so that the query text does not vary with the values::
+
+        query = fql.querycache('SELECT w WHERE text = ?')
+        results = query.bind(text)(doc)
+
+    Note that the same :class:`Query` instance is returned for the same query text, threads should therefore execute a bound query obtained by :meth:`Query.bind` (also for queries without placeholders) rather than the returned one.
+
+    Arguments:
+        maxsize (int): The maximum number of queries held
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.queries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, q, context=None):
+        """Returns the parsed :class:`Query` for the query text"""
+        if context is None:
+            context = Context()
+        key = (q, context.key())
+        with self.lock:
+            try:
+                query = self.queries.pop(key)
+                self.queries[key] = query #most recently used go last
+                self.hits += 1
+                return query
+            except KeyError:
+                self.misses += 1
+        query = Query(q, context)
+        with self.lock:
+            self.queries[key] = query
+            while len(self.queries) > self.maxsize:
+                self.queries.popitem(False)
+        return query
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __contains__(self, q):
+        return any( key[0] == q for key in self.queries )
+
+    def clear(self):
+        with self.lock:
+            self.queries.clear()
+
+querycache = QueryCache()
+
+
+#Elements that can not occur within a sentence, queries selecting these can not be evaluated on streamed sentences
+NONSENTENCESCOPE = (folia.Text, folia.Speech, folia.Division, folia.Paragraph, folia.Sentence, folia.Utterance, folia.Head, folia.List, folia.Table, folia.Figure, folia.Event)
 
+class BatchResult(object):
+    """The results of executing a query on a single document, by :class:`BatchQuery`.
+
+    Attributes:
+        filename (str): The file the query was executed on
+        results (list): The results, as xml strings if the query's format is xml, as json structures otherwise (elements can not be sent between processes)
+        duration (float): Time (in seconds) spent on loading the document, executing the query and saving the document
+        error (str or None): Description of the error (including the traceback) if the query failed, ``None`` otherwise
+        saved (bool): ``True`` if the document was changed by the query and saved
+    """
+
+    def __init__(self, filename, results, duration, error=None, saved=False):
+        self.filename = filename
+        self.results = results
+        self.duration = duration
+        self.error = error
+        self.saved = saved
+
+    def ok(self):
+        """Returns ``True`` if the query was executed successfully"""
+        return self.error is None
+
+    def json(self):
+        return {'filename': self.filename, 'results': self.results, 'duration': self.duration, 'error': self.error, 'saved': self.saved}
+
+    def __len__(self):
+        return len(self.results)
+
+    def __str__(self):
+        if self.error is None:
+            return self.filename + "\tOK\t" + str(len(self.results)) + "\t" + "%.3f" % self.duration
+        else:
+            return self.filename + "\tFAILED\t" + str(len(self.results)) + "\t" + "%.3f" % self.duration + "\t" + self.error.strip().split("\n")[-1]
+
+
+def batchexecute(task):
+    """Executes a query on a single file for :class:`BatchQuery` (runs in the worker processes), returns a :class:`BatchResult`"""
+    filename, text, context, values, save, outputdir, reader, documentkwargs, debug = task
+    begintime = time.time()
+    results = []
+    saved = False
+    try:
+        query = querycache(text, context).bind(*values) #tokenised once per worker process
+        if query.format.endswith("xml"):
+            convert = query.formatresult
+        else:
+            convert = lambda e: [ e2.json() for e2 in e ] if isinstance(e, SpanSet) else e.json()
+        if reader:
+            sentences = folia.Reader(filename, folia.Sentence)
+            for sentence in sentences:
+                results += [ convert(e) for e in query.execute(sentences.doc, debug, [sentence]) ]
+            sentences.close()
+        else:
+            doc = folia.Document(file=filename, **documentkwargs)
+            results = [ convert(e) for e in query.execute(doc, debug) ]
+            if save and query.modifies():
+                if outputdir:
+                    doc.save(os.path.join(outputdir, os.path.basename(filename)))
+                else:
+                    doc.save()
+                saved = True
+            del doc
+    except Exception: #pylint: disable=broad-except
+        return BatchResult(filename, results, time.time() - begintime, traceback.format_exc(), saved)
+    return BatchResult(filename, results, time.time() - begintime, None, saved)
+
+
+class BatchQuery(object):
+    """Executes an FQL query on many FoLiA documents in parallel.
+
+    Each document is loaded in a worker process, where the query is executed and, if it changes the document (e.g. **EDIT** or **ADD**), the document is saved. Iterating over the batch yields a :class:`BatchResult` for each document as soon as it has been processed, so results of different documents arrive in no particular order unless ``ordered`` is set. Errors are reported in the results rather than raised.
+
+    Example::
+
+        batch = fql.BatchQuery('SELECT w WHERE text = "house" FORMAT json', folia.CorpusFiles('/path/to/corpus'))
+        for result in batch:
+            if result.ok():
+                for word in result.results:
+                    print(word['id'])
+            else:
+                print(result, file=sys.stderr)
+
+    Arguments:
+        query: The query, a :class:`Query` instance or a string. Values must be bound to the placeholders of a prepared query before iterating.
+        corpus: The files to process, a :class:`folia.Corpus` or :class:`folia.CorpusFiles` instance, or any iterable of filenames
+
+    Keyword Arguments:
+        threads (int or None): The number of worker processes, defaults to the number of available cores. If set to 1, the documents are processed in the current process.
+        save (bool): Save documents changed by the query (default: ``True``)
+        outputdir (str or None): Save changed documents in this directory rather than overwriting the originals
+        reader (bool): Read the documents with the streaming :class:`folia.Reader` and evaluate the query within each sentence in turn, rather than loading entire documents. Only possible for queries that do not change documents and that select nothing larger than a sentence.
+        ordered (bool): Yield the results in the order of the corpus (default: ``False``)
+        chunksize (int): The number of files submitted to a worker at once
+        maxtasksperchild (int): The number of files a worker process handles before it is replaced by a fresh one, this keeps memory leaks (lxml!) in check.
+        debug (bool): Print debug information on query evaluation
+        Any other keyword arguments will be passed to :class:`folia.Document` when loading a document, along with those of a :class:`folia.Corpus`
+    """
+
+    def __init__(self, query, corpus, threads=None, save=True, outputdir=None, reader=False, ordered=False, chunksize=1, maxtasksperchild=100, debug=False, **kwargs):
+        if not isinstance(query, Query):
+            query = Query(query)
+        self.query = query
+        self.documentkwargs = {}
+        if isinstance(corpus, folia.Corpus):
+            self.documentkwargs.update(corpus.kwargs) #document options of the corpus, explicit keyword arguments take precedence
+            if not isinstance(corpus, folia.CorpusFiles):
+                corpus = folia.CorpusFiles(corpus.corpusdir, corpus.extension, corpus.restrict_to_collection, corpus.conditionf, corpus.ignoreerrors)
+        self.corpus = corpus
+        self.threads = threads if threads else multiprocessing.cpu_count()
+        self.save = save
+        self.outputdir = outputdir
+        if outputdir and not os.path.isdir(outputdir):
+            os.makedirs(outputdir)
+        self.reader = reader
+        self.ordered = ordered
+        self.chunksize = chunksize
+        self.maxtasksperchild = maxtasksperchild #This should never be set too high due to lxml leaking memory!!!
+        self.debug = debug
+        self.documentkwargs.update(kwargs)
+        if reader:
+            if query.modifies():
+                raise QueryError("Queries that change documents can not be executed using the streaming reader")
+            for selector in query.selectors():
+                if selector.Class and selector.Class != "ALL" and issubclass(selector.Class, NONSENTENCESCOPE):
+                    raise QueryError("Queries selecting " + selector.Class.XMLTAG + " can not be evaluated within sentences, as required by the streaming reader")
+
+    def __iter__(self):
+        """Executes the query on all documents, yielding a :class:`BatchResult` for each"""
+        if not all( parameter.bound for parameter in self.query.parameters ):
+            raise QueryError("No values bound to the placeholders of the query, see Query.bind()")
+        values = [ parameter.value for parameter in self.query.parameters ]
+        tasks = ( (filename, self.query.text, self.query.context, values, self.save, self.outputdir, self.reader, self.documentkwargs, self.debug) for filename in self.corpus )
+        if self.threads == 1:
+            for task in tasks:
+                yield batchexecute(task)
+        else:
+            pool = multiprocessing.Pool(self.threads, None, None, self.maxtasksperchild)
+            try:
+                if self.ordered:
+                    results = pool.imap(batchexecute, tasks, self.chunksize)
+                else:
+                    results = pool.imap_unordered(batchexecute, tasks, self.chunksize)
+                for result in results:
+                    yield result
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+
+    def jsonlines(self):
+        """Executes the query on all documents, yielding a line of JSON (without trailing newline) with the results, timing and any error for each document"""
+        for result in self:
+            yield json.dumps(result.json())
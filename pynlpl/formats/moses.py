@@ -23,11 +23,18 @@ from __future__ import absolute_import
 from pynlpl.common import u
 
 import sys
+import os
 import bz2
 import gzip
 import datetime
 import socket
 import io
+import mmap
+import struct
+import array
+import heapq
+import tempfile
+import shutil
 
 try:
     from twisted.internet import protocol, reactor #No Python 3 support yet :(
@@ -37,83 +44,80 @@ except:
     print("WARNING: Twisted could not be imported",file=sys.stderr)
     twistedimported = False
 
+if sys.version >= '3':
+    from pynlpl.asyncnet import LineServer, ClientPool
+
+
+def readphrasetable(filename, quiet=False, reverse=False, delimiter="|||", score_column = 3, max_sourcen = 0, scorefilter=None):
+    """Reads a Moses phrase table and yields (source, target, scores) tuples, where scores is a tuple of floats. Invalid lines are skipped."""
+    if filename.split(".")[-1] == "bz2":
+        f = bz2.BZ2File(filename,'r')
+    elif filename.split(".")[-1] == "gz":
+        f = gzip.GzipFile(filename,'r')
+    else:
+        f = io.open(filename,'r',encoding='utf-8')
+    linenum = 0
+
+    while True:
+        if not quiet:
+            linenum += 1
+            if (linenum % 100000) == 0:
+                print("Loading phrase-table: @%d" % linenum, "\t(" + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + ")",file=sys.stderr)
+        line = u(f.readline())
+        if not line:
+            break
+
+        #split into (trimmed) segments
+        segments = [ segment.strip() for segment in line.split(delimiter) ]
+
+        if len(segments) < 3:
+            print("Invalid line: ", line, file=sys.stderr)
+            continue
+
+        #Do we have a score associated?
+        if score_column > 0 and len(segments) >= score_column:
+            scores = tuple( ( float(x) for x in segments[score_column-1].strip().split() ) )
+        else:
+            scores = tuple()
+
+        #if align2_column > 0:
+        #    try:
+        #        null_alignments = segments[align2_column].count("()")
+        #    except:
+        #        null_alignments = 0
+        #else:
+        #    null_alignments = 0
+
+        if scorefilter:
+            if not scorefilter(scores): continue
+
+        if reverse:
+            if max_sourcen > 0 and segments[1].count(' ') + 1 > max_sourcen:
+                continue
+            yield segments[1], segments[0], scores
+        else:
+            if max_sourcen > 0 and segments[0].count(' ') + 1 > max_sourcen:
+                continue
+            yield segments[0], segments[1], scores
+
+    f.close()
+
 
 class PhraseTable(object):
     def __init__(self,filename, quiet=False, reverse=False, delimiter="|||", score_column = 3, max_sourcen = 0,sourceencoder=None, targetencoder=None, scorefilter=None):
-        """Load a phrase table from file into memory (memory intensive!)"""
+        """Load a phrase table from file into memory (memory intensive!), see :class:`MappedPhraseTable` for an alternative"""
         self.phrasetable = {}
         self.sourceencoder = sourceencoder
         self.targetencoder = targetencoder
 
-
-        if filename.split(".")[-1] == "bz2":
-            f = bz2.BZ2File(filename,'r')
-        elif filename.split(".")[-1] == "gz":
-            f = gzip.GzipFile(filename,'r')
-        else:
-            f = io.open(filename,'r',encoding='utf-8')
-        linenum = 0
         prevsource = None
         targets = []
 
-        while True:
-            if not quiet:
-                linenum += 1
-                if (linenum % 100000) == 0:
-                    print("Loading phrase-table: @%d" % linenum, "\t(" + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + ")",file=sys.stderr)
-            line = u(f.readline())
-            if not line:
-                break
-
-            #split into (trimmed) segments
-            segments = [ segment.strip() for segment in line.split(delimiter) ]
-
-            if len(segments) < 3:
-                print("Invalid line: ", line, file=sys.stderr)
-                continue
-
-            #Do we have a score associated?
-            if score_column > 0 and len(segments) >= score_column:
-                scores = tuple( ( float(x) for x in segments[score_column-1].strip().split() ) )
-            else:
-                scores = tuple()
-
-            #if align2_column > 0:
-            #    try:
-            #        null_alignments = segments[align2_column].count("()")
-            #    except:
-            #        null_alignments = 0
-            #else:
-            #    null_alignments = 0
-
-            if scorefilter:
-                if not scorefilter(scores): continue
-
-            if reverse:
-                if max_sourcen > 0 and segments[1].count(' ') + 1 > max_sourcen:
-                    continue
-
-                if self.sourceencoder:
-                    source = self.sourceencoder(segments[1]) #tuple(segments[1].split(" "))
-                else:
-                    source = segments[1]
-                if self.targetencoder:
-                    target = self.targetencoder(segments[0]) #tuple(segments[0].split(" "))
-                else:
-                    target = segments[0]
-            else:
-                if max_sourcen > 0 and segments[0].count(' ') + 1 > max_sourcen:
-                    continue
-
-                if self.sourceencoder:
-                    source = self.sourceencoder(segments[0]) #tuple(segments[0].split(" "))
-                else:
-                    source = segments[0]
-                if self.targetencoder:
-                    target = self.targetencoder(segments[1]) #tuple(segments[1].split(" "))
-                else:
-                    target = segments[1]
-
+        for source, target, scores in readphrasetable(filename, quiet, reverse, delimiter, score_column, max_sourcen, scorefilter):
+            if self.sourceencoder:
+                source = self.sourceencoder(source) #tuple(source.split(" "))
+            if self.targetencoder:
+                target = self.targetencoder(target) #tuple(target.split(" "))
 
             if prevsource and source != prevsource and targets:
                 self.phrasetable[prevsource] = tuple(targets)
@@ -126,8 +130,6 @@ class PhraseTable(object):
         if prevsource and targets:
             self.phrasetable[prevsource] = tuple(targets)
 
-        f.close()
-
 
     def __contains__(self, phrase):
         """Query if a certain phrase exist in the phrase table"""
@@ -167,14 +169,210 @@ class PhraseTable(object):
         #else:
         #    raise KeyError
 
+class MappedPhraseTable(object):
+    """A phrase table that is not loaded into memory but memory-mapped from a binary file, in which the source phrases are sorted. Such a file has to be built once from a Moses phrase table, using :meth:`MappedPhraseTable.build`. Lookups take logarithmic time in the number of source phrases and the operating system only pages in the parts of the file that are actually accessed, so this is suited for phrase tables that do not fit in memory.
+
+    It offers the same interface as :class:`PhraseTable`, except that no source/target encoders are supported, and the scores are returned as zero-copy arrays (memoryviews in Python 3) rather than tuples.
+
+    Example::
+
+        MappedPhraseTable.build('phrase-table.gz', 'phrase-table.bin')
+        phrasetable = MappedPhraseTable('phrase-table.bin')
+        for target, scores in phrasetable['de kat']:
+            print(target, scores[2])
+    """
+
+    MAGIC = b"PYNLPLPT"
+    VERSION = 1
+    HEADER = struct.Struct('<8sIQQQQ') #magic, version, number of sources, number of targets, number of scores, size of string blob
+    SOURCE = struct.Struct('<QIQI') #string offset, string length, index of first target, number of targets
+    TARGET = struct.Struct('<QIQI') #string offset, string length, index of first score, number of scores
+
+    def __init__(self, filename):
+        """Open a phrase table file built by :meth:`MappedPhraseTable.build`"""
+        self.filename = filename
+        self.file = open(filename,'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.sources, self.targets, self.scores, stringsize = self.HEADER.unpack_from(self.mmap, 0)
+        if magic != self.MAGIC:
+            raise ValueError("Not a memory-mapped phrase table: " + filename)
+        if version != self.VERSION:
+            raise ValueError("Unsupported version of memory-mapped phrase table: " + str(version))
+        self.sourceoffset = self.HEADER.size
+        self.targetoffset = self.sourceoffset + self.sources * self.SOURCE.size
+        self.scoreoffset = self.targetoffset + self.targets * self.TARGET.size
+        self.stringoffset = self.scoreoffset + self.scores * 8
+        if sys.version >= '3' and sys.byteorder == 'little':
+            self.scoreview = memoryview(self.mmap)[self.scoreoffset:self.stringoffset].cast('d')
+        else:
+            self.scoreview = None
+
+    @staticmethod
+    def build(phrasetablefile, filename, quiet=False, reverse=False, delimiter="|||", score_column = 3, max_sourcen = 0, scorefilter=None, buffersize=1000000):
+        """Build a memory-mapped phrase table from a Moses phrase table (plain, gz or bz2).
+
+        The options ``reverse``, ``max_sourcen`` and ``scorefilter`` are the same as for :class:`PhraseTable` and are applied whilst building. The phrase table need not be sorted: entries are sorted in runs of ``buffersize`` entries, which are subsequently merged, so memory usage is bounded regardless of the size of the phrase table. The order of the targets of a source phrase is preserved.
+
+        Arguments:
+            phrasetablefile (str): The Moses phrase table to read
+            filename (str): The file to write
+        """
+        tmpdir = tempfile.mkdtemp(prefix='phrasetable')
+        try:
+            #sort entries (by the UTF-8 encoded source) in runs
+            runs = []
+            buffer = []
+            for i, (source, target, scores) in enumerate(readphrasetable(phrasetablefile, quiet, reverse, delimiter, score_column, max_sourcen, scorefilter)):
+                buffer.append( (source.encode('utf-8'), i, target.encode('utf-8'), scores) )
+                if len(buffer) >= buffersize:
+                    runs.append(MappedPhraseTable._writerun(buffer, os.path.join(tmpdir, 'run' + str(len(runs)))))
+                    buffer = []
+            if runs:
+                runs.append(MappedPhraseTable._writerun(buffer, os.path.join(tmpdir, 'run' + str(len(runs)))))
+                entries = heapq.merge(*[ MappedPhraseTable._readrun(run) for run in runs ])
+            else:
+                buffer.sort()
+                entries = buffer
+
+            #write the sections to separate files, concatenated afterwards
+            sourcefile = open(os.path.join(tmpdir,'sources'),'wb')
+            targetfile = open(os.path.join(tmpdir,'targets'),'wb')
+            scorefile = open(os.path.join(tmpdir,'scores'),'wb')
+            stringfile = open(os.path.join(tmpdir,'strings'),'wb')
+            sources = targets = scores = stringsize = 0
+            prevsource = None
+            sourcetargets = 0
+            for source, _, target, targetscores in entries:
+                if source != prevsource:
+                    if prevsource is not None:
+                        sourcefile.write(MappedPhraseTable.SOURCE.pack(sourceoffset, len(prevsource), targets - sourcetargets, sourcetargets))
+                        sources += 1
+                    sourceoffset = stringsize
+                    stringfile.write(source)
+                    stringsize += len(source)
+                    prevsource = source
+                    sourcetargets = 0
+                targetfile.write(MappedPhraseTable.TARGET.pack(stringsize, len(target), scores, len(targetscores)))
+                stringfile.write(target)
+                stringsize += len(target)
+                if targetscores:
+                    scorefile.write(struct.pack('<' + str(len(targetscores)) + 'd', *targetscores))
+                scores += len(targetscores)
+                targets += 1
+                sourcetargets += 1
+            if prevsource is not None:
+                sourcefile.write(MappedPhraseTable.SOURCE.pack(sourceoffset, len(prevsource), targets - sourcetargets, sourcetargets))
+                sources += 1
+            for f in (sourcefile, targetfile, scorefile, stringfile):
+                f.close()
+
+            with open(filename,'wb') as f:
+                f.write(MappedPhraseTable.HEADER.pack(MappedPhraseTable.MAGIC, MappedPhraseTable.VERSION, sources, targets, scores, stringsize))
+                for section in ('sources','targets','scores','strings'):
+                    with open(os.path.join(tmpdir,section),'rb') as f2:
+                        shutil.copyfileobj(f2, f)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    @staticmethod
+    def _writerun(buffer, filename):
+        """Internal method, sorts and writes a run of entries to file"""
+        buffer.sort()
+        with open(filename,'wb') as f:
+            for source, i, target, scores in buffer:
+                f.write(struct.pack('<QIII', i, len(source), len(target), len(scores)))
+                f.write(source)
+                f.write(target)
+                f.write(struct.pack('<' + str(len(scores)) + 'd', *scores))
+        return filename
+
+    @staticmethod
+    def _readrun(filename):
+        """Internal method, reads a run of entries from file"""
+        with open(filename,'rb') as f:
+            while True:
+                header = f.read(20)
+                if not header:
+                    break
+                i, sourcelength, targetlength, scorelength = struct.unpack('<QIII', header)
+                source = f.read(sourcelength)
+                target = f.read(targetlength)
+                scores = struct.unpack('<' + str(scorelength) + 'd', f.read(scorelength * 8))
+                yield source, i, target, scores
+
+    def close(self):
+        self.scoreview = None
+        self.mmap.close()
+        self.file.close()
+
+    def _source(self, index):
+        """Internal method, returns the (encoded) source phrase at the specified index"""
+        offset, length, _, _ = self.SOURCE.unpack_from(self.mmap, self.sourceoffset + index * self.SOURCE.size)
+        return self.mmap[self.stringoffset + offset:self.stringoffset + offset + length]
+
+    def _find(self, phrase):
+        """Internal method, binary search for a source phrase, returns its index or None"""
+        phrase = u(phrase).encode('utf-8')
+        lo = 0
+        hi = self.sources
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._source(mid) < phrase:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.sources and self._source(lo) == phrase:
+            return lo
+        return None
+
+    def _targets(self, index):
+        """Internal method, returns the targets of the source phrase at the specified index"""
+        _, _, first, count = self.SOURCE.unpack_from(self.mmap, self.sourceoffset + index * self.SOURCE.size)
+        targets = []
+        for i in range(first, first + count):
+            offset, length, scoreindex, scorecount = self.TARGET.unpack_from(self.mmap, self.targetoffset + i * self.TARGET.size)
+            target = self.mmap[self.stringoffset + offset:self.stringoffset + offset + length].decode('utf-8')
+            if self.scoreview is not None:
+                scores = self.scoreview[scoreindex:scoreindex+scorecount]
+            else:
+                scores = array.array('d', struct.unpack_from('<' + str(scorecount) + 'd', self.mmap, self.scoreoffset + scoreindex * 8))
+            targets.append( (target, scores) )
+        return tuple(targets)
+
+    def __contains__(self, phrase):
+        """Query if a certain phrase exist in the phrase table"""
+        return self._find(phrase) is not None
+
+    def __iter__(self):
+        for index in range(self.sources):
+            yield self._source(index).decode('utf-8'), self._targets(index)
+
+    def __len__(self):
+        return self.sources
+
+    def __bool__(self):
+        return self.sources > 0
+
+    def __nonzero__(self): #Python 2.x
+        return self.sources > 0
+
+    def __getitem__(self, phrase):
+        """Return a tuple of (translation, scores) tuples"""
+        index = self._find(phrase)
+        if index is None:
+            raise KeyError(phrase)
+        return self._targets(index)
+
+
 if twistedimported:
     class PTProtocol(basic.LineReceiver):
         def lineReceived(self, phrase):
             try:
-                for target,Pst,Pts,null_alignments in self.factory.phrasetable[phrase]:
-                    self.sendLine(target+"\t"+str(Pst)+"\t"+str(Pts)+"\t"+str(null_alignments))
+                for target, scores in self.factory.phrasetable[u(phrase)]:
+                    self.sendLine((target+"\t"+" ".join( str(score) for score in scores )).encode('utf-8'))
+                self.sendLine(b"")
             except KeyError:
-                self.sendLine("NOTFOUND")
+                self.sendLine(b"NOTFOUND")
 
     class PTFactory(protocol.ServerFactory):
         protocol = PTProtocol
@@ -187,6 +385,45 @@ if twistedimported:
             reactor.run()
 
 
+if sys.version >= '3':
+    class AsyncPhraseTableServer(LineServer):
+        """Asynchronous phrase table server (Python 3 only), speaks the same protocol as PhraseTableServer but accepts pipelined requests.
+
+        Call run() to serve forever, or runinbackground().
+        """
+
+        def __init__(self, phrasetable, port=65432, host=''):
+            super(AsyncPhraseTableServer, self).__init__(None, port, host)
+            self.phrasetable = phrasetable
+
+        def handle(self, requests):
+            responses = []
+            for phrase in requests:
+                try:
+                    responses.append("".join( target + "\t" + " ".join( str(score) for score in scores ) + "\r\n" for target, scores in self.phrasetable[phrase] ))
+                except KeyError:
+                    responses.append("NOTFOUND")
+            return responses
+
+
+def phrasetableresponseend(lines):
+    """End-of-response test for the phrase table server protocol: responses end with an empty line, or consist of NOTFOUND"""
+    return lines[-1] == "" or lines == ["NOTFOUND"]
+
+
+def parsephrasetableresponse(lines):
+    """Parses the lines of a phrase table server response, returns a list of (translation, scores) tuples, or None if the phrase was not found"""
+    solutions = []
+    for line in lines:
+        if line == "NOTFOUND":
+            return None
+        elif line:
+            fields = line.split("\t")
+            if len(fields) == 2:
+                solutions.append( (fields[0], tuple( float(x) for x in fields[1].split() )) )
+            else:
+                print("PHRASETABLECLIENT WARNING: Unable to parse response line",file=sys.stderr)
+    return solutions
 
 
 class PhraseTableClient(object):
@@ -199,29 +436,27 @@ class PhraseTableClient(object):
         self.lastresponse = ""
         self.lastquery = ""
 
+    def query(self, phrase):
+        """Internal method, sends a query to the server and returns the response"""
+        self.socket.sendall(u(phrase).encode('utf-8') + b"\r\n")
+        data = b""
+        while not (data == b"NOTFOUND\r\n" or data == b"\r\n" or data.endswith(b"\r\n\r\n")): #a response is terminated by an empty line
+            buffer = self.socket.recv(self.BUFSIZE)
+            if not buffer:
+                raise IOError("Connection to phrase table server closed")
+            data += buffer
+        return u(data)
+
     def __getitem__(self, phrase):
-        solutions = []
+        """Return a list of (translation, scores) tuples"""
         if phrase != self.lastquery:
-            self.socket.send(phrase+ "\r\n")
-
-            data = b""
-            while not data or data[-1] != '\n':
-                data += self.socket.recv(self.BUFSIZE)
+            data = self.query(phrase)
         else:
             data = self.lastresponse
 
-        data = u(data)
-
-        for line in data.split('\n'):
-            line = line.strip('\r\n')
-            if line == "NOTFOUND":
-                raise KeyError(phrase)
-            elif line:
-                fields = tuple(line.split("\t"))
-                if len(fields) == 4:
-                    solutions.append( fields )
-                else:
-                    print >>sys.stderr,"PHRASETABLECLIENT WARNING: Unable to parse response line"
+        solutions = parsephrasetableresponse([ line.strip('\r\n') for line in data.split('\n') ])
+        if solutions is None:
+            raise KeyError(phrase)
 
         self.lastresponse = data
         self.lastquery = phrase
@@ -229,14 +464,7 @@ class PhraseTableClient(object):
         return solutions
 
     def __contains__(self, phrase):
-        self.socket.send(phrase.encode('utf-8')+ b"\r\n")\
-
-
-        data = b""
-        while not data or data[-1] != '\n':
-            data += self.socket.recv(self.BUFSIZE)
-
-        data = u(data)
+        data = self.query(phrase)
 
         for line in data.split('\n'):
             line = line.strip('\r\n')
@@ -248,3 +476,30 @@ class PhraseTableClient(object):
 
         return True
 
+
+class PooledPhraseTableClient(object):
+    """Client for PhraseTableServer/AsyncPhraseTableServer that pipelines requests over a pool of connections (Python 3 only).
+
+    Safe to share between threads.
+    """
+
+    def __init__(self,host= "localhost",port=65432, size=4, window=1000):
+        self.pool = ClientPool(host, port, size, responseend=phrasetableresponseend, window=window)
+
+    def lookup(self, phrases):
+        """Look up a list of phrases, returns a list with for each phrase a list of (translation, scores) tuples, or None if the phrase was not found"""
+        return [ parsephrasetableresponse(lines) for lines in self.pool.query([ u(phrase) for phrase in phrases ]) ]
+
+    def __getitem__(self, phrase):
+        """Return a list of (translation, scores) tuples"""
+        solutions = self.lookup([phrase])[0]
+        if solutions is None:
+            raise KeyError(phrase)
+        return solutions
+
+    def __contains__(self, phrase):
+        return self.lookup([phrase])[0] is not None
+
+    def close(self):
+        self.pool.close()
+
@@ -94,15 +94,17 @@ class NFA(object):
     def __iter__(self):
         return iter(self._states(self.initialstate))
 
-    def _states(self, state, processedstates=[]): #pylint: disable=dangerous-default-value
+    def _states(self, state, processedstates=None):
         """Iterate over all states in no particular order"""
+        if processedstates is None:
+            processedstates = []
         processedstates.append(state)
 
         for nextstate in state.epsilon:
             if not nextstate in processedstates:
                 self._states(nextstate, processedstates)
 
-        for _, nextstate in state.transitions:
+        for _, _, nextstate in state.transitions:
             if not nextstate in processedstates:
                 self._states(nextstate, processedstates)
 
@@ -126,3 +128,152 @@ class NFA(object):
                 out.append( staterep + " -(" + repr(item) + ")-> " + nextstaterep )
 
         return "\n".join(out)
+
+
+
+class DFA(object):
+    """Deterministic finite state automaton, constructed lazily from an NFA by subset construction.
+
+    Transitions of the NFA are labelled with match functions (predicates) rather than symbols, so for every value only
+    the predicates that are relevant to the current states are evaluated, giving a bit mask of matching predicates.
+    DFA states are sets of NFA states; the transition for a (state, mask) pair is computed the first time it is needed
+    and cached, so the DFA only ever contains the states that are actually reached. A DFA can be reused for any number
+    of sequences, and does not modify the NFA it is constructed from.
+    """
+
+    def __init__(self, nfa):
+        self.nfa = nfa
+        nfastates = list(nfa)
+        index = dict( (id(state), i) for i, state in enumerate(nfastates) )
+        self.predicates = [] #match functions
+        self.items = [] #match items, for debugging
+        predicateindex = {}
+        self.outgoing = [] #NFA state index => list of (predicate index, target NFA state index)
+        for state in nfastates:
+            outgoing = []
+            for matchitem, matchfunction, nextstate in state.transitions:
+                if matchfunction not in predicateindex:
+                    predicateindex[matchfunction] = len(self.predicates)
+                    self.predicates.append(matchfunction)
+                    self.items.append(matchitem)
+                outgoing.append((predicateindex[matchfunction], index[id(nextstate)]))
+            self.outgoing.append(outgoing)
+        self.nfafinal = [ state.final for state in nfastates ]
+        self.closures = [ frozenset( index[id(s)] for s in self.closure(state) ) for state in nfastates ]
+
+        self.dfastates = {} #frozenset of NFA state indices => DFA state
+        self.sets = [] #DFA state => frozenset of NFA state indices
+        self.final = [] #DFA state => bool
+        self.relevant = [] #DFA state => bit mask of the predicates on its outgoing transitions
+        self.transitions = {} #(DFA state, mask) => DFA state, or None if no NFA state is reached
+        self.masks = {} #bit mask => list of predicate indices
+        self.initial = self.dfastate(self.closures[index[id(nfa.initialstate)]])
+
+    @staticmethod
+    def closure(state):
+        """Returns the epsilon-closure of a state"""
+        states = [state]
+        stack = [state]
+        while stack:
+            for eps in stack.pop().epsilon:
+                if not any( eps is s for s in states ):
+                    states.append(eps)
+                    stack.append(eps)
+        return states
+
+    def dfastate(self, nfastates):
+        try:
+            return self.dfastates[nfastates]
+        except KeyError:
+            dfastate = self.dfastates[nfastates] = len(self.sets)
+            self.sets.append(nfastates)
+            self.final.append(any( self.nfafinal[i] for i in nfastates ))
+            relevant = 0
+            for i in nfastates:
+                for predicate, _ in self.outgoing[i]:
+                    relevant |= 1 << predicate
+            self.relevant.append(relevant)
+            return dfastate
+
+    def evaluate(self, value, needed):
+        """Returns the bit mask of the predicates in the needed mask that match the value"""
+        try:
+            predicates = self.masks[needed]
+        except KeyError:
+            predicates = self.masks[needed] = [ i for i in range(len(self.predicates)) if needed & (1 << i) ]
+        mask = 0
+        for i in predicates:
+            if self.predicates[i](value):
+                mask |= 1 << i
+        return mask
+
+    def step(self, dfastate, mask):
+        """Returns the DFA state reached from the given state for a value matching the predicates in the mask (None if there is none)"""
+        key = (dfastate, mask & self.relevant[dfastate])
+        try:
+            return self.transitions[key]
+        except KeyError:
+            targets = set()
+            for i in self.sets[dfastate]:
+                for predicate, target in self.outgoing[i]:
+                    if mask & (1 << predicate):
+                        targets |= self.closures[target]
+            nextstate = self.transitions[key] = self.dfastate(frozenset(targets)) if targets else None
+            return nextstate
+
+    def match(self, sequence):
+        """Does the automaton accept the entire sequence?"""
+        if not sequence:
+            return False
+        state = self.initial
+        for value in sequence:
+            state = self.step(state, self.evaluate(value, self.relevant[state]))
+            if state is None:
+                return False
+        return self.final[state]
+
+    def spans(self, sequence):
+        """Returns all (begin, end) offsets of non-empty subsequences that are accepted, including overlapping ones, ordered by begin and then end offset.
+
+        This takes a single left-to-right pass: a new run is started at every offset, and runs that are in the same
+        DFA state are merged (they will behave identically from there on), so the work per value is bounded by the
+        number of distinct active states rather than the number of runs."""
+        spans = []
+        active = {} #DFA state => begin offsets of the runs in that state
+        for offset, value in enumerate(sequence):
+            if self.initial in active:
+                active[self.initial].append(offset)
+            else:
+                active[self.initial] = [offset]
+            needed = 0
+            for state in active:
+                needed |= self.relevant[state]
+            mask = self.evaluate(value, needed)
+            nextactive = {}
+            for state, begins in active.items():
+                nextstate = self.step(state, mask)
+                if nextstate is not None:
+                    if nextstate in nextactive:
+                        nextactive[nextstate].extend(begins)
+                    else:
+                        nextactive[nextstate] = begins
+            for state, begins in nextactive.items():
+                if self.final[state]:
+                    for begin in begins:
+                        spans.append((begin, offset + 1))
+            active = nextactive
+        spans.sort()
+        return spans
+
+    def find(self, sequence):
+        """Yields all accepted subsequences, in the same order as :meth:`NFA.find`"""
+        for begin, end in self.spans(sequence):
+            yield sequence[begin:end]
+
+    def findall(self, sequences):
+        """Batch version of find(), returns a list of matches for every sequence"""
+        return [ list(self.find(sequence)) for sequence in sequences ]
+
+    def __len__(self):
+        """Returns the number of DFA states constructed so far"""
+        return len(self.sets)
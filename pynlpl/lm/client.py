@@ -6,8 +6,12 @@ from __future__ import unicode_literals
 from __future__ import division
 from __future__ import absolute_import    
 
+import sys
 import socket
 
+if sys.version >= '3':
+    from pynlpl.asyncnet import ClientPool
+
 class LMClient(object):
 
     def __init__(self,host= "localhost",port=12346,n = 0):        
@@ -39,7 +43,43 @@ class LMClient(object):
             ngram = ngram.encode('utf-8')        
         self.socket.send(ngram + b"\r\n")
         return float(self.socket.recv(self.BUFSIZE).strip())
-        
-        
-        
-        
+
+
+class PooledLMClient(object):
+    """Client for LMServer/AsyncLMServer that pipelines requests over a pool of connections (Python 3 only).
+
+    Safe to share between threads. Failed lookups are scored 0.0 by the server.
+    """
+
+    def __init__(self,host= "localhost",port=12346,n = 0, size=4, window=1000):
+        assert isinstance(n,int)
+        self.n = n
+        self.pool = ClientPool(host, port, size, window=window)
+
+    def scoresentences(self, sentences):
+        """Score a list of sentences (strings or lists of words), returns a list of scores"""
+        if self.n > 0:
+            raise Exception("This client instance has been set to send only " + str(self.n) +  "-grams")
+        return [ float(score) for score in self.pool.query([ sentence if isinstance(sentence, str) else " ".join(sentence) for sentence in sentences ]) ]
+
+    def scorengrams(self, ngrams):
+        """Score a list of n-grams (strings or tuples of words), returns a list of scores"""
+        if self.n == 0:
+            raise Exception("This client  has been set to send only full sentence, not n-grams")
+        requests = []
+        for ngram in ngrams:
+            if isinstance(ngram,str):
+                ngram = ngram.split(" ")
+            if len(ngram) != self.n:
+                raise Exception("This client instance has been set to send only " + str(self.n) +  "-grams.")
+            requests.append(" ".join(ngram))
+        return [ float(score) for score in self.pool.query(requests) ]
+
+    def scoresentence(self, sentence):
+        return self.scoresentences([sentence])[0]
+
+    def __getitem__(self, ngram):
+        return self.scorengrams([ngram])[0]
+
+    def close(self):
+        self.pool.close()
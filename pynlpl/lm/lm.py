@@ -14,8 +14,12 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import io
+import os
 import math
 import sys
+import mmap
+import struct
+from array import array
 
 from pynlpl.statistics import FrequencyList, product
 from pynlpl.textprocessors import Windower
@@ -150,6 +154,12 @@ class ARPALanguageModel(object):
     This class does not build the model but allows you to use a pre-computed one.
     You can use the tool ngram-count from for instance SRILM to actually build the model.
 
+    The storage mode is one of 'simple', 'trie' or 'compact'. The latter uses integer word IDs
+    and float32 arrays (requires numpy). In compact mode, a binary cache filename may be
+    passed; if it is up to date it is memory-mapped instead of parsing the ARPA file, otherwise
+    it is (re)written after parsing. A binary file written this way may also be passed
+    directly as filename.
+
     """
 
     class NgramsProbs(object):
@@ -165,6 +175,7 @@ class ARPALanguageModel(object):
 
             'simple' method is a Python dictionary (quick, takes much memory).
             'trie' method is more space-efficient (~35% reduction) but slower.
+            See CompactNgramsProbs for the 'compact' method.
             data is a dictionary of ngram-tuple => (probability, backoff).
             delim is the strings which converts ngrams between tuple and
             unicode string (for saving in trie mode).
@@ -188,11 +199,199 @@ class ARPALanguageModel(object):
             """Return backoff value of a given ngram tuple"""
             return self._data[ngram][1] if self.mode == 'simple' else self._data[self.delim.join(ngram)][0][1]
 
+        def __contains__(self, ngram):
+            return (ngram if self.mode == 'simple' else self.delim.join(ngram)) in self._data
+
         def __len__(self):
             return len(self._data)
 
 
-    def __init__(self, filename, encoding='utf-8', encoder=None, base_e=True, dounknown=True, debug=False, mode='simple'):
+    class CompactNgramsProbs(object):
+        """Store Ngrams with their probabilities and backoffs in a vocabulary-encoded form.
+
+        Words are mapped to integer IDs; the ngrams of each order are kept as
+        sorted columns of word IDs, with probabilities and backoffs in float32
+        arrays. Lookups are binary searches over the ID columns. Requires numpy.
+
+        The storage can be saved to a binary file with save() and memory-mapped
+        again with load(), which avoids parsing the ARPA file on startup.
+        Note that values are stored with float32 precision.
+
+        """
+
+        MAGIC = b"PyNLPlLM"
+        VERSION = 1
+        HEADER = struct.Struct("<8sIIIQ") #magic, version, order, base_e, vocabulary blob size
+
+        def __init__(self):
+            import numpy
+            self.numpy = numpy
+            self.vocab = {}
+            self.order = 0
+            self.base_e = True
+            self.total = {}
+            self.ids = {}      #order => int32 array of shape (order, count), ngrams sorted lexicographically
+            self.probs = {}    #order => float32 array
+            self.backoffs = {} #order => float32 array
+            self._mmap = None
+            self._buffer = {}  #order => (ids, probs, backoffs) flat arrays during construction
+
+        def add(self, ngram, prob, backoff):
+            """Add an ngram tuple with its probability and backoff (only during construction)"""
+            n = len(ngram)
+            if n not in self._buffer:
+                self._buffer[n] = (array('i'), array('f'), array('f'))
+            ids, probs, backoffs = self._buffer[n]
+            for word in ngram:
+                try:
+                    ids.append(self.vocab[word])
+                except KeyError:
+                    ids.append(len(self.vocab))
+                    self.vocab[word] = len(self.vocab)
+            probs.append(prob)
+            backoffs.append(backoff)
+
+        def finalise(self):
+            """Sort the buffered ngrams into their final arrays, called after the last add()"""
+            numpy = self.numpy
+            for n, (ids, probs, backoffs) in self._buffer.items():
+                ids = numpy.frombuffer(ids, dtype=numpy.int32).reshape(-1, n).T
+                order = numpy.lexsort(ids[::-1])
+                self.ids[n] = numpy.ascontiguousarray(ids[:, order])
+                self.probs[n] = numpy.frombuffer(probs, dtype=numpy.float32)[order]
+                self.backoffs[n] = numpy.frombuffer(backoffs, dtype=numpy.float32)[order]
+                self.order = max(self.order, n)
+            self._buffer = {}
+
+        def find(self, ngram):
+            """Return (order, index) of the given ngram tuple, raises KeyError if not found"""
+            n = len(ngram)
+            try:
+                ids = self.ids[n]
+                key = [ self.vocab[word] for word in ngram ]
+            except KeyError:
+                raise KeyError(ngram)
+            begin = 0
+            end = ids.shape[1]
+            for column, wordid in zip(ids, key):
+                column = column[begin:end]
+                offset = begin
+                begin = offset + int(column.searchsorted(wordid, 'left'))
+                end = offset + int(column.searchsorted(wordid, 'right'))
+                if begin == end:
+                    raise KeyError(ngram)
+            return n, begin
+
+        def prob(self, ngram):
+            """Return probability of given ngram tuple"""
+            n, i = self.find(ngram)
+            return float(self.probs[n][i])
+
+        def backoff(self, ngram):
+            """Return backoff value of a given ngram tuple"""
+            n, i = self.find(ngram)
+            return float(self.backoffs[n][i])
+
+        def __contains__(self, ngram):
+            try:
+                self.find(ngram)
+                return True
+            except KeyError:
+                return False
+
+        def __len__(self):
+            return sum( len(probs) for probs in self.probs.values() )
+
+        def save(self, filename):
+            """Save the storage to a binary file that can be memory-mapped by load()"""
+            words = [None] * len(self.vocab)
+            for word, wordid in self.vocab.items():
+                words[wordid] = word
+            vocab = "\n".join(words).encode('utf-8')
+            with io.open(filename, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.order, int(self.base_e), len(vocab)))
+                for n in range(1, self.order + 1):
+                    count = len(self.probs[n]) if n in self.probs else 0
+                    f.write(struct.pack("<QQ", count, self.total.get(n, 0)))
+                f.write(vocab)
+                for n in range(1, self.order + 1):
+                    if n in self.probs:
+                        for a in (self.ids[n], self.probs[n], self.backoffs[n]):
+                            f.write(b"\0" * (-f.tell() % 8)) #align
+                            f.write(a.tobytes())
+
+        @classmethod
+        def load(cls, filename):
+            """Load a storage saved with save(), the arrays are memory-mapped rather than read"""
+            self = cls()
+            numpy = self.numpy
+            with io.open(filename, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.order, base_e, vocabsize = self.HEADER.unpack_from(self._mmap, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("File " + filename + " is not a binary PyNLPl language model (or of an unsupported version)")
+            self.base_e = bool(base_e)
+            offset = self.HEADER.size
+            counts = {}
+            for n in range(1, self.order + 1):
+                counts[n], total = struct.unpack_from("<QQ", self._mmap, offset)
+                if total:
+                    self.total[n] = total
+                offset += 16
+            if vocabsize:
+                words = self._mmap[offset:offset+vocabsize].decode('utf-8').split("\n")
+                self.vocab = dict(zip(words, range(len(words))))
+            offset += vocabsize
+            for n in range(1, self.order + 1):
+                if counts[n]:
+                    arrays = []
+                    for dtype, size in ((numpy.int32, n * counts[n]), (numpy.float32, counts[n]), (numpy.float32, counts[n])):
+                        offset += -offset % 8
+                        arrays.append(numpy.frombuffer(self._mmap, dtype=dtype, count=size, offset=offset))
+                        offset += size * 4
+                    self.ids[n] = arrays[0].reshape(n, counts[n])
+                    self.probs[n] = arrays[1]
+                    self.backoffs[n] = arrays[2]
+            return self
+
+        @classmethod
+        def isbinary(cls, filename):
+            """Tests whether the file is a binary language model written by save()"""
+            with io.open(filename, 'rb') as f:
+                return f.read(len(cls.MAGIC)) == cls.MAGIC
+
+
+    class State(object):
+        """Language model state: the context that is relevant for scoring the next word.
+
+        States are obtained from nullstate() or beginstate() and advanced with
+        scorestate(). Only the longest context that occurs in the model is
+        retained, so equal states can be shared and cached. States are immutable.
+
+        """
+
+        __slots__ = ('context',)
+
+        def __init__(self, context=()):
+            self.context = context
+
+        def __eq__(self, other):
+            return isinstance(other, ARPALanguageModel.State) and self.context == other.context
+
+        def __ne__(self, other):
+            return not (self == other)
+
+        def __hash__(self):
+            return hash(self.context)
+
+        def __len__(self):
+            return len(self.context)
+
+        def __repr__(self):
+            return "State(" + repr(self.context) + ")"
+
+
+    def __init__(self, filename, encoding='utf-8', encoder=None, base_e=True, dounknown=True, debug=False, mode='simple', cache=None):
         # parameters
         self.encoder = (lambda x: x) if encoder is None else encoder
         self.base_e = base_e
@@ -202,7 +401,31 @@ class ARPALanguageModel(object):
         # other attributes
         self.total = {}
 
-        data = {}
+        if mode == 'compact':
+            if self.CompactNgramsProbs.isbinary(filename):
+                binaryfile = filename
+            elif cache and os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(filename):
+                binaryfile = cache
+            else:
+                binaryfile = None
+            if binaryfile:
+                ngrams = self.CompactNgramsProbs.load(binaryfile)
+                if ngrams.base_e == base_e:
+                    self.ngrams = ngrams
+                    self.order = ngrams.order
+                    self.total = ngrams.total
+                    return
+                elif binaryfile == filename:
+                    raise ValueError("Binary language model " + filename + " was not stored with base_e=" + str(base_e))
+                #otherwise the cache was built with another base, rebuild it from the ARPA file
+            self.ngrams = self.CompactNgramsProbs()
+            self.ngrams.base_e = base_e
+            add = self.ngrams.add
+        elif cache:
+            raise ValueError("A binary cache is only supported in compact mode")
+        else:
+            data = {}
+            add = lambda ngram, logprob, backoffprob: data.__setitem__(ngram, (logprob, backoffprob))
 
         with io.open(filename, 'rt', encoding=encoding) as f:
             order = None
@@ -243,22 +466,100 @@ class ARPALanguageModel(object):
                             if self.debug:
                                 msg = "Adding to LM: {}\t{}"
                                 print(msg.format(ngram, logprob), file=stderr)
-                        data[ngram] = (logprob, backoffprob)
+                        add(ngram, logprob, backoffprob)
                     elif self.debug:
                         print("Unable to parse ARPA LM line: " + line, file=stderr)
         self.order = order
-        self.ngrams = self.NgramsProbs(data, mode)
+        if mode == 'compact':
+            self.ngrams.total = self.total
+            self.ngrams.finalise()
+            if cache:
+                self.ngrams.save(cache)
+        else:
+            self.ngrams = self.NgramsProbs(data, mode)
 
     def score(self, data, history=None):
         result = 0
+        state = self.historystate(history)
         for word in data:
-            result += self.scoreword(word, history)
-            if history:
-                history += (word,)
-            else:
-                history = (word,)
+            score, state = self.scorestate(word, state)
+            result += score
         return result
 
+    def nullstate(self):
+        """Returns the empty state, i.e. without any context"""
+        return self.State()
+
+    def beginstate(self, beginmarker='<s>'):
+        """Returns the state at the beginning of a sentence"""
+        return self.historystate((beginmarker,))
+
+    def historystate(self, history):
+        """Returns the state for the given history (a tuple of words, or None)"""
+        if not history:
+            return self.State()
+        if isinstance(history, str) or (sys.version < '3' and isinstance(history, unicode)):
+            history = (history,)
+        return self.State(self.trimcontext(tuple(history)))
+
+    def trimcontext(self, context):
+        """Reduces a context tuple to its longest suffix that occurs in the model (and is shorter than the order)"""
+        if len(context) >= self.order:
+            context = context[len(context) - self.order + 1:]
+        while context and context not in self.ngrams:
+            context = context[1:]
+        return context
+
+    def scorestate(self, word, state=None):
+        """Scores a word given a state (see nullstate() and beginstate()), returns a (score, newstate) tuple.
+
+        The score is the same as scoreword() with the full history, assuming the
+        model is well-formed (every prefix of an n-gram in the model is in the model as well).
+        """
+        if state is None:
+            context = ()
+        else:
+            context = state.context
+        result = 0
+        for i in range(0, len(context) + 1):
+            lookup = context[i:] + (word,)
+            try:
+                result += self.ngrams.prob(lookup)
+                break
+            except KeyError:
+                if i == len(context):
+                    # unknown word, no history left: same behaviour as scoreword()
+                    return result + self.scoreword(word), self.State()
+                try:
+                    result += self.ngrams.backoff(context[i:])
+                except KeyError:
+                    pass
+        return result, self.State(self.trimcontext(context + (word,)))
+
+    def batchscore(self, sentences, history=None, cache=None):
+        """Scores multiple sentences (e.g. all hypotheses of an n-best list) in one go, returns a list of scores.
+
+        Each sentence is a sequence of words and is scored as with score(), starting from the same history.
+        Scores of (state, word) pairs are cached, so shared prefixes and contexts are only computed once;
+        pass a dictionary as cache to share it between calls.
+        """
+        if cache is None:
+            cache = {}
+        initialstate = self.historystate(history)
+        results = []
+        for sentence in sentences:
+            result = 0
+            state = initialstate
+            for word in sentence:
+                key = (state, word)
+                try:
+                    score, state = cache[key]
+                except KeyError:
+                    score, state = cache[key] = self.scorestate(word, state)
+                result += score
+            results.append(result)
+        return results
+
     def scoreword(self, word, history=None):
         if isinstance(word, str) or (sys.version < '3' and isinstance(word, unicode)):
             word = (word,)
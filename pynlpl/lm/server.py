@@ -13,47 +13,110 @@
 
 #No Python 3 support for twisted yet...
 
-from twisted.internet import protocol, reactor
-from twisted.protocols import basic
-
-class LMSentenceProtocol(basic.LineReceiver):
-    def lineReceived(self, sentence):
-        try:
-            score = self.factory.lm.scoresentence(sentence)
-        except:
-            score = 0.0
-        self.sendLine(str(score))
-
-class LMSentenceFactory(protocol.ServerFactory):
-    protocol = LMSentenceProtocol
-
-    def __init__(self, lm):
-        self.lm = lm
-        
-class LMNGramProtocol(basic.LineReceiver):
-    def lineReceived(self, ngram):
-        ngram = ngram.split(" ")    
-        try:
-            score = self.factory.lm[ngram]
-        except:
-            score = 0.0
-        self.sendLine(str(score))    
-        
-class LMNGramFactory(protocol.ServerFactory):
-    protocol = LMNGramProtocol
-
-    def __init__(self, lm):
-        self.lm = lm        
-        
-        
-
-class LMServer:
-    """Language Model Server"""
-    def __init__(self, lm, port=12346, n=0):
-        """n indicates the n-gram size, if set to 0 (which is default), the server will expect to only receive whole sentence, if set to a particular value, it will only expect n-grams of that value"""
-        if n == 0:
-            reactor.listenTCP(port, LMSentenceFactory(lm))
-        else:
-            reactor.listenTCP(port, LMNGramFactory(lm))
-        reactor.run()
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
 
+import sys
+
+try:
+    from twisted.internet import protocol, reactor
+    from twisted.protocols import basic
+    twistedimported = True
+except ImportError:
+    twistedimported = False
+
+if sys.version >= '3':
+    from pynlpl.asyncnet import LineServer
+
+if twistedimported:
+    class LMSentenceProtocol(basic.LineReceiver):
+        def lineReceived(self, sentence):
+            try:
+                score = self.factory.lm.scoresentence(sentence)
+            except:
+                score = 0.0
+            self.sendLine(str(score))
+
+    class LMSentenceFactory(protocol.ServerFactory):
+        protocol = LMSentenceProtocol
+
+        def __init__(self, lm):
+            self.lm = lm
+
+    class LMNGramProtocol(basic.LineReceiver):
+        def lineReceived(self, ngram):
+            ngram = ngram.split(" ")
+            try:
+                score = self.factory.lm[ngram]
+            except:
+                score = 0.0
+            self.sendLine(str(score))
+
+    class LMNGramFactory(protocol.ServerFactory):
+        protocol = LMNGramProtocol
+
+        def __init__(self, lm):
+            self.lm = lm
+
+
+
+    class LMServer:
+        """Language Model Server"""
+        def __init__(self, lm, port=12346, n=0):
+            """n indicates the n-gram size, if set to 0 (which is default), the server will expect to only receive whole sentence, if set to a particular value, it will only expect n-grams of that value"""
+            if n == 0:
+                reactor.listenTCP(port, LMSentenceFactory(lm))
+            else:
+                reactor.listenTCP(port, LMNGramFactory(lm))
+            reactor.run()
+
+
+if sys.version >= '3':
+    class AsyncLMServer(LineServer):
+        """Asynchronous Language Model Server (Python 3 only), speaks the same protocol as LMServer.
+
+        Clients may pipeline requests; everything received at once is scored as a batch, using batchscore()
+        with a shared cache for an ARPALanguageModel. Call run() to serve forever, or runinbackground().
+        """
+
+        def __init__(self, lm, port=12346, n=0, host='', cachesize=1000000):
+            """n indicates the n-gram size, if set to 0 (which is default), the server will expect to only receive whole sentence, if set to a particular value, it will only expect n-grams of that value"""
+            super(AsyncLMServer, self).__init__(None, port, host)
+            self.lm = lm
+            self.n = n
+            self.cache = {}
+            self.cachesize = cachesize
+
+        def scorengram(self, ngram):
+            ngram = tuple(ngram.split(" "))
+            if hasattr(self.lm, 'scoreword'):
+                return self.lm.scoreword(ngram[-1], ngram[:-1])
+            else:
+                return self.lm[ngram]
+
+        def scoresentence(self, sentence):
+            if hasattr(self.lm, 'score'):
+                return self.lm.score(sentence.split(" "))
+            else:
+                return self.lm.scoresentence(sentence)
+
+        def handle(self, requests):
+            if self.n == 0 and hasattr(self.lm, 'batchscore'):
+                if len(self.cache) > self.cachesize:
+                    self.cache = {}
+                try:
+                    return [ str(score) for score in self.lm.batchscore([ sentence.split(" ") for sentence in requests ], None, self.cache) ]
+                except:
+                    pass #score one by one, so errors only affect the offending request
+            responses = []
+            for request in requests:
+                try:
+                    if self.n == 0:
+                        score = self.scoresentence(request)
+                    else:
+                        score = self.scorengram(request)
+                except:
+                    score = 0.0
+                responses.append(str(score))
+            return responses
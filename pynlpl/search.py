@@ -25,9 +25,12 @@ if sys.version < '3':
 else:
     stderr = sys.stderr
     stdout = sys.stdout
-from pynlpl.datatypes import FIFOQueue, PriorityQueue
+from pynlpl.datatypes import FIFOQueue, PriorityQueue, LRUSet, BloomFilter
 from collections import deque
 from bisect import bisect_left
+import time
+import multiprocessing
+import multiprocessing.pool
 
 
 class AbstractSearchState(object):
@@ -101,6 +104,116 @@ class AbstractSearchState(object):
     #    else:
     #        return 0
 
+class RoundStatistics(object):
+    """Statistics for a single round of a search (one beam in beam searches; the entire search for other searches)
+
+    Attributes:
+
+    * ``round`` - the number of the round (starting at 1)
+    * ``fringe`` - the number of states in the fringe/beam at the start of the round
+    * ``expanded`` - the number of states expanded
+    * ``skipped`` - the number of states not expanded because they were visited before
+    * ``solutions`` - the number of goal states found
+    * ``generated`` - the number of successor states generated by expansion
+    * ``offered`` - the number of successors offered to the fringe (not exceeding maxdepth etc)
+    * ``accepted`` - the number of successors accepted by the fringe
+    * ``pruned`` - the number of successors that were rejected or pruned away again
+    * ``fringepruned`` - the number of states pruned from the fringe while it is being processed (searches that prune after every expansion only)
+    * ``kept`` - the number of states in the resulting fringe
+    * ``beamsize`` - the beam size (beam searches only)
+    * ``expandtime`` - time spent in expand(), in seconds
+    * ``scoretime`` - time spent in score(), in seconds (searches that only score inside the fringe count this in queuetime)
+    * ``queuetime`` - time spent adding states to the fringe, in seconds
+    * ``duration`` - total duration of the round, in seconds
+    """
+
+    def __init__(self, round=1, fringe=0, beamsize=0):
+        self.round = round
+        self.fringe = fringe
+        self.beamsize = beamsize
+        self.expanded = 0
+        self.skipped = 0
+        self.solutions = 0
+        self.generated = 0
+        self.offered = 0
+        self.accepted = 0
+        self.pruned = 0
+        self.fringepruned = 0
+        self.kept = 0
+        self.expandtime = 0.0
+        self.scoretime = 0.0
+        self.queuetime = 0.0
+        self.duration = 0.0
+
+    def expansionspersecond(self):
+        """Returns the number of expanded states per second"""
+        if self.duration:
+            return self.expanded / self.duration
+        else:
+            return 0.0
+
+    def fill(self):
+        """Returns how full the beam was at the end of the round (a fraction between 0 and 1), beam searches only"""
+        if self.beamsize:
+            return self.kept / self.beamsize
+        else:
+            return 0.0
+
+    def __str__(self):
+        s = "Round #" + str(self.round) + ": " + str(self.expanded) + " expanded (" + str(round(self.expansionspersecond(),1)) + "/s), " + str(self.skipped) + " skipped, " + str(self.solutions) + " solutions, " + str(self.generated) + " generated, " + str(self.offered) + " offered, " + str(self.accepted) + " accepted, " + str(self.pruned) + " pruned, " + str(self.kept) + " kept"
+        if self.fringepruned:
+            s += ", " + str(self.fringepruned) + " pruned from fringe"
+        if self.beamsize:
+            s += " (fill " + str(round(self.fill(),2)) + ")"
+        return s + "; expand " + str(round(self.expandtime,4)) + "s, score " + str(round(self.scoretime,4)) + "s, queue " + str(round(self.queuetime,4)) + "s, total " + str(round(self.duration,4)) + "s"
+
+
+class SearchStatistics(object):
+    """Statistics for a search, consisting of a list of RoundStatistics (rounds). Numeric attributes of RoundStatistics can be accessed as totals over all rounds, e.g. stats.expanded"""
+
+    def __init__(self):
+        self.rounds = []
+
+    def newround(self, fringe=0, beamsize=0):
+        roundstats = RoundStatistics(len(self.rounds) + 1, fringe, beamsize)
+        self.rounds.append(roundstats)
+        return roundstats
+
+    def __getattr__(self, attr):
+        if attr in ('expanded','skipped','solutions','generated','offered','accepted','pruned','fringepruned','expandtime','scoretime','queuetime','duration'):
+            return sum( getattr(roundstats, attr) for roundstats in self.rounds )
+        raise AttributeError(attr)
+
+    def expansionspersecond(self):
+        duration = self.duration
+        if duration:
+            return self.expanded / duration
+        else:
+            return 0.0
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def __iter__(self):
+        return iter(self.rounds)
+
+    def __getitem__(self, i):
+        return self.rounds[i]
+
+    def __str__(self):
+        return "\n".join( str(roundstats) for roundstats in self.rounds )
+
+
+def expandstate(state):
+    """Expands a state and scores its successors, returns a ([(successor, score)], expandtime, scoretime) tuple. Used by the worker pools of parallel searches"""
+    begintime = time.time()
+    successors = list(state.expand())
+    expandtime = time.time() - begintime
+    begintime = time.time()
+    scored = [ (successor, successor.score()) for successor in successors ]
+    return scored, expandtime, time.time() - begintime
+
+
 class AbstractSearch(object): #not a real search, just a base class for DFS and BFS
     def __init__(self, **kwargs):
         """For graph-searches graph=True is required (default), otherwise the search may loop forever. For tree-searches, set tree=True for better performance"""
@@ -114,6 +227,10 @@ class AbstractSearch(object): #not a real search, just a base class for DFS and
         self.traversed = 0 #Count of number of nodes visited
         self.solutions = 0 #Counts the number of solutions
         self.debug = 0
+        self.workers = 0 #number of parallel workers to use for expansion and scoring (beam searches only), 0 = no parallelisation
+        self.pooltype = 'process' #process or thread
+        self.maxvisited = 0 #maximum number of visited states to remember, 0 = unlimited
+        self.visitedmemory = 'lru' #lru or bloom, how to bound the memory of visited states when maxvisited is set
 
         for key, value in kwargs.items():
             if key == 'graph':
@@ -139,17 +256,52 @@ class AbstractSearch(object): #not a real search, just a base class for DFS and
                 self.exhaustive = True
             elif key == 'debug':
                 self.debug = value
-        self._visited = {}
+            elif key == 'workers':
+                self.workers = value
+            elif key == 'pool':
+                if value not in ('process','thread'):
+                    raise ValueError("pool must be 'process' or 'thread'")
+                self.pooltype = value
+            elif key == 'maxvisited':
+                self.maxvisited = value
+            elif key == 'visitedmemory':
+                if value not in ('lru','bloom'):
+                    raise ValueError("visitedmemory must be 'lru' or 'bloom'")
+                self.visitedmemory = value
+        self._visited = self.newvisitedmemory()
         self._traversal = []
         self.incomplete = False
         self.traversed = 0
+        self.stats = SearchStatistics()
 
     def reset(self):
-        self._visited = {}
+        self._visited = self.newvisitedmemory()
         self._traversal = []
         self.incomplete = False
         self.traversed = 0 #Count of all visited nodes
         self.solutions = 0 #Counts the number of solutions found     
+        self.stats = SearchStatistics()
+
+    def newvisitedmemory(self):
+        """Returns a new (empty) memory of visited state hashes: a set, or if maxvisited is set, an LRU set or a bloom filter (which may give false positives, i.e. occasionally skip an unvisited state)"""
+        if not self.maxvisited:
+            return set()
+        elif self.visitedmemory == 'bloom':
+            return BloomFilter(self.maxvisited)
+        else:
+            return LRUSet(self.maxvisited)
+
+    def markvisited(self, state):
+        self._visited.add(hash(state))
+
+    def newpool(self):
+        """Returns a new worker pool for parallel expansion (or None if no parallelisation is requested)"""
+        if not self.workers or self.workers <= 1:
+            return None
+        elif self.pooltype == 'thread':
+            return multiprocessing.pool.ThreadPool(self.workers)
+        else:
+            return multiprocessing.Pool(self.workers)
 
     def traversal(self):
         """Returns all visited states (only when keeptraversal=True), note that this is not equal to the path, but contains all states that were checked!"""
@@ -172,6 +324,8 @@ class AbstractSearch(object): #not a real search, just a base class for DFS and
     def __iter__(self):
         """Generator yielding *all* valid goalstates it can find,"""
         n = 0
+        roundstats = self.stats.newround(len(self.fringe))
+        begintime = time.time()
         while len(self.fringe) > 0:
             n += 1
             if self.debug: print("\t[pynlpl debug] *************** ITERATION #" + str(n) + " ****************",file=stderr)
@@ -195,9 +349,13 @@ class AbstractSearch(object): #not a real search, just a base class for DFS and
                 
                 #Evaluate the current state
                 self.traversed += 1
+                roundstats.expanded += 1
                 if state.test(self.goalstates):
                     if self.debug: print("\t[pynlpl debug] Valid goalstate, yielding",file=stderr)
+                    roundstats.solutions += 1
+                    roundstats.duration += time.time() - begintime
                     yield state
+                    begintime = time.time()
                 elif self.debug:
                     print("\t[pynlpl debug] (no goalstate, not yielding)",file=stderr)
                 
@@ -206,7 +364,11 @@ class AbstractSearch(object): #not a real search, just a base class for DFS and
                 
                 #if self.debug: print >>stderr,"\t[pynlpl debug] EXPANDING:"
                 statecount = 0
-                for i, s in enumerate(state.expand()):
+                expandbegintime = time.time()
+                successors = list(state.expand())
+                roundstats.expandtime += time.time() - expandbegintime
+                roundstats.generated += len(successors)
+                for i, s in enumerate(successors):
                     statecount += 1
                     if self.debug >= 2:
                         print("\t[pynlpl debug] (Iteration #" + str(n) +") Expanded state #" + str(i+1) + ", adding to fringe: " + str(s),end="",file=stderr)
@@ -216,18 +378,28 @@ class AbstractSearch(object): #not a real search, just a base class for DFS and
                             print("ERROR SCORING!",file=stderr)
                             pass
                     if not self.maxdepth or s.depth() <= self.maxdepth:
-                        self.fringe.append(s)
+                        roundstats.offered += 1
+                        queuebegintime = time.time()
+                        accepted = self.fringe.append(s)
+                        roundstats.queuetime += time.time() - queuebegintime
+                        if accepted is not False: #lists and FIFO queues return None
+                            roundstats.accepted += 1
+                        else:
+                            roundstats.pruned += 1
                     else:
                         if self.debug: print("\t[pynlpl debug] (Iteration #" + str(n) +") Not adding to fringe, maxdepth exceeded",file=stderr)
                         self.incomplete = True
                 if self.debug:
                     print("\t[pynlpl debug] Expanded " + str(statecount) + " states, offered to fringe",file=stderr)
                 if self.keeptraversal: self._traversal.append(state)
-                if self.usememory: self._visited[hash(state)] = True
+                if self.usememory: self.markvisited(state)
                 self.prune(state) #calls prune method
             else:
+                roundstats.skipped += 1
                 if self.debug:
                     print("\t[pynlpl debug] State already visited before, not expanding again...(hash="+str(hash(state))+")",file=stderr)
+        roundstats.kept = len(self.fringe)
+        roundstats.duration += time.time() - begintime
         if self.debug:
             print("\t[pynlpl debug] Search complete: " + str(self.solutions) + " solution(s), " + str(self.traversed) + " states traversed in " + str(n) + " rounds",file=stderr)
     
@@ -354,105 +526,139 @@ class BeamSearch(AbstractSearch):
     def __iter__(self):
         """Generator yielding *all* valid goalstates it can find"""
         i = 0
-        while len(self.fringe) > 0:
-            i +=1 
-            if self.debug: print("\t[pynlpl debug] *************** STARTING ROUND #" + str(i) + " ****************",file=stderr)
-            
-            b = 0
-            #Create a new empty fixed-length priority queue (this implies there will be pruning if more items are offered than it can hold!)
-            successors = PriorityQueue([], lambda x: x.score, self.minimize, length=self.beamsize, blockworse=False, blockequal=False,duplicates= self.duplicates)
-            
+        pool = self.newpool()
+        try:
             while len(self.fringe) > 0:
-                b += 1
-                if self.debug: print("\t[pynlpl debug] *************** ROUND #" + str(i) + " BEAM# " + str(b) + " ****************",file=stderr)
-                #if self.debug: print >>stderr,"\t[pynlpl debug] FRINGE: ", self.fringe
+                i +=1
+                if self.debug: print("\t[pynlpl debug] *************** STARTING ROUND #" + str(i) + " ****************",file=stderr)
+                roundstats = self.stats.newround(len(self.fringe), self.beamsize)
+                begintime = time.time()
+
+                b = 0
+                #Create a new empty fixed-length priority queue (this implies there will be pruning if more items are offered than it can hold!)
+                #Scores are computed before offering states to the queue (possibly in parallel), the queue looks them up
+                scores = {}
+                successors = PriorityQueue([], lambda x: scores[id(x)] if id(x) in scores else x.score, self.minimize, length=self.beamsize, blockworse=False, blockequal=False,duplicates= self.duplicates)
+
+                #select the states of this round that are to be expanded
+                states = []
+                while len(self.fringe) > 0:
+                    b += 1
+                    if self.debug: print("\t[pynlpl debug] *************** ROUND #" + str(i) + " BEAM# " + str(b) + " ****************",file=stderr)
+                    #if self.debug: print >>stderr,"\t[pynlpl debug] FRINGE: ", self.fringe
+
+                    state = self.poll(self.fringe)()
+                    if self.debug:
+                        try:
+                            print("\t[pynlpl debug] CURRENT STATE (depth " + str(state.depth()) + "): " + str(state),end="",file=stderr)
+                        except AttributeError:
+                            print("\t[pynlpl debug] CURRENT STATE: " + str(state),end="",file=stderr)
+                        print(" hash="+str(hash(state)),file=stderr)
+                        try:
+                            print(" score="+str(state.score()),file=stderr)
+                        except:
+                            pass
+
+
+                    if not self.usememory or (self.usememory and not hash(state) in self._visited):
+
+                        self.traversed += 1
+                        roundstats.expanded += 1
+                        #Evaluate state
+                        if state.test(self.goalstates):
+                            if self.debug: print("\t[pynlpl debug] Valid goalstate, yielding",file=stderr)
+                            self.solutions += 1 #counts the number of solutions
+                            roundstats.solutions += 1
+                            roundstats.duration += time.time() - begintime
+                            yield state
+                            begintime = time.time()
+                        elif self.debug:
+                            print("\t[pynlpl debug] (no goalstate, not yielding)",file=stderr)
+
+                        if pool is None:
+                            #expand immediately
+                            self.offer(state, expandstate(state), successors, scores, roundstats, i, b)
+                        else:
+                            #expand later, in parallel
+                            states.append(state)
+                            if self.usememory: self.markvisited(state)
+                    else:
+                        roundstats.skipped += 1
+                        if self.debug:
+                            print("\t[pynlpl debug] State already visited before, not expanding again... (hash=" + str(hash(state))  +")",file=stderr)
 
-                state = self.poll(self.fringe)()
+                if pool is not None and states:
+                    for state, expansion in zip(states, pool.map(expandstate, states, max(1, len(states) // (self.workers * 4)))):
+                        self.offer(state, expansion, successors, scores, roundstats, i, b)
+
+                #AFTER EXPANDING ALL NODES IN THE FRINGE/BEAM:
+
+                #set fringe for next round
+                self.fringe = successors
+                roundstats.kept = len(successors)
+                roundstats.pruned += roundstats.offered - roundstats.kept
+                roundstats.duration += time.time() - begintime
+
+                #Pruning is implicit, successors was a fixed-size priority queue
                 if self.debug:
-                    try:
-                        print("\t[pynlpl debug] CURRENT STATE (depth " + str(state.depth()) + "): " + str(state),end="",file=stderr)
-                    except AttributeError:
-                        print("\t[pynlpl debug] CURRENT STATE: " + str(state),end="",file=stderr)
-                    print(" hash="+str(hash(state)),file=stderr)
-                    try:
-                        print(" score="+str(state.score()),file=stderr)
-                    except:
-                        pass
-
-
-                if not self.usememory or (self.usememory and not hash(state) in self._visited):
-                    
-                    self.traversed += 1
-                    #Evaluate state
-                    if state.test(self.goalstates):
-                        if self.debug: print("\t[pynlpl debug] Valid goalstate, yielding",file=stderr)
-                        self.solutions += 1 #counts the number of solutions
-                        yield state
-                    elif self.debug:
-                        print("\t[pynlpl debug] (no goalstate, not yielding)",file=stderr)
-
-                    if self.eager:
-                        score = state.score()                    
-
-                    #Expand the specified state and offer to the fringe
-                    
-                    statecount = offers = 0
-                    for j, s in enumerate(state.expand()):
-                        statecount += 1
-                        if self.debug >= 2:
-                            print("\t[pynlpl debug] (Round #" + str(i) +" Beam #" + str(b) + ") Expanded state #" + str(j+1) + ", offering to successor pool: " + str(s),end="",file=stderr)
-                            try:
-                                print(s.score(),end="",file=stderr)
-                            except:
-                                print("ERROR SCORING!",end="",file=stderr)
-                                pass
-                        if not self.maxdepth or s.depth() <= self.maxdepth:
-                            if not self.eager:
-                                #use all successors (even worse ones than the current state)
-                                offers += 1
-                                accepted = successors.append(s)
-                            else:
-                                #use only equal or better successors
-                                if s.score() >= score:
-                                    offers += 1
-                                    accepted = successors.append(s)
-                                else:
-                                    accepted = False
-                            if self.debug >= 2:
-                                if accepted:
-                                    print(" ACCEPTED",file=stderr)
-                                else:
-                                    print(" REJECTED",file=stderr)
-                        else:                            
-                            if self.debug >= 2:
-                                print(" REJECTED, MAXDEPTH EXCEEDED.",file=stderr)
-                            elif self.debug:
-                                print("\t[pynlpl debug] Not offered to successor pool, maxdepth exceeded",file=stderr)
-                    if self.debug:
-                        print("\t[pynlpl debug] Expanded " + str(statecount) + " states, " + str(offers) + " offered to successor pool",file=stderr)
-                    if self.keeptraversal: self._traversal.append(state)
-                    if self.usememory: self._visited[hash(state)] = True
-                    self.prune(state) #calls prune method (does nothing by default in this search!!!)
+                    print("\t[pynlpl debug] (Round #" + str(i) + ") Implicitly pruned with beamsize " + str(self.beamsize) + "...",file=stderr)
+                #self.fringe.prune(self.beamsize)
+                if self.debug: print(" (" + str(roundstats.offered) + " to " + str(len(self.fringe)) + " items)",file=stderr)
+        finally:
+            if pool is not None:
+                pool.terminate()
 
+        if self.debug:
+            print("\t[pynlpl debug] Search complete: " + str(self.solutions) + " solution(s), " + str(self.traversed) + " states traversed in " + str(i) + " rounds with " + str(b) + "  beams",file=stderr)
+
+    def offer(self, state, expansion, successors, scores, roundstats, i, b):
+        """Offers the expanded and scored successors of a state (as returned by expandstate()) to the successor pool"""
+        scored, expandtime, scoretime = expansion
+        roundstats.expandtime += expandtime
+        roundstats.scoretime += scoretime
+        roundstats.generated += len(scored)
+        if self.eager:
+            score = state.score()
+
+        #Offer the expanded states to the fringe
+        queuebegintime = time.time()
+        statecount = offers = 0
+        for j, (s, sscore) in enumerate(scored):
+            statecount += 1
+            if self.debug >= 2:
+                print("\t[pynlpl debug] (Round #" + str(i) +" Beam #" + str(b) + ") Expanded state #" + str(j+1) + ", offering to successor pool: " + str(s) + " " + str(sscore),end="",file=stderr)
+            if not self.maxdepth or s.depth() <= self.maxdepth:
+                if not self.eager or sscore >= score:
+                    #use all successors (even worse ones than the current state), or only equal or better successors in eager mode
+                    offers += 1
+                    scores[id(s)] = sscore
+                    accepted = successors.append(s)
+                    if accepted:
+                        roundstats.accepted += 1
+                    else:
+                        del scores[id(s)]
                 else:
-                    if self.debug:
-                        print("\t[pynlpl debug] State already visited before, not expanding again... (hash=" + str(hash(state))  +")",file=stderr)
-            #AFTER EXPANDING ALL NODES IN THE FRINGE/BEAM:
-            
-            #set fringe for next round
-            self.fringe = successors
-
-            #Pruning is implicit, successors was a fixed-size priority queue
-            if self.debug: 
-                print("\t[pynlpl debug] (Round #" + str(i) + ") Implicitly pruned with beamsize " + str(self.beamsize) + "...",file=stderr)
-            #self.fringe.prune(self.beamsize)
-            if self.debug: print(" (" + str(offers) + " to " + str(len(self.fringe)) + " items)",file=stderr)
-        
+                    accepted = False
+                if self.debug >= 2:
+                    if accepted:
+                        print(" ACCEPTED",file=stderr)
+                    else:
+                        print(" REJECTED",file=stderr)
+            else:
+                if self.debug >= 2:
+                    print(" REJECTED, MAXDEPTH EXCEEDED.",file=stderr)
+                elif self.debug:
+                    print("\t[pynlpl debug] Not offered to successor pool, maxdepth exceeded",file=stderr)
+        roundstats.offered += offers
+        roundstats.queuetime += time.time() - queuebegintime
         if self.debug:
-            print("\t[pynlpl debug] Search complete: " + str(self.solutions) + " solution(s), " + str(self.traversed) + " states traversed in " + str(i) + " rounds with " + str(b) + "  beams",file=stderr)            
-        
-        
-        
+            print("\t[pynlpl debug] Expanded " + str(statecount) + " states, " + str(offers) + " offered to successor pool",file=stderr)
+        if self.keeptraversal: self._traversal.append(state)
+        if self.usememory: self.markvisited(state)
+        self.prune(state) #calls prune method (does nothing by default in this search!!!)
+
+
+
 
 class EarlyEagerBeamSearch(AbstractSearch):
     """A beam search that prunes early (after each state expansion) and eagerly (weeding out worse successors)"""
@@ -466,11 +672,12 @@ class EarlyEagerBeamSearch(AbstractSearch):
     
     
     def prune(self, state):
+        l = len(self.fringe)
         if self.debug: 
-            l = len(self.fringe)
             print("\t[pynlpl debug] pruning with beamsize " + str(self.beamsize) + "...",end="",file=stderr)
         self.fringe.prunebyscore(state.score(), retainequalscore=True)
         self.fringe.prune(self.beamsize)
+        self.stats.rounds[-1].fringepruned += l - len(self.fringe)
         if self.debug: print(" (" + str(l) + " to " + str(len(self.fringe)) + " items)",file=stderr)
 
 
@@ -478,21 +685,23 @@ class BeamedBestFirstSearch(BeamSearch):
     """Best first search with a beamsize (non-optimal!)"""
     
     def prune(self, state):
+        l = len(self.fringe)
         if self.debug: 
-            l = len(self.fringe)
             print("\t[pynlpl debug] pruning with beamsize " + str(self.beamsize) + "...",end="",file=stderr)
         self.fringe.prune(self.beamsize)
+        self.stats.rounds[-1].fringepruned += l - len(self.fringe)
         if self.debug: print(" (" + str(l) + " to " + str(len(self.fringe)) + " items)",file=stderr)
 
 class StochasticBeamSearch(BeamSearch):
     
     def prune(self, state):
+        l = len(self.fringe)
         if self.debug: 
-            l = len(self.fringe)
             print("\t[pynlpl debug] pruning with beamsize " + str(self.beamsize) + "...",end="",file=stderr)
         if not self.exhaustive:
             self.fringe.prunebyscore(state.score(), retainequalscore=True)
         self.fringe.stochasticprune(self.beamsize)
+        self.stats.rounds[-1].fringepruned += l - len(self.fringe)
         if self.debug: print(" (" + str(l) + " to " + str(len(self.fringe)) + " items)",file=stderr)
             
 
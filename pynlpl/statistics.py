@@ -31,11 +31,18 @@ else:
     stderr = sys.stderr
     stdout = sys.stdout
 import io
-
+import os
 import math
 import random
 import operator
+import heapq
+import tempfile
+import multiprocessing
 from collections import Counter
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 
@@ -51,13 +58,18 @@ class FrequencyList(object):
         if tokens: self.append(tokens)
 
 
-    def load(self, filename):
-        """Load a frequency list from file (in the format produced by the save method)"""
+    def load(self, filename, mincount=0, ngrams=False):
+        """Load a frequency list from file (in the format produced by the save method, or by ExternalFrequencyCounter).
+        Types occurring less than mincount times are skipped. If ngrams is True, types are split on spaces and loaded as tuples."""
         f = io.open(filename,'r',encoding='utf-8')
         for line in f:
             data = line.strip().split("\t")
             type, count = data[:2]
-            self.count(type,count)
+            count = int(count)
+            if count >= mincount:
+                if ngrams:
+                    type = tuple(type.split(" "))
+                self.count(type,count)
         f.close()
 
 
@@ -162,7 +174,7 @@ class FrequencyList(object):
 
 
     def __eq__(self, otherfreqlist):
-        return (self.total == otherfreqlist.total and self._count == otherfreqlist._count)
+        return (self.total == otherfreqlist.total and self._count == otherfreqlist.dict())
 
     def __contains__(self, type):
         """Checks if the specified type is in the frequency list"""
@@ -214,6 +226,583 @@ class FrequencyList(object):
         return self._count
 
 
+class Vocabulary(object):
+    """A vocabulary maps types (tokens, or n-grams as tuples of tokens) to integer classes, and back. A vocabulary can be shared between multiple EncodedFrequencyList instances.
+    N-grams are stored as a single integer packing the classes of their tokens, so tokens are stored only once."""
+
+    def __init__(self):
+        self.index = {} #token or packed n-gram => class
+        self.keys = [] #class => token or packed n-gram
+
+    def encode(self, type, add=True):
+        """Returns the class of the given type, adding it to the vocabulary if add is True (otherwise KeyError is raised for unknown types)"""
+        if isinstance(type, (tuple, list)):
+            key = 1 #leading sentinel bit, encodes the length of the n-gram
+            for token in type:
+                key = (key << 32) | self.encode(token, add)
+        else:
+            key = type
+        try:
+            return self.index[key]
+        except KeyError:
+            if not add:
+                raise
+            cls = self.index[key] = len(self.keys)
+            self.keys.append(key)
+            return cls
+
+    def decode(self, cls):
+        """Returns the type for the given class"""
+        key = self.keys[cls]
+        if isstring(key) or not isinstance(key, (int, type(1 << 32))) or key >> 32 == 0: #packed n-grams always exceed 32 bits
+            return key
+        tokens = []
+        while key > 1:
+            tokens.append(self.keys[key & 0xFFFFFFFF])
+            key >>= 32
+        return tuple(reversed(tokens))
+
+    def __contains__(self, type):
+        try:
+            self.encode(type, False)
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class EncodedFrequencyList(FrequencyList):
+    """A frequency list in which types are encoded as integer classes by a (possibly shared) Vocabulary, and counts are stored in a NumPy array.
+    It offers the same interface as FrequencyList, but uses far less memory for large lists, especially when several lists share a vocabulary. Requires NumPy."""
+
+    def __init__(self, tokens = None, casesensitive = True, dovalidation = True, vocabulary = None):
+        if np is None:
+            raise ImportError("No numpy installed")
+        self.vocabulary = Vocabulary() if vocabulary is None else vocabulary
+        self._counts = np.zeros(max(16, len(self.vocabulary)), dtype=np.int64)
+        self._ranked = None
+        self.total = 0 #number of tokens
+        self.casesensitive = casesensitive
+        self.dovalidation = dovalidation
+        if tokens: self.append(tokens)
+
+    def _grow(self, size):
+        if size > len(self._counts):
+            counts = np.zeros(max(size, 2 * len(self._counts)), dtype=np.int64)
+            counts[:len(self._counts)] = self._counts
+            self._counts = counts
+
+    def _encode(self, type, add=True):
+        if self.dovalidation: type = self._validate(type)
+        return self.vocabulary.encode(type, add)
+
+    def counts(self):
+        """Returns the NumPy array of counts, indexed by class"""
+        return self._counts[:len(self.vocabulary)]
+
+    def append(self,tokens):
+        """Add a list of tokens to the frequencylist. This method will count them for you."""
+        classes = np.fromiter(( self._encode(token) for token in tokens ), dtype=np.int64)
+        if len(classes):
+            self._grow(len(self.vocabulary))
+            counts = np.bincount(classes)
+            self._counts[:len(counts)] += counts
+            self.total += len(classes)
+            self._ranked = None
+
+    def count(self, type, amount = 1):
+        """Count a certain type. The counter will increase by the amount specified (defaults to one)"""
+        cls = self._encode(type)
+        self._grow(cls + 1)
+        self._counts[cls] += amount
+        self.total += amount
+        self._ranked = None
+
+    def _rank(self):
+        if self._ranked is None:
+            counts = self.counts()
+            classes = np.nonzero(counts)[0]
+            self._ranked = classes[np.argsort(-counts[classes], kind='mergesort')]
+
+    def __iter__(self):
+        """Iterate over the frequency lists, in order (frequent to rare). This is a generator that yields (type, count) pairs."""
+        self._rank()
+        for cls in self._ranked:
+            yield self.vocabulary.decode(cls), int(self._counts[cls])
+
+    def items(self):
+        """Returns an *unranked* list of (type, count) pairs. Use this only if you are not interested in the order."""
+        counts = self.counts()
+        for cls in np.nonzero(counts)[0]:
+            yield self.vocabulary.decode(cls), int(counts[cls])
+
+    def __getitem__(self, type):
+        try:
+            cls = self._encode(type, False)
+        except KeyError:
+            return 0
+        if cls < len(self._counts):
+            return int(self._counts[cls])
+        return 0
+
+    def __setitem__(self, type, value):
+        """alias for count, but can only be called once"""
+        if type in self:
+            raise ValueError("This type is already set!")
+        self.count(type, value)
+
+    def __delitem__(self, type):
+        cls = self._encode(type, False)
+        if cls >= len(self._counts) or not self._counts[cls]:
+            raise KeyError(type)
+        self.total -= int(self._counts[cls])
+        self._counts[cls] = 0
+        self._ranked = None
+
+    def __contains__(self, type):
+        """Checks if the specified type is in the frequency list"""
+        return self[type] > 0
+
+    def __len__(self):
+        """Returns the total amount of types"""
+        return int(np.count_nonzero(self.counts()))
+
+    def typetokenratio(self):
+        """Computes the type/token ratio"""
+        return len(self) / float(self.total)
+
+    def mode(self):
+        """Returns the type that occurs the most frequently in the frequency list"""
+        return self.vocabulary.decode(int(np.argmax(self.counts())))
+
+    def p(self, type):
+        """Returns the probability (relative frequency) of the token"""
+        return self[type] / float(self.total)
+
+    def __eq__(self, otherfreqlist):
+        if isinstance(otherfreqlist, EncodedFrequencyList) and otherfreqlist.vocabulary is self.vocabulary:
+            size = max(len(self._counts), len(otherfreqlist._counts))
+            self._grow(size)
+            otherfreqlist._grow(size)
+            return self.total == otherfreqlist.total and np.array_equal(self._counts, otherfreqlist._counts)
+        return self.total == otherfreqlist.total and self.dict() == otherfreqlist.dict()
+
+    def __add__(self, otherfreqlist):
+        """Multiple frequency lists can be added together. Lists sharing a vocabulary are merged as arrays"""
+        assert isinstance(otherfreqlist,FrequencyList)
+        product = EncodedFrequencyList(None, self.casesensitive, self.dovalidation, self.vocabulary)
+        product._grow(len(self._counts))
+        product._counts[:len(self._counts)] += self._counts
+        product.total = self.total
+        if isinstance(otherfreqlist, EncodedFrequencyList) and otherfreqlist.vocabulary is self.vocabulary:
+            product._grow(len(otherfreqlist._counts))
+            product._counts[:len(otherfreqlist._counts)] += otherfreqlist._counts
+            product.total += otherfreqlist.total
+        else:
+            for type, count in otherfreqlist.items():
+                product.count(type,count)
+        return product
+
+    def __repr__(self):
+        return repr(self.dict())
+
+    def values(self):
+        counts = self.counts()
+        return counts[counts > 0]
+
+    def dict(self):
+        """Returns the frequency list as a Counter"""
+        return Counter(dict(self.items()))
+
+
+def shardfiles(filenames, shardsize):
+    """Splits the files into (filename, begin, end) shards of at most shardsize bytes"""
+    for filename in filenames:
+        size = os.path.getsize(filename)
+        begin = 0
+        while True:
+            end = min(size, begin + shardsize)
+            yield filename, begin, end
+            if end >= size:
+                break
+            begin = end
+
+
+def readshard(filename, begin, end, encoding='utf-8'):
+    """Yields the lines (decoded and without newline) starting between the begin and end byte offsets of a file. Every line of a file belongs to exactly one of the shards produced by shardfiles()"""
+    with io.open(filename,'rb') as f:
+        if begin > 0:
+            f.seek(begin - 1)
+            f.readline() #skip to the first line starting in this shard
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line.decode(encoding).rstrip("\r\n")
+
+
+def countshard(task):
+    """Counts the n-grams in a shard of a file (lines starting between the begin and end offsets), spilling sorted partial counts to temporary files whenever maxtypes distinct types are held in memory. Returns a (runfiles, tokens) tuple. Used by ExternalFrequencyCounter."""
+    filename, begin, end, counter = task
+    count = Counter()
+    runs = []
+    tokens = 0
+    n = counter.n
+    for line in readshard(filename, begin, end, counter.encoding):
+        if not counter.casesensitive:
+            line = line.lower()
+        words = counter.tokenizer(line) if counter.tokenizer else line.split()
+        if n > 1:
+            if counter.beginmarker:
+                words = [counter.beginmarker] * (n - 1) + words
+            if counter.endmarker:
+                words = words + [counter.endmarker] * (n - 1)
+            for i in range(0, len(words) - n + 1):
+                count[" ".join(words[i:i+n])] += 1
+                tokens += 1
+        else:
+            for word in words:
+                count[word] += 1
+            tokens += len(words)
+        if len(count) >= counter.maxtypes:
+            runs.append(counter.spill(count))
+            count = Counter()
+    if count:
+        runs.append(counter.spill(count))
+    return runs, tokens
+
+
+class ExternalFrequencyCounter(object):
+    """Counts n-grams in (large) text files in external memory, for when a FrequencyList does not fit in memory.
+
+    The files are split into shards that are counted by worker processes. Whenever a worker holds maxtypes distinct
+    types in memory, it spills them, sorted, to a temporary file. All these partial counts are then merged (k-way)
+    into a single output file with one type and its count per line, tab-separated and sorted by type. N-grams are
+    written space-separated. This file can be loaded with FrequencyList.load(), optionally with a minimum count.
+
+    Example::
+
+        counter = ExternalFrequencyCounter(n=3, workers=8, maxtypes=5000000)
+        counter.count(['corpus1.txt','corpus2.txt'], 'trigrams.freqlist')
+        freqlist = FrequencyList()
+        freqlist.load('trigrams.freqlist', mincount=2, ngrams=True)
+
+    Lines are tokenised on whitespace unless a tokenizer function is passed (it must be picklable for workers > 1).
+    As with Windower, n-grams are padded with begin and end markers (set these to None to disable).
+    """
+
+    def __init__(self, n=1, casesensitive=True, maxtypes=1000000, workers=1, shardsize=64*1024*1024, tmpdir=None, encoding='utf-8', tokenizer=None, beginmarker="<begin>", endmarker="<end>", fanin=64):
+        self.n = n
+        self.casesensitive = casesensitive
+        self.maxtypes = maxtypes
+        self.workers = workers
+        self.shardsize = shardsize
+        self.tmpdir = tmpdir
+        self.encoding = encoding
+        self.tokenizer = tokenizer
+        self.beginmarker = beginmarker
+        self.endmarker = endmarker
+        self.fanin = fanin #maximum number of files merged at once
+        self.tokens = 0 #number of tokens counted
+        self.types = 0 #number of types written
+
+    def shards(self, filenames):
+        """Splits the files into (filename, begin, end) shards of at most shardsize bytes"""
+        return shardfiles(filenames, self.shardsize)
+
+    def spill(self, count):
+        """Writes partial counts to a temporary file, sorted by type, returns the filename"""
+        fd, filename = tempfile.mkstemp(prefix='freqlist', suffix='.run', dir=self.tmpdir)
+        with io.open(fd,'w',encoding='utf-8') as f:
+            for type in sorted(count):
+                f.write(type + "\t" + str(count[type]) + "\n")
+        return filename
+
+    def readrun(self, filename):
+        with io.open(filename,'r',encoding='utf-8') as f:
+            for line in f:
+                type, count = line.rstrip("\n").split("\t")
+                yield type, int(count)
+
+    def merge(self, runs, outputfile, mincount=1):
+        """K-way merge of sorted run files into the output file, summing the counts of identical types. Returns the number of types written"""
+        runs = list(runs)
+        while len(runs) > self.fanin:
+            #too many files to merge at once, merge in multiple passes
+            merged = []
+            for i in range(0, len(runs), self.fanin):
+                fd, filename = tempfile.mkstemp(prefix='freqlist', suffix='.run', dir=self.tmpdir)
+                os.close(fd)
+                self.merge(runs[i:i+self.fanin], filename)
+                merged.append(filename)
+            runs = merged
+        types = 0
+        with io.open(outputfile,'w',encoding='utf-8') as f:
+            previoustype = None
+            total = 0
+            for type, count in heapq.merge(*[ self.readrun(filename) for filename in runs ]):
+                if type != previoustype:
+                    if previoustype is not None and total >= mincount:
+                        f.write(previoustype + "\t" + str(total) + "\n")
+                        types += 1
+                    previoustype = type
+                    total = 0
+                total += count
+            if previoustype is not None and total >= mincount:
+                f.write(previoustype + "\t" + str(total) + "\n")
+                types += 1
+        for filename in runs:
+            os.unlink(filename)
+        return types
+
+    def count(self, filenames, outputfile, mincount=1):
+        """Counts all n-grams in the given files and writes the merged counts to the output file. Types occurring less than mincount times are omitted. Returns the number of types written"""
+        if isstring(filenames):
+            filenames = [filenames]
+        tasks = [ (filename, begin, end, self) for filename, begin, end in self.shards(filenames) ]
+        runs = []
+        self.tokens = 0
+        if self.workers > 1:
+            pool = multiprocessing.Pool(self.workers)
+            try:
+                for shardruns, tokens in pool.imap_unordered(countshard, tasks):
+                    runs += shardruns
+                    self.tokens += tokens
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for task in tasks:
+                shardruns, tokens = countshard(task)
+                runs += shardruns
+                self.tokens += tokens
+        self.types = self.merge(runs, outputfile, mincount)
+        return self.types
+
+
+def mergesparse(keys, counts, newkeys, newcounts):
+    """Merges sparse count vectors given as arrays of integer keys and counts, summing the counts of identical keys. Returns sorted unique keys and their counts"""
+    keys = np.concatenate((keys, newkeys))
+    counts = np.concatenate((counts, newcounts))
+    if len(keys) == 0:
+        return keys, counts
+    order = np.argsort(keys, kind='mergesort')
+    keys = keys[order]
+    counts = counts[order]
+    starts = np.concatenate(([0], np.nonzero(keys[1:] != keys[:-1])[0] + 1))
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+def association(measure, joint, count1, count2, total):
+    """Computes an association measure (pmi, npmi, jaccard or dice) over arrays of joint counts and the counts of both words"""
+    joint = np.asarray(joint, dtype=np.float64)
+    count1 = np.asarray(count1, dtype=np.float64)
+    count2 = np.asarray(count2, dtype=np.float64)
+    if measure == 'pmi':
+        return np.log((joint / total) / ((count1 / total) * (count2 / total)))
+    elif measure == 'npmi':
+        return np.log((joint / total) / ((count1 / total) * (count2 / total))) / -np.log(joint / total)
+    elif measure == 'jaccard':
+        return joint / (count1 + count2 - joint)
+    elif measure == 'dice':
+        return 2 * joint / (count1 + count2)
+    else:
+        raise ValueError("Unknown association measure: " + str(measure))
+
+
+def countcooccurrenceshard(task):
+    """Counts the co-occurrences in a shard of a file, with a vocabulary local to the shard. Returns a tuple (tokens, counts, pairkeys, paircounts, adjacentkeys, adjacentcounts, total) to be merged with CooccurrenceCounter.merge(). Used by CooccurrenceCounter."""
+    filename, begin, end, counter = task
+    shardcounter = CooccurrenceCounter(counter.window, counter.casesensitive, buffersize=counter.buffersize, encoding=counter.encoding, tokenizer=counter.tokenizer)
+    for line in readshard(filename, begin, end, counter.encoding):
+        shardcounter.countline(line)
+    return shardcounter.partial()
+
+
+class CooccurrenceCounter(object):
+    """Counts co-occurrences of words and computes association measures (pmi, npmi, jaccard, dice) between them. Requires NumPy.
+
+    Two words co-occur if they appear in the same sentence (one sentence per line), or, if a window is set, when
+    they are at most window tokens apart. Pairs are ordered: (word, word2) counts occurrences of word2 *after* word.
+    Words are encoded as integer classes by a Vocabulary, pairs are accumulated as a sparse vector of packed class
+    pairs, and all measures are computed vectorised. Files can be counted in shards by multiple worker processes.
+
+    Example::
+
+        counter = CooccurrenceCounter(window=5)
+        counter.count('corpus.txt', workers=4)
+        for word, word2, score, jointcount, adjacentcount in counter.associations('npmi', mincount=2, topk=10):
+            print(word, word2, score)
+
+    Adjacent co-occurrences (immediate bigrams) are counted separately, so they can be reported or discounted.
+    """
+
+    def __init__(self, window=None, casesensitive=True, buffersize=1000000, shardsize=64*1024*1024, encoding='utf-8', tokenizer=None):
+        if np is None:
+            raise ImportError("No numpy installed")
+        self.window = window #None for sentence-level co-occurrence
+        self.casesensitive = casesensitive
+        self.buffersize = buffersize #number of pairs buffered before they are merged into the counts
+        self.shardsize = shardsize
+        self.encoding = encoding
+        self.tokenizer = tokenizer
+        self.vocabulary = Vocabulary()
+        self.counts = np.zeros(0, dtype=np.int64) #word counts, indexed by class
+        self.total = 0 #number of tokens
+        self.pairkeys = np.zeros(0, dtype=np.int64) #sorted packed (class, class2) pairs
+        self.paircounts = np.zeros(0, dtype=np.int64)
+        self.adjacentkeys = np.zeros(0, dtype=np.int64)
+        self.adjacentcounts = np.zeros(0, dtype=np.int64)
+        self._buffer = []
+        self._adjacentbuffer = []
+        self._tokenbuffer = []
+        self._buffered = 0
+        self._triu = {}
+
+    def addsentence(self, words):
+        """Counts the co-occurrences in a sentence (a list of words)"""
+        if not self.casesensitive:
+            words = [ word.lower() for word in words ]
+        classes = np.fromiter(( self.vocabulary.encode(word) for word in words ), dtype=np.int64, count=len(words))
+        n = len(classes)
+        self.total += n
+        self._tokenbuffer.append(classes)
+        if n > 1:
+            if self.window and self.window < n - 1:
+                left = np.concatenate([ classes[:-d] for d in range(1, self.window + 1) ])
+                right = np.concatenate([ classes[d:] for d in range(1, self.window + 1) ])
+            else:
+                try:
+                    rows, columns = self._triu[n]
+                except KeyError:
+                    rows, columns = self._triu[n] = np.triu_indices(n, 1)
+                left = classes[rows]
+                right = classes[columns]
+            self._buffer.append((left << 32) | right)
+            self._adjacentbuffer.append((classes[:-1] << 32) | classes[1:])
+            self._buffered += len(left)
+        if self._buffered >= self.buffersize:
+            self.flush()
+
+    def countline(self, line):
+        """Counts the co-occurrences in a line of text, tokenised on whitespace unless a tokenizer was specified"""
+        self.addsentence(self.tokenizer(line) if self.tokenizer else line.split())
+
+    def addcounts(self, classes, counts):
+        if len(self.counts) < len(self.vocabulary):
+            self.counts = np.concatenate((self.counts, np.zeros(len(self.vocabulary) - len(self.counts), dtype=np.int64)))
+        self.counts[classes] += counts
+
+    def flush(self):
+        """Merges all buffered pairs into the counts"""
+        if self._tokenbuffer:
+            counts = np.bincount(np.concatenate(self._tokenbuffer), minlength=len(self.vocabulary))
+            self.addcounts(np.arange(len(counts)), counts)
+            self._tokenbuffer = []
+        if self._buffer:
+            keys = np.concatenate(self._buffer)
+            self.pairkeys, self.paircounts = mergesparse(self.pairkeys, self.paircounts, keys, np.ones(len(keys), dtype=np.int64))
+            keys = np.concatenate(self._adjacentbuffer)
+            self.adjacentkeys, self.adjacentcounts = mergesparse(self.adjacentkeys, self.adjacentcounts, keys, np.ones(len(keys), dtype=np.int64))
+            self._buffer = []
+            self._adjacentbuffer = []
+            self._buffered = 0
+
+    def partial(self):
+        """Returns the counts as a tuple with the vocabulary in plain form, see merge()"""
+        self.flush()
+        return (self.vocabulary.keys, self.counts, self.pairkeys, self.paircounts, self.adjacentkeys, self.adjacentcounts, self.total)
+
+    def merge(self, partial):
+        """Merges the counts from another counter (as returned by partial()), which may have a different vocabulary"""
+        self.flush()
+        tokens, counts, pairkeys, paircounts, adjacentkeys, adjacentcounts, total = partial
+        mapping = np.fromiter(( self.vocabulary.encode(token) for token in tokens ), dtype=np.int64, count=len(tokens))
+        self.addcounts(mapping[:len(counts)], counts)
+        self.total += total
+        remap = lambda keys: (mapping[keys >> 32] << 32) | mapping[keys & 0xFFFFFFFF]
+        self.pairkeys, self.paircounts = mergesparse(self.pairkeys, self.paircounts, remap(pairkeys), paircounts)
+        self.adjacentkeys, self.adjacentcounts = mergesparse(self.adjacentkeys, self.adjacentcounts, remap(adjacentkeys), adjacentcounts)
+
+    def count(self, filenames, workers=1):
+        """Counts the co-occurrences in the given files (plain text, one tokenised sentence per line), in shards processed by the specified number of worker processes"""
+        if isstring(filenames):
+            filenames = [filenames]
+        tasks = [ (filename, begin, end, self) for filename, begin, end in shardfiles(filenames, self.shardsize) ]
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+            try:
+                for partial in pool.imap_unordered(countcooccurrenceshard, tasks):
+                    self.merge(partial)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for filename, begin, end, _ in tasks:
+                for line in readshard(filename, begin, end, self.encoding):
+                    self.countline(line)
+        self.flush()
+
+    def __getstate__(self):
+        #only the settings are needed by worker processes
+        return { 'window': self.window, 'casesensitive': self.casesensitive, 'buffersize': self.buffersize, 'encoding': self.encoding, 'tokenizer': self.tokenizer }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def jointcount(self, word, word2):
+        """Returns how often word2 co-occurs after word"""
+        self.flush()
+        try:
+            key = (self.vocabulary.encode(word, False) << 32) | self.vocabulary.encode(word2, False)
+        except KeyError:
+            return 0
+        index = np.searchsorted(self.pairkeys, key)
+        if index < len(self.pairkeys) and self.pairkeys[index] == key:
+            return int(self.paircounts[index])
+        return 0
+
+    def pairs(self, mincount=1):
+        """Returns arrays (classes, classes2, jointcounts, adjacentcounts) for all pairs co-occurring at least mincount times"""
+        self.flush()
+        adjacent = np.zeros(len(self.pairkeys), dtype=np.int64)
+        adjacent[np.searchsorted(self.pairkeys, self.adjacentkeys)] = self.adjacentcounts #adjacent pairs are always co-occurring pairs
+        mask = self.paircounts >= mincount
+        keys = self.pairkeys[mask]
+        return keys >> 32, keys & 0xFFFFFFFF, self.paircounts[mask], adjacent[mask]
+
+    def scores(self, measure='pmi', mincount=1, discountadjacency=False):
+        """Returns arrays (classes, classes2, scores, jointcounts, adjacentcounts) for all pairs co-occurring at least mincount times. If discountadjacency is set, adjacent co-occurrences are not taken into account when computing the measure (pairs that only co-occur adjacently are dropped)"""
+        classes, classes2, joint, adjacent = self.pairs(mincount)
+        effective = joint - adjacent if discountadjacency else joint
+        mask = effective > 0
+        classes, classes2, joint, adjacent, effective = classes[mask], classes2[mask], joint[mask], adjacent[mask], effective[mask]
+        return classes, classes2, association(measure, effective, self.counts[classes], self.counts[classes2], self.total), joint, adjacent
+
+    def associations(self, measure='pmi', mincount=1, minscore=None, topk=None, discountadjacency=False, sort=True):
+        """Generator yielding (word, word2, score, jointcount, adjacentcount) tuples for all pairs co-occurring at least mincount times with a score of at least minscore.
+        If topk is set, only the topk highest scoring pairs are returned for each word. Results are sorted by descending score if sort is set"""
+        classes, classes2, scores, joint, adjacent = self.scores(measure, mincount, discountadjacency)
+        if minscore is not None:
+            mask = scores >= minscore
+            classes, classes2, scores, joint, adjacent = classes[mask], classes2[mask], scores[mask], joint[mask], adjacent[mask]
+        if topk is not None:
+            order = np.lexsort((-scores, classes))
+            groups = classes[order]
+            rank = np.arange(len(order)) - np.searchsorted(groups, groups)
+            selection = order[rank < topk]
+            classes, classes2, scores, joint, adjacent = classes[selection], classes2[selection], scores[selection], joint[selection], adjacent[selection]
+        if sort:
+            order = np.argsort(-scores, kind='mergesort')
+        else:
+            order = np.arange(len(scores))
+        decode = self.vocabulary.decode
+        for i in order:
+            yield decode(classes[i]), decode(classes2[i]), float(scores[i]), int(joint[i]), int(adjacent[i])
+
+
 #class FrequencyTrie:
 #    def __init__(self):
 #        self.data = Tree()
@@ -227,7 +816,12 @@ class FrequencyList(object):
 
 
 class Distribution(object):
-    """A distribution can be created over a FrequencyList or a plain dictionary with numeric values. It will be normalized automatically. This implemtation uses dictionaries/hashing"""
+    """A distribution can be created over a FrequencyList or a plain dictionary with numeric values. It will be normalized automatically. This implemtation uses dictionaries/hashing (an EncodedDistribution is returned for an EncodedFrequencyList)"""
+
+    def __new__(cls, data=None, base = 2):
+        if cls is Distribution and isinstance(data, EncodedFrequencyList):
+            cls = EncodedDistribution
+        return object.__new__(cls)
 
     def __init__(self, data, base = 2):
         self.base = base #logarithmic base: can be set to 2, 10 or math.e (or anything else). when set to None, it's set to e automatically
@@ -344,6 +938,89 @@ class Distribution(object):
         return self._dist.values()
 
 
+class EncodedDistribution(Distribution):
+    """A distribution over an EncodedFrequencyList, with the probabilities stored in a NumPy array indexed by class (created automatically when a Distribution is created over an EncodedFrequencyList)"""
+
+    def __init__(self, data, base = 2):
+        if not isinstance(data, EncodedFrequencyList):
+            raise Exception("Can't create encoded distribution")
+        self.base = base
+        self.vocabulary = data.vocabulary
+        self._probs = data.counts() / float(data.total)
+        self._ranked = None
+
+    def _nonzero(self):
+        return self._probs[self._probs > 0]
+
+    def _rank(self):
+        if self._ranked is None:
+            classes = np.nonzero(self._probs)[0]
+            self._ranked = classes[np.argsort(-self._probs[classes], kind='mergesort')]
+
+    def information(self, type):
+        """Computes the information content of the specified type: -log_e(p(X))"""
+        if not self.base:
+            return -math.log(self[type])
+        else:
+            return -math.log(self[type], self.base)
+
+    def poslog(self, type):
+        """alias for information content"""
+        return self.information(type)
+
+    def entropy(self, base = 2):
+        """Compute the entropy of the distribution"""
+        if not base and self.base: base = self.base
+        p = self._nonzero()
+        entropy = -np.sum(p * np.log(p))
+        if base:
+            entropy /= math.log(base)
+        return float(entropy)
+
+    def maxentropy(self, base = 2):
+        """Compute the maximum entropy of the distribution: log_e(N)"""
+        if not base and self.base: base = self.base
+        if not base:
+            return math.log(len(self))
+        else:
+            return math.log(len(self), base)
+
+    def mode(self):
+        """Returns the type that occurs the most frequently in the probability distribution"""
+        return self.vocabulary.decode(int(np.argmax(self._probs)))
+
+    def __len__(self):
+        """Returns the number of types"""
+        return int(np.count_nonzero(self._probs))
+
+    def __getitem__(self, type):
+        """Return the probability for this type"""
+        cls = self.vocabulary.encode(type, False)
+        if cls >= len(self._probs) or not self._probs[cls]:
+            raise KeyError(type)
+        return float(self._probs[cls])
+
+    def __iter__(self):
+        """Iterate over the *ranked* distribution, returns (type, probability) pairs"""
+        self._rank()
+        for cls in self._ranked:
+            yield self.vocabulary.decode(cls), float(self._probs[cls])
+
+    def items(self):
+        """Returns an *unranked* list of (type, prob) pairs. Use this only if you are not interested in the order."""
+        for cls in np.nonzero(self._probs)[0]:
+            yield self.vocabulary.decode(cls), float(self._probs[cls])
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def keys(self):
+        return [ type for type, _ in self.items() ]
+
+    def values(self):
+        return self._nonzero()
+
+
 class MarkovChain(object):
     def __init__(self, startstate, endstate = None):
         self.nodes = set()
@@ -449,14 +1126,20 @@ class HiddenMarkovModel(MarkovChain):
     def __init__(self, startstate, endstate = None):
         self.observablenodes = set()
         self.edges_toobservables = {}
+        self.compiled = False
         super(HiddenMarkovModel, self).__init__(startstate,endstate)
 
+    def settransitions(self, state, distribution):
+        super(HiddenMarkovModel, self).settransitions(state, distribution)
+        self.compiled = False
+
     def setemission(self, state, distribution):
         self.nodes.add(state)
         if not isinstance(distribution, Distribution):
             distribution = Distribution(distribution)
         self.edges_toobservables[state] = distribution
         self.observablenodes.update(distribution.keys())
+        self.compiled = False
 
     def print_dptable(self, V):
         print("    ",end="",file=stdout)
@@ -471,23 +1154,25 @@ class HiddenMarkovModel(MarkovChain):
 
     #Adapted from: http://en.wikipedia.org/wiki/Viterbi_algorithm
     def viterbi(self,observations, doprint=False):
+        """Returns the probability and the most probable path (a list of states) for the given observations.
+
+        This works on plain probabilities, which underflow on long sequences; see logviterbi() for a log-space variant."""
         #states, start_p, trans_p, emit_p):
 
         V = [{}] #Viterbi matrix
-        path = {}
+        backpointers = [{}] #previous state on the best path, per time step and state
 
         # Initialize base cases (t == 0)
         for node in self.edges_out[self.startstate].keys():
             try:
                 V[0][node] = self.edges_out[self.startstate][node] * self.edges_toobservables[node][observations[0]]
-                path[node] = [node]
             except KeyError:
                 pass #will be 0, don't store
 
         # Run Viterbi for t > 0
         for t in range(1,len(observations)):
             V.append({})
-            newpath = {}
+            backpointers.append({})
 
             for node in self.nodes:
                 column = []
@@ -500,10 +1185,7 @@ class HiddenMarkovModel(MarkovChain):
                 if column:
                     (prob, state) = max(column)
                     V[t][node] = prob
-                    newpath[node] = path[state] + [node]
-
-            # Don't need to remember the old paths
-            path = newpath
+                    backpointers[t][node] = state
 
         if doprint: self.print_dptable(V)
 
@@ -511,12 +1193,157 @@ class HiddenMarkovModel(MarkovChain):
             return (0,[])
         else:
             (prob, state) = max([(V[len(observations) - 1][node], node) for node in V[len(observations) - 1].keys()])
-            return (prob, path[state])
+            path = [state]
+            for t in range(len(observations) - 1, 0, -1):
+                state = backpointers[t][state]
+                path.append(state)
+            path.reverse()
+            return (prob, path)
+
+    def compile(self):
+        """Compiles the transition and emission distributions into NumPy matrices in log space (natural logarithm).
+
+        This is done automatically by the methods that need it. Afterwards, the following attributes are available:
+
+        * ``states`` - list of states (excluding the start state), the order of the rows/columns in the matrices
+        * ``observations`` - list of observations
+        * ``logstart`` - array of shape (states,) with the log probabilities of transitions from the start state
+        * ``logtransitions`` - array of shape (states, states) with the log transition probabilities (from, to)
+        * ``logemissions`` - array of shape (states, observations + 1), the last column is for unknown observations
+        """
+        if np is None:
+            raise ImportError("No numpy installed")
+        self.states = sorted(( node for node in self.nodes if node != self.startstate ), key=lambda node: (str(type(node)), node))
+        self.stateindex = dict( (state, i) for i, state in enumerate(self.states) )
+        self.observations = sorted(self.observablenodes, key=lambda observation: (str(type(observation)), observation))
+        self.observationindex = dict( (observation, i) for i, observation in enumerate(self.observations) )
+        n = len(self.states)
+        with np.errstate(divide='ignore'):
+            self.logstart = np.full(n, -np.inf)
+            if self.startstate in self.edges_out:
+                for state, p in self.edges_out[self.startstate].items():
+                    if state in self.stateindex:
+                        self.logstart[self.stateindex[state]] = np.log(p)
+            self.logtransitions = np.full((n, n), -np.inf)
+            for fromstate, distribution in self.edges_out.items():
+                if fromstate in self.stateindex:
+                    for tostate, p in distribution.items():
+                        if tostate in self.stateindex:
+                            self.logtransitions[self.stateindex[fromstate], self.stateindex[tostate]] = np.log(p)
+            self.logemissions = np.full((n, len(self.observations) + 1), -np.inf)
+            for state, distribution in self.edges_toobservables.items():
+                if state in self.stateindex:
+                    for observation, p in distribution.items():
+                        self.logemissions[self.stateindex[state], self.observationindex[observation]] = np.log(p)
+        self.compiled = True
+
+    def encode(self, observations):
+        """Encodes a sequence of observations as an array of indices into the emission matrix (unknown observations get the last index)"""
+        if not self.compiled: self.compile()
+        unknown = len(self.observations)
+        return np.array([ self.observationindex.get(observation, unknown) for observation in observations ], dtype=np.intp)
+
+    def logviterbi(self, observations):
+        """Returns the log probability (natural logarithm) and the most probable path (a list of states) for the given observations, using the compiled matrices.
+        If no path is possible, (-inf, []) is returned."""
+        if not self.compiled: self.compile()
+        if len(observations) == 0:
+            return (-np.inf, [])
+        observations = self.encode(observations)
+        T = len(observations)
+        backpointers = np.zeros((T, len(self.states)), dtype=np.intp)
+        delta = self.logstart + self.logemissions[:, observations[0]]
+        for t in range(1, T):
+            scores = delta[:, None] + self.logtransitions #(from, to)
+            backpointers[t] = scores.argmax(axis=0)
+            delta = scores.max(axis=0) + self.logemissions[:, observations[t]]
+        return self.backtrack(delta, backpointers)
+
+    def backtrack(self, delta, backpointers):
+        state = int(delta.argmax())
+        logprob = float(delta[state])
+        if logprob == -np.inf:
+            return (logprob, [])
+        path = [state]
+        for t in range(len(backpointers) - 1, 0, -1):
+            state = int(backpointers[t, state])
+            path.append(state)
+        path.reverse()
+        return (logprob, [ self.states[i] for i in path ])
+
+    def batchviterbi(self, sequences):
+        """Decodes multiple observation sequences at once, vectorised over the sequences. Returns a list of (logprob, path) tuples as logviterbi() does"""
+        if not self.compiled: self.compile()
+        sequences = list(sequences)
+        results = [ (-np.inf, []) ] * len(sequences)
+        batch = [ i for i, observations in enumerate(sequences) if len(observations) > 0 ]
+        if not batch:
+            return results
+        lengths = np.array([ len(sequences[i]) for i in batch ])
+        T = lengths.max()
+        N = len(self.states)
+        observations = np.full((len(batch), T), len(self.observations), dtype=np.intp)
+        for row, i in enumerate(batch):
+            observations[row, :lengths[row]] = self.encode(sequences[i])
+        backpointers = np.zeros((len(batch), T, N), dtype=np.intp)
+        delta = self.logstart[None, :] + self.logemissions[:, observations[:, 0]].T #(batch, states)
+        for t in range(1, T):
+            active = lengths > t
+            scores = delta[active][:, :, None] + self.logtransitions[None, :, :] #(batch, from, to)
+            best = scores.argmax(axis=1)
+            backpointers[active, t] = best
+            delta[active] = scores.max(axis=1) + self.logemissions[:, observations[active, t]].T
+        for row, i in enumerate(batch):
+            results[i] = self.backtrack(delta[row], backpointers[row, :lengths[row]])
+        return results
+
+    def forward(self, observations):
+        """Forward algorithm in log space. Returns the log probability of the observations and the forward matrix of shape (len(observations), len(states))"""
+        if not self.compiled: self.compile()
+        observations = self.encode(observations)
+        alpha = np.empty((len(observations), len(self.states)))
+        if len(observations) == 0:
+            return (0.0, alpha)
+        alpha[0] = self.logstart + self.logemissions[:, observations[0]]
+        for t in range(1, len(observations)):
+            alpha[t] = logsumexp(alpha[t-1][:, None] + self.logtransitions, axis=0) + self.logemissions[:, observations[t]]
+        return (float(logsumexp(alpha[-1])), alpha)
+
+    def backward(self, observations):
+        """Backward algorithm in log space. Returns the backward matrix of shape (len(observations), len(states))"""
+        if not self.compiled: self.compile()
+        observations = self.encode(observations)
+        beta = np.zeros((len(observations), len(self.states)))
+        for t in range(len(observations) - 2, -1, -1):
+            beta[t] = logsumexp(self.logtransitions + (self.logemissions[:, observations[t+1]] + beta[t+1])[None, :], axis=1)
+        return beta
+
+    def posteriors(self, observations):
+        """Returns the posterior probabilities P(state at t | observations) as a matrix of shape (len(observations), len(states)), see the states attribute for the column order"""
+        logprob, alpha = self.forward(observations)
+        beta = self.backward(observations)
+        if logprob == -np.inf:
+            return np.zeros(alpha.shape)
+        return np.exp(alpha + beta - logprob)
+
+    def posteriordecode(self, observations):
+        """Posterior decoding: returns the list of individually most probable states for each observation"""
+        return [ self.states[i] for i in self.posteriors(observations).argmax(axis=1) ]
 
 
 
 # ********************* Common Functions ******************************
 
+def logsumexp(a, axis=None):
+    """Computes log(sum(exp(a))) over the given axis of a NumPy array in a numerically stable way (also when all values are -inf)"""
+    m = np.max(a, axis=axis, keepdims=True)
+    m[~np.isfinite(m)] = 0
+    with np.errstate(divide='ignore'):
+        result = np.log(np.sum(np.exp(a - m), axis=axis, keepdims=True)) + m
+    if axis is None:
+        return result.reshape(())[()]
+    return np.squeeze(result, axis=axis)
+
 def product(seq):
     """Return the product of a sequence of numerical values.
     >>> product([1,2,6])
@@ -618,31 +1445,227 @@ def normalize(numbers, total=1.0):  #from AI: A Modern Appproach
 ###########################################################################################
 
 def levenshtein(s1, s2, maxdistance=9999):
-    """Computes the levenshtein distance between two strings. Adapted from:  http://en.wikibooks.org/wiki/Algorithm_Implementation/Strings/Levenshtein_distance#Python"""
+    """Computes the levenshtein distance between two strings (or other sequences). If the distance exceeds maxdistance, maxdistance + 1 is returned.
+    Short sequences use the bit-parallel algorithm (myerslevenshtein), longer ones the banded dynamic programming algorithm (bandedlevenshtein), both of which bound the work by maxdistance."""
+    if min(len(s1), len(s2)) <= 64:
+        return myerslevenshtein(s1, s2, maxdistance)
+    else:
+        return bandedlevenshtein(s1, s2, maxdistance)
+
+
+def bandedlevenshtein(s1, s2, maxdistance=9999):
+    """Computes the levenshtein distance between two sequences, only computing the diagonal band of cells that can lie on a path with a distance of at most maxdistance (Ukkonen), and stopping as soon as no cell in a row is within maxdistance. Returns maxdistance + 1 if the distance exceeds maxdistance. Adapted from:  http://en.wikibooks.org/wiki/Algorithm_Implementation/Strings/Levenshtein_distance#Python"""
     l1 = len(s1)
     l2 = len(s2)
     if l1 < l2:
-        return levenshtein(s2, s1)
-    if not s1:
-        return len(s2)
+        return bandedlevenshtein(s2, s1, maxdistance)
 
     #If the words differ too much in length,  (if  we have a low maxdistance) , we needn't bother compute distance:
     if l1 > l2 + maxdistance:
         return maxdistance+1
+    if not s2:
+        return l1
+
+    k = min(maxdistance, l1)
+    outside = k + 1 #value of cells outside the band
+    previous_row = [ j if j <= k else outside for j in range(l2 + 1) ]
+    current_row = [outside] * (l2 + 1)
+    for i in range(1, l1 + 1):
+        c1 = s1[i-1]
+        low = max(1, i - k)
+        high = min(l2, i + k)
+        current_row[low - 1] = i if low == 1 else outside
+        best = outside
+        for j in range(low, high + 1):
+            insertions = previous_row[j] + 1
+            deletions = current_row[j - 1] + 1
+            substitutions = previous_row[j - 1] + (c1 != s2[j-1])
+            value = min(insertions, deletions, substitutions)
+            current_row[j] = value
+            if value < best:
+                best = value
+        if best > k:
+            return maxdistance+1
+        previous_row, current_row = current_row, previous_row
+
+    if previous_row[l2] > maxdistance:
+        return maxdistance+1
+    return previous_row[l2]
 
-    previous_row = list(range(l2 + 1))
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1 # j+1 instead of j since previous_row and current_row are one character longer
-            deletions = current_row[j] + 1       # than s2
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        if current_row[-1] > maxdistance:
-            return current_row[-1]
-        previous_row = current_row
-
-    return previous_row[-1]
+
+def myerslevenshtein(s1, s2, maxdistance=9999):
+    """Computes the levenshtein distance between two sequences with the bit-parallel algorithm of Myers (1999), in the formulation of Hyyrö (2001): a column of the dynamic programming matrix is processed at once, encoded as bit vectors of vertical deltas, taking O(len(s2)) operations for s1 up to the machine word size. Returns maxdistance + 1 if the distance exceeds maxdistance."""
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    m = len(s1)
+    n = len(s2)
+    if n - m > maxdistance:
+        return maxdistance+1
+    if not m:
+        return n
+
+    peq = {} #character => bit vector of its positions in s1
+    for i, c in enumerate(s1):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv = full #positive vertical deltas
+    mv = 0 #negative vertical deltas
+    score = m
+    for j, c in enumerate(s2):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        if score - (n - j - 1) > maxdistance:
+            #the score can not drop below maxdistance anymore
+            return maxdistance+1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
+    if score > maxdistance:
+        return maxdistance+1
+    return score
+
+
+class BKTree(object):
+    """A Burkhard-Keller tree over a lexicon, for retrieving all entries within a certain distance of a query, without computing the distance to every entry. Each node holds an entry and children keyed by their distance to it; by the triangle inequality only children with keys within maxdistance of the query's distance to the node need to be visited.
+
+    Example::
+
+        tree = BKTree(lexicon)
+        tree.search('exampel', 2) #=> [('example', 2), ...]
+    """
+
+    def __init__(self, lexicon=None, distance=levenshtein):
+        self.distance = distance
+        self.root = None #[entry, {distance: child node}]
+        self.size = 0
+        if lexicon:
+            for entry in lexicon:
+                self.add(entry)
+
+    def add(self, entry):
+        """Add an entry to the tree, returns False if it was already present"""
+        if self.root is None:
+            self.root = [entry, {}]
+            self.size += 1
+            return True
+        node = self.root
+        while True:
+            d = self.distance(entry, node[0])
+            if d == 0:
+                return False
+            try:
+                node = node[1][d]
+            except KeyError:
+                node[1][d] = [entry, {}]
+                self.size += 1
+                return True
+
+    def search(self, query, maxdistance):
+        """Returns all (entry, distance) pairs within maxdistance of the query, sorted by distance"""
+        results = []
+        if self.root is None:
+            return results
+        stack = [self.root]
+        while stack:
+            entry, children = stack.pop()
+            #the distance only needs to be known exactly up to the farthest child that may still be relevant:
+            bound = maxdistance + (max(children) if children else 0)
+            d = self.distance(query, entry, bound)
+            if d <= maxdistance:
+                results.append((entry, d))
+            if d <= bound:
+                for childdistance, child in children.items():
+                    if d - maxdistance <= childdistance <= d + maxdistance:
+                        stack.append(child)
+        results.sort(key=lambda x: (x[1], x[0]))
+        return results
+
+    def batchsearch(self, queries, maxdistance):
+        """Searches multiple queries, returns a list with the results of search() for each"""
+        return [ self.search(query, maxdistance) for query in queries ]
+
+    def __contains__(self, entry):
+        return bool(self.search(entry, 0))
+
+    def __len__(self):
+        return self.size
+
+
+class DeletionIndex(object):
+    """A deletion-neighbourhood index over a lexicon, for retrieving all entries within a certain (levenshtein) distance of a query, up to the maximum distance the index was built for.
+
+    Every entry is indexed under all variants obtained by deleting up to maxdistance characters. Two sequences within
+    distance k share such a variant with at most k deletions each, so candidates are found by looking up the deletion
+    variants of the query, and only those are verified. Lookups are very fast for small distances, at the cost of memory.
+    """
+
+    def __init__(self, lexicon=None, maxdistance=2):
+        self.maxdistance = maxdistance
+        self.entries = []
+        self.index = {} #deletion variant => list of entry indices
+        if lexicon:
+            for entry in lexicon:
+                self.add(entry)
+
+    def deletions(self, entry, maxdistance):
+        """Returns the set of all variants of the entry with up to maxdistance elements deleted (including the entry itself)"""
+        variants = set([entry])
+        frontier = variants
+        for _ in range(maxdistance):
+            frontier = set( variant[:i] + variant[i+1:] for variant in frontier for i in range(len(variant)) )
+            variants |= frontier
+        return variants
+
+    def add(self, entry):
+        """Add an entry to the index, returns False if it was already present"""
+        if entry in self:
+            return False
+        i = len(self.entries)
+        self.entries.append(entry)
+        for variant in self.deletions(entry, self.maxdistance):
+            try:
+                self.index[variant].append(i)
+            except KeyError:
+                self.index[variant] = [i]
+        return True
+
+    def search(self, query, maxdistance=None):
+        """Returns all (entry, distance) pairs within maxdistance (defaults to, and can not exceed, the maximum distance of the index) of the query, sorted by distance"""
+        if maxdistance is None:
+            maxdistance = self.maxdistance
+        elif maxdistance > self.maxdistance:
+            raise ValueError("Index only supports distances up to " + str(self.maxdistance))
+        candidates = set()
+        for variant in self.deletions(query, maxdistance):
+            if variant in self.index:
+                candidates.update(self.index[variant])
+        results = []
+        for i in candidates:
+            entry = self.entries[i]
+            d = levenshtein(query, entry, maxdistance)
+            if d <= maxdistance:
+                results.append((entry, d))
+        results.sort(key=lambda x: (x[1], x[0]))
+        return results
+
+    def batchsearch(self, queries, maxdistance=None):
+        """Searches multiple queries, returns a list with the results of search() for each"""
+        return [ self.search(query, maxdistance) for query in queries ]
+
+    def __contains__(self, entry):
+        return entry in self.index and any( self.entries[i] == entry for i in self.index[entry] )
+
+    def __len__(self):
+        return len(self.entries)
 
 
 
@@ -153,5 +153,25 @@ class Test1(unittest.TestCase):
         self.assertEqual(result[1][1]['word'],"new")
         self.assertEqual(result[1][2]['word'],"module")
 
+    def test8(self):
+        q = cql.Query("[ pos = \"det|a\" ]{1,2}")
+        result = q(tokens)
+        self.assertEqual(len(result),7) #overlapping matches
+        self.assertEqual([ len(match) for match in result ], [1,1,2,1,1,2,1])
+        self.assertEqual(result, list(q.nfa().find(tokens)))
+
+    def test9(self):
+        q = cql.Query("[ pos = \"det\" ] []? [ pos = \"n\" ]")
+        dfa = q.dfa()
+        results = list(q.batch([tokens, tokens[5:], tokens[:2]]))
+        self.assertTrue(q.dfa() is dfa) #compiled only once
+        self.assertEqual(len(results),3)
+        self.assertEqual(len(results[0]),2)
+        self.assertEqual(len(results[1]),1)
+        self.assertEqual(results[1][0][0]['word'],"the")
+        self.assertEqual(results[2],[])
+        self.assertTrue(dfa.match(tokens[2:5]))
+        self.assertFalse(dfa.match(tokens[1:5]))
+
 if __name__ == '__main__':
     unittest.main()
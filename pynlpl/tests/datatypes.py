@@ -12,7 +12,7 @@ import sys
 import unittest
 
 
-from pynlpl.datatypes import PriorityQueue
+from pynlpl.datatypes import PriorityQueue, MinMaxHeap, LRUSet, BloomFilter
 
 values = [3,6,6,1,8,2]
 mintomax = sorted(values)
@@ -70,6 +70,75 @@ class PriorityQueueTest(unittest.TestCase):
         result = list(iter(pq))
         self.assertEqual(result, maxtomin[:4])                
 
+    def test_pop_score_slice(self):
+        """Priority queue pop, score and slicing"""
+        global values
+        pq = PriorityQueue(values, lambda x: x, False,0,False,False)
+        self.assertEqual(pq[0], 8)
+        self.assertEqual(pq.score(1), 6)
+        self.assertEqual(list(pq[1:3]), [6,6])
+        self.assertEqual(pq.pop(), 8)
+        self.assertEqual(pq.pop(), 6)
+        self.assertEqual(len(pq), 4)
+        pq.prune(2)
+        self.assertEqual(list(pq), [6,3])
+
+    def test_duplicates(self):
+        """Priority queue without duplicates"""
+        global values
+        pq = PriorityQueue(values, lambda x: x, True,4,False,False,False)
+        self.assertEqual(list(pq), [1,2,3,6])
+        self.assertFalse(pq.append(2))
+        self.assertEqual(pq.pop(), 1)
+        self.assertTrue(pq.append(1))
+
+    def test_add(self):
+        """Adding up priority queues"""
+        global values
+        pq = PriorityQueue(values, lambda x: x, False,4,False,False) + PriorityQueue([5,8,2], lambda x: x, False,0,False,False)
+        self.assertEqual(list(pq), [8,8,6,6])
+        self.assertEqual(pq.score(0), 8)
+        pq = PriorityQueue(values, lambda x: x, True,0,False,False) + PriorityQueue([5,8,2], lambda x: x, True,0,False,False)
+        self.assertEqual(list(pq), sorted(values + [5,8,2]))
+        self.assertRaises(AssertionError, PriorityQueue.__add__, pq, PriorityQueue([], lambda x: x, False))
+
+    def test_minmaxheap(self):
+        """Min-max heap"""
+        heap = MinMaxHeap(values)
+        for x in range(10,0,-1):
+            heap.push(x)
+        result = sorted(values + list(range(1,11)))
+        while result:
+            self.assertEqual(heap.min(), result[0])
+            self.assertEqual(heap.max(), result[-1])
+            if len(result) % 2:
+                self.assertEqual(heap.popmax(), result.pop())
+            else:
+                self.assertEqual(heap.popmin(), result.pop(0))
+        self.assertEqual(len(heap), 0)
+
+
+class BoundedSetTest(unittest.TestCase):
+    def test_lruset(self):
+        """LRU set"""
+        s = LRUSet(3)
+        for x in (1,2,3):
+            s.add(x)
+        self.assertTrue(1 in s) #1 is now the most recently used
+        s.add(4)
+        self.assertEqual(len(s), 3)
+        self.assertFalse(2 in s)
+        self.assertTrue(1 in s and 3 in s and 4 in s)
+
+    def test_bloomfilter(self):
+        """Bloom filter"""
+        b = BloomFilter(1000, 0.01)
+        for x in range(1000):
+            b.add(x)
+        self.assertTrue(all( x in b for x in range(1000) ))
+        falsepositives = sum( 1 for x in range(1000,11000) if x in b )
+        self.assertTrue(falsepositives < 300)
+
 
 if __name__ == '__main__':
     unittest.main()
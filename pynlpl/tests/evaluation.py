@@ -137,6 +137,14 @@ class ClassEvaluationTest(unittest.TestCase):
         self.assertEqual( round(e.fscore('dog'),6),0.428571)
 
         self.assertEqual( round(e.accuracy(),6), 0.703704)
+
+    def test002(self):
+        """Class evaluation test -- Adding evaluations together"""
+        e = ClassEvaluation(self.goals[:10], self.observations[:10]) + ClassEvaluation(self.goals[10:], self.observations[10:])
+        self.assertEqual(e.tp['cat'], 5)
+        self.assertEqual(e.tn['rabbit'], 13)
+        self.assertEqual(e.fn['dog'], 3)
+        self.assertEqual( round(e.accuracy(),6), 0.703704)
         
         
 
@@ -167,6 +167,91 @@ class Test1Read(unittest.TestCase):
         self.assertTrue(isinstance(doc,folia.Document))
         self.assertEqual(len(list(doc.words())),1465)
 
+    def test5_readlazy(self):
+        """Reading in lazy mode"""
+        doc = folia.Document(string=FOLIAEXAMPLE, mode=folia.Mode.LAZY)
+        self.assertTrue(isinstance(doc,folia.Document))
+        self.assertTrue(doc.lazynodes) #nothing beyond the text has been converted yet
+        reference = folia.Document(string=FOLIAEXAMPLE)
+        word = list(reference.words())[-1]
+        #obtaining an element by ID converts only the elements containing it
+        self.assertTrue(word.id in doc)
+        self.assertEqual(doc[word.id].text(), word.text())
+        self.assertEqual(doc[word.id].parent.id, word.parent.id)
+        #full iteration yields the same as a fully loaded document
+        self.assertEqual(len(list(doc.words())), len(list(reference.words())))
+        self.assertFalse(doc.lazynodes)
+        self.assertEqual(doc, reference)
+
+    def test6_readbinary(self):
+        """Reading from binary representation"""
+        reference = folia.Document(string=FOLIAEXAMPLE)
+        reference.save(os.path.join(TMPDIR,'foliatest.bin'))
+        self.assertRaises(Exception, folia.Document, file=os.path.join(TMPDIR,'foliatest.bin')) #binary documents are only loaded on request
+        doc = folia.Document(file=os.path.join(TMPDIR,'foliatest.bin'), binary=True)
+        self.assertEqual( doc, reference)
+        self.assertEqual( doc.xmlstring(), reference.xmlstring() )
+        self.assertEqual( sorted(doc.index.keys()), sorted(reference.index.keys()) )
+        word = list(reference.words())[-1]
+        self.assertEqual( doc[word.id].text(), word.text() )
+
+        reference.save(os.path.join(TMPDIR,'foliatest.bin.gz'))
+        doc = folia.Document(file=os.path.join(TMPDIR,'foliatest.bin.gz'), binary=True)
+        self.assertEqual( doc.xmlstring(), reference.xmlstring() )
+
+        doc = folia.Document(string=reference.binary(), binary=True)
+        self.assertEqual( doc.xmlstring(), reference.xmlstring() )
+
+    def test6_readbinary_explicit(self):
+        """Reading from binary representation - only known elements and attributes are encoded"""
+        reference = folia.Document(string=FOLIAEXAMPLE)
+        word = list(reference.words())[0]
+        word.custom = object() #not encoded, element is stored as XML instead
+        self.assertFalse(folia.isbinarystorable(word))
+        doc = folia.Document(string=reference.binary(), binary=True)
+        self.assertEqual( doc.xmlstring(), reference.xmlstring() )
+        self.assertFalse(hasattr(doc[word.id], 'custom'))
+        self.assertIs(folia.binaryclass(folia.binaryclasskey(folia.HeadFeature)), folia.HeadFeature)
+        self.assertRaises(Exception, folia.binaryclass, 'Document')
+
+    def test6_readbinary_spansuggestion(self):
+        """Reading from binary representation - span annotations in suggestions for correction"""
+        reference = folia.Document(id='example')
+        reference.declare(folia.Entity, 'adhocset')
+        reference.declare(folia.Correction, 'adhoccorrectionset')
+        text = reference.append(folia.Text(reference, id=reference.id + '.text.1'))
+        s = text.append(folia.Sentence(reference,id=reference.id + '.s.1', contents=[
+                folia.Word(reference,id=reference.id + '.s.1.w.1', text="John"),
+                folia.Word(reference,id=reference.id + '.s.1.w.2', text="Doe"),
+        ]))
+        w1, w2 = s.words()
+        entity = folia.Entity(reference, w1, w2, cls='per')
+        suggestion = folia.Suggestion(reference, entity)
+        s.append( folia.EntitiesLayer(reference, contents=[ folia.Correction(reference, suggestion, cls='ner') ]) )
+        self.assertTrue(folia.isbinarystorable(suggestion))
+        doc = folia.Document(string=reference.binary(), binary=True)
+        self.assertEqual( doc.xmlstring(), reference.xmlstring() )
+        self.assertEqual( list(doc.select(folia.Entity, ignore=False))[0].wrefs(), [doc[w1.id], doc[w2.id]] )
+        entity.custom = object() #stored as XML, referring to words that are encoded
+        doc = folia.Document(string=reference.binary(), binary=True)
+        self.assertEqual( doc.xmlstring(), reference.xmlstring() )
+        self.assertEqual( list(doc.select(folia.Entity, ignore=False))[0].wrefs(), [doc[w1.id], doc[w2.id]] )
+
+    def test7_savestreaming(self):
+        """Saving to file (written incrementally, identical to the serialisation as a whole)"""
+        doc = folia.Document(string=FOLIAEXAMPLE)
+        doc.data[0].append( folia.Division(doc, id=doc.id + '.emptydiv') )
+        for filename in ('foliatest.saved.xml', 'foliatest.saved.xml.gz', 'foliatest.saved.xml.bz2'):
+            doc.save(os.path.join(TMPDIR,filename))
+            if filename.endswith('.gz'):
+                f = gzip.GzipFile(os.path.join(TMPDIR,filename),'rb')
+            elif filename.endswith('.bz2'):
+                f = bz2.BZ2File(os.path.join(TMPDIR,filename),'rb')
+            else:
+                f = io.open(os.path.join(TMPDIR,filename),'rb')
+            self.assertEqual( f.read(), doc.xmlstring().encode('utf-8') )
+            f.close()
+
 class Test2Sanity(unittest.TestCase):
 
     def setUp(self):
@@ -2251,6 +2336,114 @@ class Test4Create(unittest.TestCase):
 
         self.assertEqual( len(self.doc.index[self.doc.id + '.s.1']), 5)
 
+    def test002_querycache(self):
+        """Creating a FoLiA Document from scratch - Document queries reflect modifications"""
+        doc = folia.Document(id='example')
+        text = doc.append(folia.Text(doc, id=doc.id + '.text.1'))
+        s = text.append(folia.Sentence(doc,id=doc.id + '.s.1', contents=[
+                folia.Word(doc,id=doc.id + '.s.1.w.1', text="De"),
+                folia.Word(doc,id=doc.id + '.s.1.w.2', text="site"),
+        ]))
+        self.assertEqual( doc.count(folia.Word), 2 )
+        self.assertEqual( doc.words(-1).text(), 'site' )
+        s.append(folia.Word(doc,id=doc.id + '.s.1.w.3', text="staat"))
+        self.assertEqual( doc.count(folia.Word), 3 )
+        self.assertEqual( doc.words(-1).text(), 'staat' )
+        s.insert(0, folia.Word(doc,id=doc.id + '.s.1.w.0', text="Nu"))
+        self.assertEqual( [ w.text() for w in doc.words() ], ['Nu','De','site','staat'] )
+        s.remove(doc[doc.id + '.s.1.w.2'])
+        self.assertEqual( [ w.text() for w in doc.words() ], ['Nu','De','staat'] )
+        self.assertEqual( doc.sentences(0), s )
+        self.assertEqual( doc.count(folia.Word, 'nonexistantset'), 0 )
+
+    def test003_textcache(self):
+        """Creating a FoLiA Document from scratch - Text reflects modifications"""
+        doc = folia.Document(id='example')
+        text = doc.append(folia.Text(doc, id=doc.id + '.text.1'))
+        s = text.append(folia.Sentence(doc,id=doc.id + '.s.1', contents=[
+                folia.Word(doc,id=doc.id + '.s.1.w.1', text="De"),
+                folia.Word(doc,id=doc.id + '.s.1.w.2', text="site"),
+                folia.Word(doc,id=doc.id + '.s.1.w.3', text="staat"),
+                folia.Word(doc,id=doc.id + '.s.1.w.4', text="online", space=False),
+                folia.Word(doc,id=doc.id + '.s.1.w.5', text="."),
+        ]))
+        self.assertEqual( s.text(), 'De site staat online.' )
+        self.assertEqual( s.text(retaintokenisation=True), 'De site staat online .' )
+        doc[doc.id + '.s.1.w.4'].space = True
+        self.assertEqual( s.text(), 'De site staat online .' )
+        doc[doc.id + '.s.1.w.2'].textcontent().settext('pagina')
+        self.assertEqual( s.text(), 'De pagina staat online .' )
+        doc[doc.id + '.s.1.w.3'].settext('is')
+        self.assertEqual( s.text(), 'De pagina is online .' )
+        w = doc[doc.id + '.s.1.w.4']
+        w.split( folia.Word(doc, id=doc.id + '.s.1.w.4a', text="on"), folia.Word(doc, id=doc.id + '.s.1.w.4b', text="line") )
+        self.assertEqual( s.text(), 'De pagina is on line .' )
+        self.assertEqual( s.text(correctionhandling=folia.CorrectionHandling.ORIGINAL), 'De pagina is online .' )
+        self.assertEqual( text.text(), 'De pagina is on line .' )
+
+    def test003b_spantextcache(self):
+        """Creating a FoLiA Document from scratch - Text of span annotations reflects modifications of their words"""
+        doc = folia.Document(id='example')
+        doc.declare(folia.Entity, 'adhocset')
+        doc.declare(folia.SyntacticUnit, 'adhocsyntax')
+        text = doc.append(folia.Text(doc, id=doc.id + '.text.1'))
+        s = text.append(folia.Sentence(doc,id=doc.id + '.s.1', contents=[
+                folia.Word(doc,id=doc.id + '.s.1.w.1', text="John"),
+                folia.Word(doc,id=doc.id + '.s.1.w.2', text="Doe"),
+        ]))
+        w1, w2 = s.words()
+        e = folia.Entity(doc, w1, w2, cls='per')
+        s.append( folia.EntitiesLayer(doc, contents=[e]) )
+        np = folia.SyntacticUnit(doc, w1, w2, cls='np')
+        su = folia.SyntacticUnit(doc, cls='s', contents=[np])
+        s.append( folia.SyntaxLayer(doc, contents=[su]) )
+        self.assertEqual( e.text(), 'John Doe' )
+        self.assertEqual( su.text(), 'John Doe' )
+        w2.settext('Smith')
+        self.assertEqual( e.text(), 'John Smith' )
+        self.assertEqual( su.text(), 'John Smith' )
+        w1.space = False
+        self.assertEqual( e.text(), 'JohnSmith' )
+        self.assertEqual( su.text(), 'JohnSmith' )
+        self.assertEqual( s.text(), 'JohnSmith' )
+
+    def test004_findspans(self):
+        """Creating a FoLiA Document from scratch - Span annotations found from their words"""
+        doc = folia.Document(id='example')
+        doc.declare(folia.Entity, 'adhocset')
+        doc.declare(folia.SyntacticUnit, 'adhocsyntax')
+        text = doc.append(folia.Text(doc, id=doc.id + '.text.1'))
+        s = text.append(folia.Sentence(doc,id=doc.id + '.s.1', contents=[
+                folia.Word(doc,id=doc.id + '.s.1.w.1', text="John"),
+                folia.Word(doc,id=doc.id + '.s.1.w.2', text="Doe"),
+                folia.Word(doc,id=doc.id + '.s.1.w.3', text="visits"),
+                folia.Word(doc,id=doc.id + '.s.1.w.4', text="Amsterdam"),
+        ]))
+        w1, w2, w3, w4 = s.words()
+        person = folia.Entity(doc, w1, w2, cls='per')
+        location = folia.Entity(doc, w4, cls='loc')
+        s.append( folia.EntitiesLayer(doc, contents=[person, location]) )
+        vp = folia.SyntacticUnit(doc, cls='vp', contents=[ folia.SyntacticUnit(doc, w3, cls='v'), folia.SyntacticUnit(doc, w4, cls='np') ])
+        s.append( folia.SyntaxLayer(doc, contents=[ folia.SyntacticUnit(doc, cls='s', contents=[ folia.SyntacticUnit(doc, w1, w2, cls='np'), vp ]) ]) )
+
+        self.assertEqual( [ e.cls for e in w1.findspans(folia.Entity) ], ['per'] )
+        self.assertEqual( [ e.cls for e in w3.findspans(folia.Entity) ], [] )
+        self.assertEqual( [ e.cls for e in w4.findspans(folia.EntitiesLayer) ], ['loc'] )
+        self.assertEqual( [ su.cls for su in w4.findspans(folia.SyntacticUnit) ], ['s','vp','np'] )
+        self.assertEqual( [ su.cls for su in w4.findspans(folia.SyntacticUnit, 'othersyntax') ], [] )
+
+        #the index follows modifications
+        person.setspan(w2)
+        self.assertEqual( [ e.cls for e in w1.findspans(folia.Entity) ], [] )
+        self.assertEqual( [ e.cls for e in w2.findspans(folia.Entity) ], ['per'] )
+        location.parent.remove(location)
+        self.assertEqual( [ e.cls for e in w4.findspans(folia.Entity) ], [] )
+
+        #and is rebuilt when parsing
+        doc = folia.Document(string=doc.xmlstring())
+        self.assertEqual( [ e.cls for e in doc[doc.id + '.s.1.w.2'].findspans(folia.Entity) ], ['per'] )
+        self.assertEqual( [ su.cls for su in doc[doc.id + '.s.1.w.4'].findspans(folia.SyntacticUnit) ], ['s','vp','np'] )
+
 class Test5Correction(unittest.TestCase):
     def setUp(self):
         self.doc = folia.Document(id='example', textvalidation=True)
@@ -2585,6 +2778,124 @@ class Test6Query(unittest.TestCase):
         self.assertEqual( len(matches), 0 )
 
 
+class Test6QueryIndex(unittest.TestCase):
+    def setUp(self):
+        self.filenames = []
+        for i, sentence in enumerate( ( (('a','det'),('big','adj'),('house','noun')), (('A','det'),('very','adv'),('nice','adj'),('house','noun')), (('the','det'),('house','noun'),('is','verb'),('big','adj')) ) ):
+            doc = folia.Document(id='indextest' + str(i))
+            doc.declare(folia.PosAnnotation, 'testpos')
+            text = doc.append(folia.Text(doc, id=doc.id + '.text'))
+            s = text.append(folia.Sentence(doc, id=doc.id + '.s.1'))
+            for j, (word, pos) in enumerate(sentence):
+                w = s.append(folia.Word(doc, id=doc.id + '.s.1.w.' + str(j+1), text=word))
+                w.append(folia.PosAnnotation, cls=pos)
+            filename = os.path.join(TMPDIR, 'foliaindextest' + str(i) + '.xml')
+            doc.save(filename)
+            self.filenames.append(filename)
+        self.indexfile = os.path.join(TMPDIR, 'foliaindextest.db')
+        if os.path.exists(self.indexfile):
+            os.unlink(self.indexfile)
+        self.index = folia.CorpusIndex(self.indexfile)
+        self.index.build(self.filenames)
+
+    def tearDown(self):
+        self.index.close()
+
+    def test001_build(self):
+        """Querying with corpus index - Building the index"""
+        self.assertEqual( len(self.index), 3 )
+        self.assertTrue( os.path.abspath(self.filenames[0]) in self.index )
+        self.assertFalse( self.index.add(self.filenames[0]) ) #up to date already
+
+    def test002_candidates(self):
+        """Querying with corpus index - Candidate documents"""
+        self.assertEqual( self.index.candidates( folia.Pattern('big','house') ), [ os.path.abspath(self.filenames[0]) ] )
+        self.assertEqual( self.index.candidates( folia.Pattern('house','big') ), [] ) #both words occur in doc 3 but not adjacently
+        self.assertEqual( len(self.index.candidates( folia.Pattern('a','*','house') )), 2 )
+        self.assertEqual( len(self.index.candidates( folia.Pattern(True, 'house') )), 3 )
+
+    def test003_findwords(self):
+        """Querying with corpus index - Find words"""
+        matches = list(self.index.findwords( folia.Pattern('a',True,'house') ))
+        self.assertEqual( len(matches), 1 )
+        self.assertEqual( [ w.text() for w in matches[0] ], ['a','big','house'] )
+        self.assertEqual( matches[0][0].doc.id, 'indextest0' )
+
+    def test004_findwords_annotation(self):
+        """Querying with corpus index - Find words by annotation, with regular expressions and variable wildcards"""
+        matches = list(self.index.findwords( folia.Pattern('det','*','noun', matchannotation=folia.PosAnnotation) ))
+        self.assertEqual( len(matches), 2 )
+        matches = list(self.index.findwords( folia.Pattern(folia.RegExp('n.*'), 'verb', matchannotation=folia.PosAnnotation, matchannotationset='testpos') ))
+        self.assertEqual( len(matches), 1 )
+        self.assertEqual( [ w.text() for w in matches[0] ], ['house','is'] )
+        self.assertEqual( list(self.index.findwords( folia.Pattern('a', casesensitive=True) ))[0][0].doc.id, 'indextest0' )
+
+    def test005_reindex(self):
+        """Querying with corpus index - Reindexing a modified document"""
+        doc = folia.Document(file=self.filenames[2])
+        doc['indextest2.s.1.w.4'].settext('small')
+        doc.save()
+        os.utime(self.filenames[2], (0, 0))
+        self.assertTrue( self.index.add(self.filenames[2]) )
+        self.assertEqual( self.index.candidates( folia.Pattern('is','big') ), [] )
+        self.assertEqual( len(list(self.index.findwords( folia.Pattern('is','small') ))), 1 )
+
+
+
+def wordfrequencies(doc):
+    """Mapper for Test6MapReduce"""
+    from pynlpl.statistics import FrequencyList
+    freqlist = FrequencyList()
+    for word in doc.words():
+        freqlist.count(word.text())
+    return freqlist
+
+class Test6MapReduce(unittest.TestCase):
+    def setUp(self):
+        self.filenames = []
+        for i, sentence in enumerate( ( ('a','big','house'), ('a','very','nice','house'), ('the','house','is','big') ) ):
+            doc = folia.Document(id='mapreducetest' + str(i))
+            text = doc.append(folia.Text(doc, id=doc.id + '.text'))
+            s = text.append(folia.Sentence(doc, id=doc.id + '.s.1'))
+            for j, word in enumerate(sentence):
+                s.append(folia.Word(doc, id=doc.id + '.s.1.w.' + str(j+1), text=word))
+            filename = os.path.join(TMPDIR, 'foliamapreducetest' + str(i) + '.xml')
+            doc.save(filename)
+            self.filenames.append(filename)
+        self.brokenfile = os.path.join(TMPDIR, 'foliamapreducetest.broken.xml')
+        with io.open(self.brokenfile,'w',encoding='utf-8') as f:
+            f.write("<FoLiA>")
+
+    def test001_mapreduce(self):
+        """Map/reduce over a corpus - Frequency list, in parallel"""
+        mapreduce = folia.CorpusMapReduce(self.filenames, wordfrequencies, threads=2)
+        freqlist = mapreduce.run()
+        self.assertEqual( freqlist['house'], 3 )
+        self.assertEqual( freqlist['big'], 2 )
+        self.assertEqual( freqlist.total, 11 )
+        self.assertEqual( len(mapreduce.reports), 3 )
+        self.assertEqual( mapreduce.failed(), [] )
+
+    def test002_chunks(self):
+        """Map/reduce over a corpus - Chunking, largest files first"""
+        mapreduce = folia.CorpusMapReduce(self.filenames, wordfrequencies, threads=1)
+        chunks = mapreduce.chunks()
+        self.assertEqual( sorted( filename for chunk in chunks for filename, _ in chunk ), sorted(self.filenames) )
+        self.assertEqual( chunks[0][0][0], max(self.filenames, key=os.path.getsize) ) #largest file first
+        mapreduce = folia.CorpusMapReduce(self.filenames, wordfrequencies, chunksize=2)
+        self.assertEqual( [ len(chunk) for chunk in mapreduce.chunks() ], [2,1] )
+
+    def test003_failures(self):
+        """Map/reduce over a corpus - Failure reports"""
+        reports = []
+        mapreduce = folia.CorpusMapReduce(self.filenames + [self.brokenfile], wordfrequencies, threads=1, progress=reports.append)
+        freqlist = mapreduce.run()
+        self.assertEqual( freqlist.total, 11 )
+        self.assertEqual( len(reports), 4 )
+        self.assertEqual( [ report.filename for report in mapreduce.failed() ], [self.brokenfile] )
+        mapreduce = folia.CorpusMapReduce(self.filenames + [self.brokenfile], wordfrequencies, threads=1, ignoreerrors=False)
+        self.assertRaises( Exception, mapreduce.run )
+
 
 class Test9Reader(unittest.TestCase):
     def setUp(self):
@@ -2644,6 +2955,30 @@ class Test9Reader(unittest.TestCase):
         matches = list(self.reader.findwords( folia.Pattern('bli','bla','blu')))
         self.assertEqual( len(matches), 0)
 
+    def test006_metadata(self):
+        """Stream reader - Metadata is available before iterating"""
+        doc = folia.Document(file=os.path.join(TMPDIR,"foliatest.xml"))
+        self.assertEqual( self.reader.doc.id, doc.id )
+        self.assertEqual( self.reader.doc.defaultset(folia.AnnotationType.POS), doc.defaultset(folia.AnnotationType.POS) )
+
+    def test007_multitarget(self):
+        """Stream reader - Iterating over multiple targets"""
+        wordcount = sum( 1 for _ in self.reader )
+        count = 0
+        for element in folia.Reader(os.path.join(TMPDIR,"foliatest.xml"), (folia.Sentence, folia.Word)):
+            self.assertTrue( isinstance(element, (folia.Sentence, folia.Word)) )
+            if isinstance(element, folia.Sentence):
+                count += element.count(folia.Word, None, True, [folia.AbstractAnnotationLayer])
+            else:
+                count += 1
+        self.assertEqual(count, wordcount)
+
+    def test008_multifile(self):
+        """Stream reader - Iterating over multiple files"""
+        wordcount = sum( 1 for _ in self.reader )
+        reader = folia.Reader([os.path.join(TMPDIR,"foliatest.xml"), os.path.join(TMPDIR,"foliatest.xml.gz")], folia.Word)
+        self.assertEqual( sum( 1 for _ in reader ), wordcount * 2 )
+
 
     def test011_findwords_annotation_na(self):
         """Querying using stream reader - Find words by non existing annotation"""
@@ -3958,6 +4293,58 @@ het    ook   ?
         self.assertEqual( doc['test.s'].text(), "Dit\n         is een rare test.\n         ")
 
 
+class Test9SetDefinition(unittest.TestCase):
+    def setUp(self):
+        self.setfile = os.path.join(TMPDIR,'foliasettest.foliaset.xml')
+        self.cachedir = os.path.join(TMPDIR,'foliasettest.cache')
+        with io.open(self.setfile,'w',encoding='utf-8') as f:
+            f.write(LEGACYSETEXAMPLE)
+        if os.path.isdir(self.cachedir):
+            for filename in os.listdir(self.cachedir):
+                os.unlink(os.path.join(self.cachedir, filename))
+
+    def test001_compiled(self):
+        """Set Definition - Testing classes with compiled tables"""
+        setdefinition = folia.SetDefinition(self.setfile)
+        self.assertTrue( setdefinition.testclass('N').endswith('#N') )
+        self.assertRaises( folia.DeepValidationError, setdefinition.testclass, 'X')
+        self.assertRaises( folia.DeepValidationError, setdefinition.testclass, '')
+        self.assertTrue( setdefinition.testsubclass('N', 'number', 'sg').endswith('#sg') )
+        self.assertRaises( folia.DeepValidationError, setdefinition.testsubclass, 'N', 'number', 'du')
+        self.assertEqual( setdefinition.testsubclass('N', 'comment', 'anything'), 'anything')
+        self.assertRaises( folia.DeepValidationError, setdefinition.testsubclass, 'N', 'nosuchsubset', 'sg')
+
+    def test002_cache(self):
+        """Set Definition - Loading compiled set definitions from the cache"""
+        setdefinition = folia.SetDefinition(self.setfile, cachedir=self.cachedir)
+        self.assertEqual( len(os.listdir(self.cachedir)), 1)
+        cachedsetdefinition = folia.SetDefinition(self.setfile, cachedir=self.cachedir)
+        self.assertTrue( cachedsetdefinition.compiled is not None )
+        self.assertEqual( cachedsetdefinition.testclass('V'), setdefinition.testclass('V') )
+        self.assertEqual( cachedsetdefinition.testsubclass('V', 'number', 'pl'), setdefinition.testsubclass('V', 'number', 'pl') )
+        self.assertRaises( folia.DeepValidationError, cachedsetdefinition.testclass, 'X')
+        self.assertEqual( cachedsetdefinition.json(), setdefinition.json() ) #parses the graph on demand
+
+    def test003_cache_changed(self):
+        """Set Definition - Cache is invalidated when the set definition changes"""
+        folia.SetDefinition(self.setfile, cachedir=self.cachedir)
+        with io.open(self.setfile,'w',encoding='utf-8') as f:
+            f.write(LEGACYSETEXAMPLE.replace('<class xml:id="V" label="Verb"/>',''))
+        setdefinition = folia.SetDefinition(self.setfile, cachedir=self.cachedir)
+        self.assertRaises( folia.DeepValidationError, setdefinition.testclass, 'V')
+        self.assertEqual( len(os.listdir(self.cachedir)), 2)
+
+LEGACYSETEXAMPLE = """<?xml version="1.0" encoding="utf-8"?>
+<set xmlns="http://ilk.uvt.nl/folia" xml:id="pos" type="closed" label="Parts of speech">
+  <class xml:id="N" label="Noun"/>
+  <class xml:id="V" label="Verb"/>
+  <subset xml:id="number" type="closed" label="Number">
+    <class xml:id="sg" label="Singular"/>
+    <class xml:id="pl" label="Plural"/>
+  </subset>
+  <subset xml:id="comment" type="open"/>
+</set>"""
+
 with io.open(FOLIAPATH + '/test/example.xml', 'r',encoding='utf-8') as foliaexample_f:
     FOLIAEXAMPLE = foliaexample_f.read()
 
@@ -7,6 +7,8 @@ import time
 import sys
 import os
 import glob
+import resource
+import multiprocessing
 try:
     from pympler import asizeof
 except ImportError:
@@ -50,11 +52,21 @@ def loadfile(**kwargs):
     doc = folia.Document(file=kwargs['filename'],bypassleak=False)
 
 
+@timeit
+def loadbinary(**kwargs):
+    """Loading file in binary representation"""
+    doc = folia.Document(file=kwargs['filename'])
+
 @timeit
 def savefile(**kwargs): #careful with SSDs
     """Saving file"""
     kwargs['doc'].save("/tmp/test.xml")
 
+@timeit
+def savebinary(**kwargs): #careful with SSDs
+    """Saving file in binary representation"""
+    kwargs['doc'].save("/tmp/test.bin")
+
 @timeit
 def xml(**kwargs):
     """XML serialisation"""
@@ -148,6 +160,27 @@ def readerwords(**kwargs):
     for word in reader:
         pass
 
+@timeit
+def readercorpuswords(**kwargs):
+    """Iterating over words of multiple files using Reader"""
+    reader = folia.Reader(kwargs['filenames'], folia.Word)
+    for word in reader:
+        pass
+
+def readall(filenames, target):
+    for element in folia.Reader(filenames, target):
+        pass
+
+def readerpeakrss(filenames, target):
+    """Reports the peak memory usage (resident set size) of a process streaming over the files with Reader"""
+    process = multiprocessing.Process(target=readall, args=(filenames, target))
+    process.start()
+    process.join()
+    #ru_maxrss is in kilobytes on Linux, in bytes on Mac OS X
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == 'darwin': maxrss = maxrss / 1024
+    print("readerpeakrss -- Peak memory usage of Reader over " + target.__name__ + " on " + str(len(filenames)) + " file(s) -- " + str(round(maxrss / 1024,2)) + " MB" + " (total filesize " + str(round(sum(os.path.getsize(filename) for filename in filenames)/1024/1024,2)) + " MB)")
+
 def main():
     global repetitions, target
     files = []
@@ -195,7 +228,18 @@ def main():
                 globals()[f](filename=filename)
 
 
-    for f in ('xml','text','json','countwords','selectwords','nextwords','ancestors','selectwordsfql','selectwordsfqlforp','selectwordsfqlxml','selectwordsfqlwhere','editwordsfql', 'addelement' ):
+    if 'loadbinary' in selectedtests or 'all' in selectedtests:
+        for filename in files:
+            folia.Document(file=filename).save("/tmp/test.bin")
+            loadbinary(filename="/tmp/test.bin")
+
+    if files and ('readercorpuswords' in selectedtests or 'all' in selectedtests):
+        readercorpuswords(filenames=files)
+
+    if files and ('readerpeakrss' in selectedtests or 'all' in selectedtests):
+        readerpeakrss(files, folia.Word)
+
+    for f in ('xml','text','json','countwords','selectwords','nextwords','ancestors','selectwordsfql','selectwordsfqlforp','selectwordsfqlxml','selectwordsfqlwhere','editwordsfql', 'addelement', 'savebinary' ):
         if f in selectedtests or 'all' in selectedtests:
             for filename in files:
                 doc = folia.Document(file=filename)
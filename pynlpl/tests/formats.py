@@ -1,10 +1,16 @@
 import sys
 import os
+import io
 import unittest
+import tempfile
+import shutil
 
 sys.path.append(sys.path[0] + '/../../')
 os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
 from pynlpl.formats.timbl import TimblOutput
+from pynlpl.formats.moses import PhraseTable, MappedPhraseTable, PhraseTableClient
+if sys.version >= '3':
+    from pynlpl.formats.moses import AsyncPhraseTableServer, PooledPhraseTableClient
 if sys.version < '3':
     from StringIO import StringIO
 else:
@@ -80,3 +86,76 @@ class TimblTest(unittest.TestCase):
                 self.assertEqual(distribution['c'], 0.5)
                 self.assertEqual(distribution['e'], 0.5)
                 self.assertEqual(distance,1.0)
+
+
+PHRASETABLE = """de kat ||| the cat ||| 0.8 0.5 0.7 0.4 2.718 ||| 0-0 1-1 |||
+de kat ||| a cat ||| 0.1 0.2 0.1 0.3 2.718 ||| 0-0 1-1 |||
+huis ||| house ||| 0.9 0.8 0.9 0.7 2.718 ||| 0-0 |||
+de ||| the ||| 0.6 0.6 0.6 0.6 2.718 ||| 0-0 |||
+de ||| of the ||| 0.01 0.1 0.2 0.2 2.718 ||| 0-0 |||
+ijs ||| ice ||| 0.7 0.7 0.7 0.7 2.718 ||| 0-0 |||
+zeer groot huis ||| very big house ||| 0.5 0.5 0.5 0.5 2.718 ||| 0-0 1-1 2-2 |||
+"""
+
+class MosesPhraseTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.phrasetablefile = os.path.join(self.tmpdir, 'phrase-table')
+        with io.open(self.phrasetablefile,'w',encoding='utf-8') as f:
+            f.write(PHRASETABLE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test1_mapped(self):
+        """Moses - Memory-mapped phrase table gives the same results as the in-memory one"""
+        MappedPhraseTable.build(self.phrasetablefile, os.path.join(self.tmpdir,'phrase-table.bin'), quiet=True)
+        reference = PhraseTable(self.phrasetablefile, quiet=True)
+        phrasetable = MappedPhraseTable(os.path.join(self.tmpdir,'phrase-table.bin'))
+        self.assertEqual(len(phrasetable), len(reference))
+        for source, targets in reference:
+            self.assertTrue(source in phrasetable)
+            self.assertEqual([ (target, tuple(scores)) for target, scores in phrasetable[source] ], list(targets))
+        self.assertFalse('de hond' in phrasetable)
+        self.assertRaises(KeyError, phrasetable.__getitem__, 'de hond')
+        self.assertEqual(sorted( source for source, _ in phrasetable ), sorted( source for source, _ in reference ))
+        phrasetable.close()
+
+    def test2_mapped_options(self):
+        """Moses - Memory-mapped phrase table with options applied at build time, built in several runs"""
+        MappedPhraseTable.build(self.phrasetablefile, os.path.join(self.tmpdir,'phrase-table.bin'), quiet=True, reverse=True, max_sourcen=2, scorefilter=lambda scores: scores[2] > 0.15, buffersize=2)
+        phrasetable = MappedPhraseTable(os.path.join(self.tmpdir,'phrase-table.bin'))
+        self.assertEqual([ target for target, _ in phrasetable['the'] ], ['de'])
+        self.assertEqual([ target for target, _ in phrasetable['the cat'] ], ['de kat'])
+        self.assertEqual(phrasetable['of the'][0][1][2], 0.2)
+        self.assertFalse('a cat' in phrasetable) #filtered by score
+        self.assertFalse('very big house' in phrasetable) #too long
+        self.assertEqual(len(phrasetable), 5)
+        phrasetable.close()
+
+    @unittest.skipIf(sys.version < '3', "Python 3 only")
+    def test3_asyncserver(self):
+        """Moses - Asynchronous phrase table server with pipelining clients"""
+        reference = PhraseTable(self.phrasetablefile, quiet=True)
+        server = AsyncPhraseTableServer(reference, 0, 'localhost').runinbackground()
+        try:
+            client = PhraseTableClient('localhost', server.port)
+            self.assertEqual(client['de kat'], [('the cat', (0.8, 0.5, 0.7, 0.4, 2.718)), ('a cat', (0.1, 0.2, 0.1, 0.3, 2.718))])
+            self.assertFalse('de hond' in client)
+            client.socket.close()
+            pooled = PooledPhraseTableClient('localhost', server.port, size=3, window=4)
+            phrases = [ source for source, _ in reference ] * 10 + ['de hond']
+            results = pooled.lookup(phrases)
+            self.assertEqual(len(results), len(phrases))
+            for phrase, solutions in zip(phrases, results):
+                if phrase == 'de hond':
+                    self.assertEqual(solutions, None)
+                else:
+                    self.assertEqual(solutions, [ (target, tuple(scores)) for target, scores in reference[phrase] ])
+            self.assertEqual(pooled['huis'], [('house', (0.9, 0.8, 0.9, 0.7, 2.718))])
+            self.assertRaises(KeyError, pooled.__getitem__, 'de hond')
+            pooled.close()
+        finally:
+            server.stop()
+
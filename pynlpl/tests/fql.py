@@ -29,6 +29,10 @@ import sys
 import os
 import unittest
 import io
+import json
+import shutil
+import tempfile
+import threading
 from pynlpl.formats import fql, folia, cql
 
 Q1 = 'SELECT pos WHERE class = "n" FOR w WHERE text = "house" AND class != "punct" RETURN focus'
@@ -993,6 +997,225 @@ class Test4Evaluation(unittest.TestCase):
         self.assertEqual(results[0][1].text(), "on")
         self.assertEqual(results[0][2].text(), "weer")
 
+class Test5Planner(unittest.TestCase):
+    def setUp(self):
+        self.doc = folia.Document(string=FOLIAEXAMPLE)
+        self.word = next(self.doc.words())
+        self.pos = self.word.annotation(folia.PosAnnotation)
+        self.queries = [
+            'SELECT w WHERE text = "' + self.word.text() + '"',
+            'SELECT w WHERE id = "' + self.word.id + '"',
+            'SELECT w WHERE text MATCHES "^[a-z]" AND class = "' + self.word.cls + '"',
+            'SELECT pos WHERE class = "' + self.pos.cls + '" FOR w',
+            'SELECT w WHERE NOT text = "' + self.word.text() + '"',
+            'SELECT w WHERE text = "' + self.word.text() + '" FOR s WHERE id = "' + self.word.sentence().id + '"',
+        ]
+
+    def unplanned(self, q):
+        context = fql.Context()
+        context.optimize = False
+        return fql.Query(q, context)
+
+    def test01_plan(self):
+        """Planner - Access paths and order of conditions"""
+        q = fql.Query('SELECT w WHERE text MATCHES "^[a-z]" AND class = "WORD"')
+        self.assertEqual(q.action.focus.index.attribute, "class")
+        self.assertEqual(str(q.action.focus.filter), 'class = "WORD" AND text MATCHES "^[a-z]"')
+        q = fql.Query('SELECT w WHERE class = "WORD" AND text = "x" AND id = "y"')
+        self.assertEqual(q.action.focus.index.attribute, "id")
+        q = fql.Query('SELECT w WHERE class = "WORD" OR text = "x"')
+        self.assertIsNone(q.action.focus.index)
+        q = fql.Query('SELECT w WHERE class = "WORD" AND text = "x" FOR s WHERE text CONTAINS "x"')
+        self.assertEqual(q.action.focus.index.attribute, "text")
+        self.assertIsNone(q.targets.targets[0].index)
+
+    def test02_results(self):
+        """Planner - Planned queries return the same results as unplanned ones"""
+        for q in self.queries:
+            results = fql.Query(q)(self.doc)
+            self.assertTrue(results or q.find("NOT") != -1, q)
+            expected = self.unplanned(q)(self.doc)
+            self.assertEqual(len(results), len(expected), q)
+            for result, e in zip(results, expected):
+                self.assertIs(result, e)
+
+    def test03_edit(self):
+        """Planner - Indices are discarded when a query changes the document"""
+        q = 'SELECT w WHERE text = "' + self.word.text() + '"'
+        count = len(fql.Query(q)(self.doc))
+        fql.Query('EDIT w WHERE id = "' + self.word.id + '" WITH text "fqlplanner"')(self.doc)
+        self.assertEqual(len(fql.Query(q)(self.doc)), count - 1)
+        self.assertEqual(fql.Query('SELECT w WHERE text = "fqlplanner"')(self.doc), [self.word])
+
+    def test04_stream(self):
+        """Planner - Streaming results"""
+        for q in self.queries:
+            self.assertEqual(list(fql.Query(q).stream(self.doc)), fql.Query(q)(self.doc))
+            self.assertEqual("[ " + ", ".join(fql.Query(q + " FORMAT json").stream(self.doc)) + "]", fql.Query(q + " FORMAT json")(self.doc))
+        results = fql.Query(self.queries[0] + " FORMAT xml").stream(self.doc)
+        self.assertTrue(next(results).startswith("<result>"))
+
+    def test05_explain(self):
+        """Planner - Explaining the plan of a query"""
+        explanation = fql.Query("EXPLAIN " + self.queries[-1])(self.doc)
+        self.assertIn('access: index on text = "' + self.word.text() + '"', explanation)
+        self.assertIn('access: document index on id = "' + self.word.sentence().id + '"', explanation)
+        self.assertIn("execution: ", explanation)
+        self.assertIn("results: 1", explanation)
+        explanation = fql.Query(self.queries[0]).explainplan()
+        self.assertNotIn("execution: ", explanation)
+
+
+    def test06_apichange(self):
+        """Planner - Indices reflect changes made through the API"""
+        q = fql.Query('SELECT pos WHERE class = "' + self.pos.cls + '"')
+        count = len(q(self.doc))
+        self.assertTrue(count > 0)
+        self.pos.cls = "fqlplanner"
+        self.assertEqual(len(q(self.doc)), count - 1)
+        self.assertEqual(fql.Query('SELECT pos WHERE class = "fqlplanner"')(self.doc), [self.pos])
+        self.assertEqual(fql.Query('SELECT pos WHERE class = "fqlplanner"')(self.doc), self.unplanned('SELECT pos WHERE class = "fqlplanner"')(self.doc))
+
+class Test6Batch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = []
+        for name in ('a','b'):
+            self.files.append(os.path.join(self.tmpdir, name + '.xml'))
+            with io.open(self.files[-1],'w',encoding='utf-8') as f:
+                f.write(FOLIAEXAMPLE)
+        self.doc = folia.Document(string=FOLIAEXAMPLE)
+        self.word = next(self.doc.words())
+        self.query = 'SELECT w WHERE text = "' + self.word.text() + '"'
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test01_select(self):
+        """Batch - Select in parallel"""
+        expected = [ e.json() for e in fql.Query(self.query)(self.doc) ]
+        results = list(fql.BatchQuery(self.query, self.files, threads=2))
+        self.assertEqual(sorted( result.filename for result in results), self.files)
+        for result in results:
+            self.assertTrue(result.ok())
+            self.assertEqual(result.results, expected)
+            self.assertFalse(result.saved)
+
+    def test02_errors(self):
+        """Batch - Errors are reported per document"""
+        with io.open(os.path.join(self.tmpdir, 'broken.xml'),'w',encoding='utf-8') as f:
+            f.write("<FoLiA")
+        results = list(fql.BatchQuery(self.query, folia.Corpus(self.tmpdir), threads=1, ordered=True))
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len([ result for result in results if not result.ok() ]), 1)
+        lines = [ json.loads(line) for line in fql.BatchQuery(self.query, folia.CorpusFiles(self.tmpdir), threads=1).jsonlines() ]
+        self.assertEqual(sorted( line['error'] is None for line in lines), [False, True, True])
+        batch = fql.BatchQuery(self.query, folia.Corpus(self.tmpdir, textvalidation=True, debug=False), threads=1, debug=False, textvalidation=False)
+        self.assertEqual(batch.documentkwargs, {'textvalidation': False, 'debug': False})
+        batch = fql.BatchQuery(self.query, folia.CorpusFiles(self.tmpdir, textvalidation=True), threads=1)
+        self.assertEqual(batch.documentkwargs, {'textvalidation': True})
+        self.assertEqual(len([ result for result in batch if result.ok() ]), 2)
+
+    def test03_edit(self):
+        """Batch - Documents changed by the query are saved"""
+        outputdir = os.path.join(self.tmpdir, 'out')
+        results = list(fql.BatchQuery('EDIT w WHERE id = "' + self.word.id + '" WITH text "batch"', self.files, threads=1, outputdir=outputdir))
+        self.assertTrue(all( result.saved for result in results ))
+        self.assertEqual(folia.Document(file=os.path.join(outputdir, 'a.xml'))[self.word.id].text(), "batch")
+        self.assertEqual(folia.Document(file=self.files[0])[self.word.id].text(), self.word.text())
+
+    def test04_reader(self):
+        """Batch - Evaluation within streamed sentences"""
+        expected = [ e.json() for e in fql.Query(self.query)(self.doc) ]
+        results = list(fql.BatchQuery(self.query, self.files, threads=1, reader=True))
+        self.assertEqual(results[0].results, expected)
+        self.assertRaises(fql.QueryError, fql.BatchQuery, self.query + " FOR s", self.files, reader=True)
+        self.assertRaises(fql.QueryError, fql.BatchQuery, 'EDIT w WITH class "x"', self.files, reader=True)
+
+
+class Test7Prepared(unittest.TestCase):
+    def setUp(self):
+        self.doc = folia.Document(string=FOLIAEXAMPLE)
+        self.words = list(self.doc.words())
+
+    def test01_parse(self):
+        """Prepared - Parsing placeholders"""
+        q = fql.Query('SELECT w WHERE text = ? AND :pos = ? FOR s ID ?')
+        self.assertEqual(len(q.parameters), 3)
+        self.assertEqual([ p.index for p in q.parameters ], [0,1,2])
+        q = fql.Query('SELECT w WHERE text = "?"')
+        self.assertEqual(q.parameters, [])
+        self.assertRaises(fql.QueryError, q.bind, "x")
+
+    def test02_select(self):
+        """Prepared - Binding values to a select query"""
+        q = fql.Query('SELECT w WHERE text = ? FOR s ID ?')
+        self.assertRaises(fql.QueryError, q, self.doc)
+        for word in self.words[:5]:
+            expected = fql.Query('SELECT w WHERE text = "' + word.text() + '" FOR s ID "' + word.sentence().id + '"')(self.doc)
+            self.assertEqual(q.bind(word.text(), word.sentence().id)(self.doc), expected)
+        q = fql.Query('SELECT w WHERE text = ?')
+        self.assertEqual(q.bind('"; DELETE w')(self.doc), [])
+
+    def test03_edit(self):
+        """Prepared - Binding values to an edit query, executed repeatedly"""
+        q = fql.Query('EDIT w WHERE id = ? WITH text ? confidence ?')
+        for i, word in enumerate(self.words[:3]):
+            self.assertEqual(q.bind(word.id, "word" + str(i), "0.5")(self.doc), [word])
+            self.assertEqual(word.text(), "word" + str(i))
+            self.assertEqual(word.confidence, 0.5)
+        self.assertEqual(q.bind(self.words[0].id, "again", "1")(self.doc), [self.words[0]])
+        self.assertEqual(self.words[0].text(), "again")
+
+    def test04_cache(self):
+        """Prepared - Cache of parsed queries"""
+        cache = fql.QueryCache(2)
+        q = cache('SELECT w WHERE text = ?')
+        self.assertIs(cache('SELECT w WHERE text = ?'), q)
+        context = fql.Context()
+        context.format = "json"
+        self.assertIsNot(cache('SELECT w WHERE text = ?', context), q)
+        cache('SELECT w WHERE class = ?')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual([ key[0] for key in cache.queries ], ['SELECT w WHERE text = ?', 'SELECT w WHERE class = ?']) #the one in the default context was dropped
+        self.assertIsNot(cache('SELECT w WHERE text = ?'), q)
+        self.assertEqual((cache.hits, cache.misses), (1,4))
+
+    def test05_explain(self):
+        """Prepared - Explaining the plan of a query with unbound placeholders"""
+        explanation = fql.Query('SELECT w WHERE text = ?').explainplan()
+        self.assertIn('access: index on text = "?"', explanation)
+        explanation = fql.Query('SELECT w OF ? ID ?').explainplan()
+        self.assertIn('w OF ?', explanation)
+        self.assertIn('access: document index on ID ?', explanation)
+        explanation = fql.Query('EXPLAIN SELECT w WHERE text = ?')(None)
+        self.assertIn('access: index on text = "?"', explanation)
+        self.assertNotIn("execution: ", explanation)
+        self.assertRaises(fql.QueryError, fql.Query('EXPLAIN SELECT w WHERE text = ?'), self.doc)
+
+
+    def test06_threads(self):
+        """Prepared - A cached query bound and executed by multiple threads at once"""
+        cache = fql.QueryCache()
+        words = self.words[:20]
+        expected = dict( (word.text(), fql.Query('SELECT w WHERE text = "' + word.text() + '"')(self.doc)) for word in words )
+        errors = []
+        def work():
+            try:
+                for _ in range(5):
+                    for word in words:
+                        if cache('SELECT w WHERE text = ?').bind(word.text())(self.doc) != expected[word.text()]:
+                            errors.append(word.text())
+            except Exception as e: #pylint: disable=broad-except
+                errors.append(e)
+        threads = [ threading.Thread(target=work) for _ in range(8) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertFalse(cache('SELECT w WHERE text = ?').parameters[0].bound)
+
 if os.path.exists('../../FoLiA'):
     FOLIAPATH = '../../FoLiA/'
 elif os.path.exists('../FoLiA'):
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+#---------------------------------------------------------------
+# PyNLPl - Test Units for Language Models
+#   by Maarten van Gompel, ILK, Universiteit van Tilburg
+#   http://ilk.uvt.nl/~mvgompel
+#   proycon AT anaproy DOT nl
+#
+#   Licensed under GPLv3
+#
+#----------------------------------------------------------------
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import sys
+import os
+import io
+import unittest
+import tempfile
+import shutil
+
+from pynlpl.lm.lm import ARPALanguageModel
+if sys.version >= '3':
+    from pynlpl.lm.server import AsyncLMServer
+    from pynlpl.lm.client import LMClient, PooledLMClient
+
+ARPA = """
+\\data\\
+ngram 1=6
+ngram 2=5
+ngram 3=2
+
+\\1-grams:
+-1.0792\t<unk>
+-1.2041\t</s>
+-99\t<s>\t-0.3010
+-0.6990\tthe\t-0.2218
+-0.9031\tcat\t-0.1761
+-1.0000\tsat\t-0.0969
+
+\\2-grams:
+-0.3010\t<s> the\t-0.1249
+-0.4771\tthe cat\t-0.0458
+-0.2218\tcat sat
+-0.6021\tsat </s>
+-0.9031\tthe sat
+
+\\3-grams:
+-0.1761\t<s> the cat
+-0.0969\tthe cat sat
+
+\\end\\
+"""
+
+sentences = [ ("<s>","the","cat","sat","</s>"), ("<s>","the","sat","</s>"), ("<s>","cat","the","dog","</s>") ]
+
+
+class ARPALanguageModelTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.filename = os.path.join(cls.tmpdir, 'test.arpa')
+        with io.open(cls.filename, 'w', encoding='utf-8') as f:
+            f.write(ARPA)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test001_simple(self):
+        """ARPA Language Model - Simple mode"""
+        lm = ARPALanguageModel(self.filename)
+        self.assertEqual(lm.order, 3)
+        self.assertEqual(len(lm), 13)
+        self.assertEqual(lm.total, {1: 6, 2: 5, 3: 2})
+        self.assertAlmostEqual(lm.scoreword('cat', ('<s>','the')), -0.1761 * 2.302585092994046, places=6)
+
+    def test002_compact(self):
+        """ARPA Language Model - Compact mode gives the same scores as simple mode"""
+        simple = ARPALanguageModel(self.filename)
+        compact = ARPALanguageModel(self.filename, mode='compact')
+        self.assertEqual(compact.order, 3)
+        self.assertEqual(len(compact), 13)
+        for sentence in sentences:
+            self.assertAlmostEqual(simple.score(sentence[1:], sentence[:1]), compact.score(sentence[1:], sentence[:1]), places=5)
+            for i in range(1, len(sentence)):
+                self.assertAlmostEqual(simple.scoreword(sentence[i], sentence[max(0,i-2):i]), compact.scoreword(sentence[i], sentence[max(0,i-2):i]), places=5)
+        self.assertRaises(KeyError, compact.ngrams.prob, ('the','dog'))
+        self.assertRaises(KeyError, compact.ngrams.prob, ('sat','cat'))
+
+    def test003_cache(self):
+        """ARPA Language Model - Compact mode with binary cache"""
+        cache = os.path.join(self.tmpdir, 'test.bin')
+        compact = ARPALanguageModel(self.filename, mode='compact', cache=cache)
+        self.assertTrue(os.path.exists(cache))
+        cached = ARPALanguageModel(self.filename, mode='compact', cache=cache)
+        self.assertTrue(cached.ngrams._mmap is not None)
+        self.assertEqual(cached.order, 3)
+        self.assertEqual(cached.total, {1: 6, 2: 5, 3: 2})
+        self.assertEqual(len(cached), 13)
+        for sentence in sentences:
+            self.assertEqual(compact.score(sentence[1:], sentence[:1]), cached.score(sentence[1:], sentence[:1]))
+        #the binary file can also be loaded directly
+        direct = ARPALanguageModel(cache, mode='compact')
+        self.assertEqual(direct.scoreword('sat', ('the','cat')), compact.scoreword('sat', ('the','cat')))
+        #a cache for another base is rebuilt
+        log10 = ARPALanguageModel(self.filename, mode='compact', cache=cache, base_e=False)
+        self.assertAlmostEqual(log10.scoreword('sat', ('the','cat')), -0.0969, places=5)
+        self.assertRaises(ValueError, ARPALanguageModel, cache, mode='compact')
+
+    def test004_state(self):
+        """ARPA Language Model - Stateful scoring"""
+        for mode in ('simple','compact'):
+            lm = ARPALanguageModel(self.filename, mode=mode)
+            for sentence in sentences:
+                #reference: score each word with its full history
+                expected = sum( lm.scoreword(sentence[i], sentence[:i]) for i in range(1, len(sentence)) )
+                self.assertAlmostEqual(lm.score(sentence[1:], sentence[:1]), expected, places=10)
+                state = lm.beginstate()
+                total = 0
+                for word in sentence[1:]:
+                    score, state = lm.scorestate(word, state)
+                    total += score
+                self.assertAlmostEqual(total, expected, places=10)
+            #only the longest context present in the model is retained
+            self.assertEqual(lm.scorestate('cat', lm.beginstate())[1], ARPALanguageModel.State(('cat',)))
+            self.assertEqual(lm.scorestate('cat', lm.historystate(('<s>','the')))[1], ARPALanguageModel.State(('the','cat')))
+            self.assertEqual(lm.scorestate('dog', lm.beginstate())[1], lm.nullstate())
+
+    def test005_batch(self):
+        """ARPA Language Model - Batch scoring"""
+        lm = ARPALanguageModel(self.filename)
+        cache = {}
+        scores = lm.batchscore([ sentence[1:] for sentence in sentences ], ('<s>',), cache)
+        self.assertEqual(scores, [ lm.score(sentence[1:], ('<s>',)) for sentence in sentences ])
+        self.assertTrue((lm.beginstate(), 'the') in cache)
+        lm = ARPALanguageModel(self.filename, dounknown=False)
+        self.assertRaises(KeyError, lm.batchscore, [('the','dog')])
+
+    @unittest.skipIf(sys.version < '3', "Python 3 only")
+    def test006_asyncserver(self):
+        """ARPA Language Model - Asynchronous server with pipelining clients"""
+        lm = ARPALanguageModel(self.filename)
+        server = AsyncLMServer(lm, 0, host='localhost').runinbackground()
+        try:
+            client = PooledLMClient('localhost', server.port, size=2, window=3)
+            batch = [ sentence[1:] for sentence in sentences ] * 5
+            expected = [ lm.score(sentence) for sentence in batch ]
+            for score, expectedscore in zip(client.scoresentences(batch), expected):
+                self.assertAlmostEqual(score, expectedscore, places=10)
+            self.assertAlmostEqual(client.scoresentence("the cat"), lm.score(("the","cat")), places=10)
+            client.close()
+        finally:
+            server.stop()
+        server = AsyncLMServer(lm, 0, n=3, host='localhost').runinbackground()
+        try:
+            client = PooledLMClient('localhost', server.port, n=3)
+            self.assertAlmostEqual(client['<s> the cat'], lm.scoreword('cat', ('<s>','the')), places=10)
+            self.assertAlmostEqual(client.scorengrams([('the','cat','sat'), ('a','b','c')])[1], lm.scoreword('c', ('a','b')), places=10) #unknown
+            client.close()
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,7 +19,7 @@ import unittest
 sys.path.append(sys.path[0] + '/../../')
 os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
 
-from pynlpl.search import AbstractSearchState, DepthFirstSearch, BreadthFirstSearch, IterativeDeepening, HillClimbingSearch, BeamSearch
+from pynlpl.search import AbstractSearchState, DepthFirstSearch, BreadthFirstSearch, IterativeDeepening, HillClimbingSearch, BeamSearch, BeamedBestFirstSearch
 
 
 class ReorderSearchState(AbstractSearchState):
@@ -169,8 +169,70 @@ class BeamSearchTest(unittest.TestCase):
         search = BeamSearch(informedinputstate, beamsize=3, graph=True, minimize=True,debug=False)
         solution = search.searchbest()
         self.assertEqual(str(solution),str(goalstate))
-        
-        
+
+    def test_parallel(self):
+        """Beam Search with parallel expansion (threads and processes)"""
+        global informedinputstate, goalstate
+        reference = BeamSearch(informedinputstate, beamsize=3, graph=True, minimize=True)
+        referencesolutions = [ str(x) for x in reference.searchall() ]
+        for pool in ('thread','process'):
+            search = BeamSearch(informedinputstate, beamsize=3, graph=True, minimize=True, workers=2, pool=pool)
+            self.assertEqual( [ str(x) for x in search.searchall() ], referencesolutions)
+            self.assertEqual( search.traversalsize(), reference.traversalsize() )
+
+    def test_boundedmemory(self):
+        """Beam Search with bounded visited memory (LRU and bloom filter)"""
+        global informedinputstate, goalstate
+        for visitedmemory in ('lru','bloom'):
+            search = BeamSearch(informedinputstate, beamsize=2, graph=True, minimize=True, maxvisited=100, visitedmemory=visitedmemory)
+            solution = search.searchbest()
+            self.assertEqual( str(solution), str(goalstate) )
+            self.assertTrue( search.visited(informedinputstate) )
+            self.assertTrue( len(search._visited) <= 100 )
+
+    def test_statistics(self):
+        """Beam Search statistics"""
+        global informedinputstate, goalstate
+        search = BeamSearch(informedinputstate, beamsize=2, graph=True, minimize=True)
+        search.searchall()
+        self.assertTrue( len(search.stats) > 1 )
+        self.assertEqual( search.stats[0].fringe, 1 )
+        self.assertEqual( search.stats[0].expanded, 1 )
+        self.assertEqual( search.stats[0].generated, 5 )
+        self.assertEqual( search.stats[0].kept, 2 )
+        self.assertEqual( search.stats[0].pruned, 3 )
+        self.assertEqual( search.stats[0].fill(), 1.0 )
+        self.assertEqual( search.stats.expanded, search.traversalsize() )
+        self.assertEqual( search.stats.solutions, search.solutions )
+        for roundstats in search.stats:
+            self.assertEqual( roundstats.offered, roundstats.kept + roundstats.pruned )
+            self.assertTrue( roundstats.duration >= roundstats.expandtime )
+        self.assertTrue( str(search.stats).startswith("Round #1: 1 expanded") )
+
+    def test_statistics_fringepruned(self):
+        """Beam Search statistics (pruning the fringe itself)"""
+        global informedinputstate
+        search = BeamedBestFirstSearch(informedinputstate, beamsize=2, graph=True, minimize=True)
+        search.stats.newround()
+        for state in informedinputstate.expand():
+            search.fringe.append(state)
+        search.prune(informedinputstate)
+        self.assertEqual( len(search.fringe), 2 )
+        self.assertEqual( search.stats[0].fringepruned, 4 )
+        self.assertEqual( search.stats[0].pruned, 0 )
+        self.assertEqual( search.stats.fringepruned, 4 )
+
+class SearchStatisticsTest(unittest.TestCase):
+    def test_statistics(self):
+        """Search statistics (Breadth First Search)"""
+        global inputstate, goalstate
+        search = BreadthFirstSearch(inputstate ,graph=True, goal=goalstate)
+        search.searchfirst()
+        self.assertEqual( len(search.stats), 1 )
+        self.assertEqual( search.stats.expanded, search.traversalsize() )
+        self.assertEqual( search.stats.solutions, 1 )
+        self.assertEqual( search.stats.generated, search.stats.offered )
+
 
 if __name__ == '__main__':
     unittest.main()
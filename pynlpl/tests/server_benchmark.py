@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+# Benchmark of the phrase table servers: requests per second for the Twisted
+# server and the asynchronous server, with a blocking client (one request at a
+# time) and a pooled pipelining client.
+#
+# Usage: server_benchmark.py [phrasetable] [requests]
+# (a synthetic phrase table is generated if none is given)
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+import io
+import time
+import random
+import socket
+import subprocess
+import tempfile
+import shutil
+
+from pynlpl.formats.moses import PhraseTable, PhraseTableClient, twistedimported
+if sys.version >= '3':
+    from pynlpl.formats.moses import AsyncPhraseTableServer, PooledPhraseTableClient
+
+
+def serve(kind, filename, port):
+    phrasetable = PhraseTable(filename, quiet=True)
+    if kind == 'twisted':
+        from pynlpl.formats.moses import PhraseTableServer
+        PhraseTableServer(phrasetable, port)
+    else:
+        AsyncPhraseTableServer(phrasetable, port).run()
+
+
+def freeport():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('localhost', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def startserver(kind, filename):
+    port = freeport()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', kind, filename, str(port)])
+    for _ in range(600): #wait for the phrase table to be loaded
+        try:
+            socket.create_connection(('localhost', port)).close()
+            return process, port
+        except socket.error:
+            time.sleep(0.1)
+    process.kill()
+    raise Exception("Server did not start")
+
+
+def generate(filename, size=100000):
+    words = [ "w" + str(i) for i in range(5000) ]
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        for i in range(size):
+            source = " ".join(random.sample(words, random.randint(1,3)))
+            target = " ".join(random.sample(words, random.randint(1,3)))
+            f.write(source + " ||| " + target + " ||| 0.1 0.2 0.3 0.4 2.718 ||| 0-0 |||\n")
+
+
+def report(label, count, duration):
+    print(label + " -- " + str(count) + " requests took " + str(round(duration,4)) + "s -- " + str(int(count / duration)) + " requests/s")
+
+
+def benchmark(kind, filename, phrases):
+    process, port = startserver(kind, filename)
+    try:
+        client = PhraseTableClient('localhost', port)
+        begin = time.time()
+        for phrase in phrases:
+            try:
+                client[phrase]
+            except KeyError:
+                pass
+        report(kind + " server, blocking client", len(phrases), time.time() - begin)
+        client.socket.close()
+        if sys.version >= '3':
+            for size in (1, 4):
+                client = PooledPhraseTableClient('localhost', port, size=size)
+                begin = time.time()
+                client.lookup(phrases)
+                report(kind + " server, pipelining client with " + str(size) + " connection(s)", len(phrases), time.time() - begin)
+                client.close()
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == 'serve':
+        serve(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        if len(sys.argv) > 1:
+            filename = sys.argv[1]
+        else:
+            filename = os.path.join(tmpdir, 'phrase-table')
+            generate(filename)
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+        sources = [ source for source, _ in PhraseTable(filename, quiet=True) ]
+        phrases = [ random.choice(sources) for _ in range(count) ]
+
+        if twistedimported:
+            benchmark('twisted', filename, phrases)
+        else:
+            print("Twisted is not installed, skipping the Twisted server", file=sys.stderr)
+        if sys.version >= '3':
+            benchmark('async', filename, phrases)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main()
@@ -18,8 +18,13 @@ from __future__ import absolute_import
 import sys
 import os
 import unittest
+import io
+import tempfile
+import shutil
+import math
+import itertools
 
-from pynlpl.statistics import FrequencyList, HiddenMarkovModel
+from pynlpl.statistics import FrequencyList, Distribution, HiddenMarkovModel, ExternalFrequencyCounter, EncodedFrequencyList, EncodedDistribution, Vocabulary, CooccurrenceCounter, levenshtein, bandedlevenshtein, myerslevenshtein, BKTree, DeletionIndex
 from pynlpl.textprocessors import Windower
 
 
@@ -75,6 +80,234 @@ class BigramFrequencyListTest(unittest.TestCase):
             f.append(Windower(sentence,2))
         self.assertTrue(( f[('is','a')] == 2 and  f[('this','is')] == 1))
 
+class EncodedFrequencyListTest(unittest.TestCase):
+    def setUp(self):
+        self.f = FrequencyList(None, False)
+        self.e = EncodedFrequencyList(None, False)
+        for sentence in sentences:
+            self.f.append(sentence)
+            self.e.append(sentence)
+
+    def test_counts(self):
+        """Encoded Frequency List - same counts as dictionary-based list"""
+        self.assertEqual(self.e.total, 13)
+        self.assertEqual(len(self.e), len(self.f))
+        self.assertEqual(self.e['this'], 2)
+        self.assertEqual(self.e['unseen'], 0)
+        self.assertEqual(self.e.p('sentence'), self.f.p('sentence'))
+        self.assertEqual(dict(self.e.items()), dict(self.f.items()))
+        self.assertEqual([ count for _, count in self.e ], [ count for _, count in self.f ])
+        self.assertTrue(self.e == self.f)
+        self.assertTrue(self.f == self.e)
+
+    def test_ngrams(self):
+        """Encoded Frequency List - n-grams"""
+        f = FrequencyList()
+        e = EncodedFrequencyList()
+        for sentence in sentences:
+            f.append(Windower(sentence,2))
+            e.append(Windower(sentence,2))
+        self.assertEqual(e[('is','a')], 2)
+        self.assertEqual(dict(e.items()), dict(f.items()))
+
+    def test_add(self):
+        """Encoded Frequency List - merging lists with a shared vocabulary"""
+        vocabulary = Vocabulary()
+        e1 = EncodedFrequencyList(sentences[0], vocabulary=vocabulary)
+        e2 = EncodedFrequencyList(sentences[1], vocabulary=vocabulary)
+        merged = e1 + e2
+        self.assertEqual(merged.total, 13)
+        self.assertEqual(merged['sentence'], 2)
+        self.assertEqual(dict(merged.items()), dict((FrequencyList(sentences[0]) + FrequencyList(sentences[1])).items()))
+        self.assertEqual(dict((e1 + FrequencyList(sentences[1])).items()), dict(merged.items()))
+
+    def test_distribution(self):
+        """Encoded Frequency List - vectorised distribution"""
+        d = Distribution(self.f)
+        ed = Distribution(self.e)
+        self.assertTrue(isinstance(ed, EncodedDistribution))
+        self.assertAlmostEqual(ed.entropy(), d.entropy())
+        self.assertAlmostEqual(ed.perplexity(), d.perplexity())
+        self.assertAlmostEqual(ed.maxentropy(), d.maxentropy())
+        self.assertAlmostEqual(ed['sentence'], d['sentence'])
+        self.assertEqual(len(ed), len(d))
+        self.assertEqual(ed.mode(), d.mode())
+        for type in ('sentence', 'this', '.'):
+            self.assertAlmostEqual(ed[type], d[type])
+            self.assertAlmostEqual(ed.information(type), d.information(type))
+            self.assertAlmostEqual(ed.poslog(type), d.poslog(type))
+        self.assertRaises(KeyError, ed.information, 'unseen')
+        self.assertEqual(list(ed), list(d))
+        self.assertEqual(dict(ed.items()), dict(d.items()))
+        self.assertEqual(sorted(ed.keys()), sorted(d.keys()))
+        self.assertEqual(sorted(ed.values()), sorted(d.values()))
+        self.assertEqual(list(ed.output()), list(d.output()))
+        self.assertEqual(list(ed.output(freqlist=self.f)), list(d.output(freqlist=self.f)))
+        self.assertEqual(str(ed), str(d))
+        self.assertEqual(eval(repr(ed)), eval(repr(d)))
+        for base in (2, 10, None):
+            self.assertAlmostEqual(ed.entropy(base), d.entropy(base))
+            self.assertAlmostEqual(ed.maxentropy(base), d.maxentropy(base))
+        self.assertAlmostEqual(ed.perplexity(10), d.perplexity(10))
+        ed = Distribution(self.e, None)
+        d = Distribution(self.f, None)
+        self.assertAlmostEqual(ed.information('sentence'), d.information('sentence'))
+
+
+class CooccurrenceCounterTest(unittest.TestCase):
+    def setUp(self):
+        self.counter = CooccurrenceCounter(casesensitive=False)
+        for sentence in sentences:
+            self.counter.addsentence(sentence)
+
+    def test_counts(self):
+        """Co-occurrence - joint counts"""
+        self.assertEqual(self.counter.total, 13)
+        self.assertEqual(self.counter.jointcount('is','a'), 2)
+        self.assertEqual(self.counter.jointcount('this','.'), 2)
+        self.assertEqual(self.counter.jointcount('.','this'), 0)
+        self.assertEqual(self.counter.jointcount('this','test'), 1)
+
+    def test_window(self):
+        """Co-occurrence - window"""
+        counter = CooccurrenceCounter(window=1)
+        for sentence in sentences:
+            counter.addsentence(sentence)
+        self.assertEqual(counter.jointcount('is','a'), 2)
+        self.assertEqual(counter.jointcount('This','a'), 0)
+
+    def test_measures(self):
+        """Co-occurrence - association measures"""
+        scores = dict( ((word, word2), (score, jointcount, adjacentcount)) for word, word2, score, jointcount, adjacentcount in self.counter.associations('pmi', mincount=2) )
+        self.assertEqual(len(scores), 8)
+        self.assertAlmostEqual(scores[('is','a')][0], math.log((2/13) / ((2/13) * (2/13))))
+        self.assertEqual(scores[('is','a')][1:], (2,2))
+        npmi = dict( ((word, word2), score) for word, word2, score, _, _ in self.counter.associations('npmi', mincount=2) )
+        self.assertAlmostEqual(npmi[('is','a')], 1.0)
+        dice = dict( ((word, word2), score) for word, word2, score, _, _ in self.counter.associations('dice') )
+        self.assertAlmostEqual(dice[('this','test')], 2 * 1 / (2 + 1))
+        self.assertEqual(len(list(self.counter.associations('pmi', mincount=2, discountadjacency=True))), 7)
+
+    def test_topk(self):
+        """Co-occurrence - top-k per word"""
+        results = list(self.counter.associations('pmi', topk=1))
+        self.assertEqual(len(results), len(set( word for word, _, _, _, _ in results )))
+        scores = [ score for _, _, score, _, _ in results ]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_sharded(self):
+        """Co-occurrence - sharded counting with multiple processes"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'corpus.txt')
+            with io.open(filename,'w',encoding='utf-8') as f:
+                for i in range(50):
+                    for sentence in sentences:
+                        f.write(" ".join(sentence) + "\n")
+            counter = CooccurrenceCounter(casesensitive=False, shardsize=256)
+            counter.count(filename, workers=2)
+            self.assertEqual(counter.total, 13 * 50)
+            self.assertEqual(counter.jointcount('is','a'), 100)
+            self.assertEqual(counter.jointcount('this','.'), 100)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class LevenshteinTest(unittest.TestCase):
+    def test_distance(self):
+        """Levenshtein - distances"""
+        for f in (levenshtein, bandedlevenshtein, myerslevenshtein):
+            self.assertEqual(f("kitten","sitting"), 3)
+            self.assertEqual(f("","abc"), 3)
+            self.assertEqual(f("abc","abc"), 0)
+            self.assertEqual(f("flaw","lawn"), 2)
+
+    def test_maxdistance(self):
+        """Levenshtein - maximum distance"""
+        for f in (levenshtein, bandedlevenshtein, myerslevenshtein):
+            self.assertEqual(f("kitten","sitting", 2), 3)
+            self.assertEqual(f("sitting","kitten", 3), 3)
+            self.assertEqual(f("a","abcdef", 1), 2)
+        self.assertEqual(levenshtein("a" * 100 + "b", "a" * 100 + "c", 1), 1)
+        self.assertEqual(levenshtein("a" * 100, "b" * 100, 5), 6)
+
+    def test_bktree(self):
+        """Levenshtein - BK-tree search"""
+        tree = BKTree(["book","books","cake","boo","boon","cook","cape","cart"])
+        self.assertEqual(len(tree), 8)
+        self.assertEqual(tree.search("bo", 1), [("boo",1)])
+        self.assertEqual(tree.search("book", 1), [("book",0),("boo",1),("books",1),("boon",1),("cook",1)])
+        self.assertTrue("cake" in tree)
+        self.assertFalse("cakes" in tree)
+
+    def test_deletionindex(self):
+        """Levenshtein - deletion index search"""
+        lexicon = ["book","books","cake","boo","boon","cook","cape","cart"]
+        index = DeletionIndex(lexicon, 2)
+        tree = BKTree(lexicon)
+        for query in ("bo","book","caek","kart","xyz"):
+            self.assertEqual(index.search(query, 2), tree.search(query, 2))
+        self.assertEqual(index.batchsearch(["cake","bok"], 1), [[("cake",0),("cape",1)],[("boo",1),("book",1)]])
+        self.assertRaises(ValueError, index.search, "cake", 3)
+        index = DeletionIndex(lexicon * 2, 2)
+        self.assertEqual(len(index), 8)
+        self.assertFalse(index.add("cake"))
+        self.assertEqual(index.search("book", 2), BKTree(lexicon * 2).search("book", 2))
+
+
+class ExternalFrequencyCounterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'corpus.txt')
+        self.lines = [ " ".join(sentence) for sentence in sentences ] * 50 + ["This is a sentence too .", "", "A final test ."]
+        with io.open(self.filename,'w',encoding='utf-8') as f:
+            for line in self.lines:
+                f.write(line + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def reference(self, n, casesensitive=True):
+        freqlist = FrequencyList(None, casesensitive)
+        for line in self.lines:
+            if n > 1:
+                freqlist.append(Windower(line.split(),n))
+            else:
+                freqlist.append(line.split())
+        return freqlist
+
+    def test_unigrams(self):
+        """External frequency counting (unigrams, spilling, small shards)"""
+        counter = ExternalFrequencyCounter(1, maxtypes=3, shardsize=100, tmpdir=self.tmpdir)
+        outputfile = os.path.join(self.tmpdir, 'freqlist')
+        counter.count(self.filename, outputfile)
+        reference = self.reference(1)
+        freqlist = FrequencyList()
+        freqlist.load(outputfile)
+        self.assertEqual(freqlist, reference)
+        self.assertEqual(counter.tokens, reference.total)
+        self.assertEqual(counter.types, len(reference))
+        with io.open(outputfile,'r',encoding='utf-8') as f:
+            types = [ line.split("\t")[0] for line in f ]
+        self.assertEqual(types, sorted(types))
+        self.assertEqual(os.listdir(self.tmpdir), ['corpus.txt','freqlist']) #temporary files are cleaned up
+
+    def test_trigrams_parallel(self):
+        """External frequency counting (case-insensitive trigrams, worker processes, multi-pass merge, min count)"""
+        counter = ExternalFrequencyCounter(3, False, maxtypes=5, workers=2, shardsize=200, tmpdir=self.tmpdir, fanin=3)
+        outputfile = os.path.join(self.tmpdir, 'freqlist')
+        counter.count([self.filename], outputfile)
+        reference = self.reference(3, False)
+        freqlist = FrequencyList()
+        freqlist.load(outputfile, ngrams=True)
+        self.assertEqual(freqlist, reference)
+        self.assertEqual(freqlist[('this','is','a')], 51)
+        freqlist = FrequencyList()
+        freqlist.load(outputfile, mincount=2, ngrams=True)
+        self.assertEqual(len(freqlist), len([ type for type, count in reference.items() if count >= 2 ]))
+        self.assertFalse(('a','final','test') in freqlist)
+
+
 class HMMTest(unittest.TestCase):
     def test_viterbi(self):
         """Viterbi decode run on Hidden Markov Model"""
@@ -88,6 +321,59 @@ class HMMTest(unittest.TestCase):
         prob, path = hmm.viterbi(observations)
         self.assertEqual( path, ['sunny', 'rainy', 'rainy'])
         self.assertEqual( prob, 0.01344)
-        
+
+    def weatherhmm(self):
+        hmm = HiddenMarkovModel('start')
+        hmm.settransitions('start',{'rainy':0.6,'sunny':0.4})
+        hmm.settransitions('rainy',{'rainy':0.7,'sunny':0.3})
+        hmm.settransitions('sunny',{'rainy':0.4,'sunny':0.6})
+        hmm.setemission('rainy', {'walk': 0.1, 'shop': 0.4, 'clean': 0.5})
+        hmm.setemission('sunny', {'walk': 0.6, 'shop': 0.3, 'clean': 0.1})
+        return hmm
+
+    def test_logviterbi(self):
+        """Log-space Viterbi decode on Hidden Markov Model"""
+        hmm = self.weatherhmm()
+        logprob, path = hmm.logviterbi(['walk', 'shop', 'clean'])
+        self.assertEqual( path, ['sunny', 'rainy', 'rainy'])
+        self.assertAlmostEqual( logprob, math.log(0.01344))
+        #long sequences do not underflow
+        logprob, path = hmm.logviterbi(['walk', 'shop', 'clean'] * 1000)
+        self.assertEqual( len(path), 3000)
+        self.assertTrue( logprob > -10000)
+        self.assertEqual( hmm.viterbi(['walk', 'shop', 'clean'] * 1000)[0], 0) #underflows
+        self.assertEqual( hmm.logviterbi(['walk', 'fly']), (-float('inf'), []))
+
+    def test_batchviterbi(self):
+        """Batch Viterbi decode on Hidden Markov Model"""
+        hmm = self.weatherhmm()
+        sequences = [['walk', 'shop', 'clean'], ['clean'], [], ['shop', 'shop', 'walk', 'walk', 'clean'], ['walk','fly']]
+        results = hmm.batchviterbi(sequences)
+        self.assertEqual(len(results), len(sequences))
+        for observations, (logprob, path) in zip(sequences, results):
+            expectedlogprob, expectedpath = hmm.logviterbi(observations)
+            self.assertEqual(path, expectedpath)
+            self.assertAlmostEqual(logprob, expectedlogprob)
+
+    def test_forwardbackward(self):
+        """Forward-backward and posterior decoding on Hidden Markov Model"""
+        hmm = self.weatherhmm()
+        observations = ['walk', 'shop', 'clean']
+        #brute force: sum over all paths
+        total = 0
+        for path in itertools.product(['rainy','sunny'], repeat=3):
+            p = hmm.edges_out['start'][path[0]]
+            for t, state in enumerate(path):
+                if t > 0: p *= hmm.edges_out[path[t-1]][state]
+                p *= hmm.edges_toobservables[state][observations[t]]
+            total += p
+        logprob, alpha = hmm.forward(observations)
+        self.assertAlmostEqual( logprob, math.log(total))
+        posteriors = hmm.posteriors(observations)
+        self.assertEqual( posteriors.shape, (3,2))
+        for t in range(3):
+            self.assertAlmostEqual( posteriors[t].sum(), 1.0)
+        self.assertEqual( hmm.posteriordecode(observations), ['sunny', 'rainy', 'rainy'])
+
 if __name__ == '__main__':
     unittest.main()
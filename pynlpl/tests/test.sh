@@ -61,6 +61,14 @@ if [ $? -ne 0 ]; then
 fi
 
 
+echo "Testing language models">&2
+$PYTHON lm.py
+if [ $? -ne 0 ]; then
+    echo "Test failed!!!" >&2
+    GOOD=0
+fi
+
+
 echo "Testing formats">&2
 $PYTHON formats.py
 if [ $? -ne 0 ]; then
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+###############################################################
+#  PyNLPl - Batch FQL query tool
+#       by Maarten van Gompel (proycon)
+#       Centre for Language Studies
+#       Radboud University Nijmegen
+#
+#       Executes an FoLiA Query Language (FQL) query on many
+#       FoLiA documents in parallel, outputs JSON lines
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import sys
+import os
+import json
+
+from pynlpl.formats import folia, fql
+
+def main():
+    parser = argparse.ArgumentParser(description="Execute an FQL query on FoLiA documents in parallel. Outputs one line of JSON per document, with the results, the time spent and any error.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-q','--query', type=str, help="The FQL query", action='store', required=True)
+    parser.add_argument('-j','--threads', help="Number of worker processes (default: number of cores)", type=int, action='store', default=None)
+    parser.add_argument('-e','--extension', help="Extension of FoLiA documents in directories", type=str, action='store', default="xml")
+    parser.add_argument('-o','--outputdir', help="Save documents changed by the query in this directory rather than overwriting them", type=str, action='store', default=None)
+    parser.add_argument('-n','--dryrun', help="Do not save documents changed by the query", action='store_true', default=False)
+    parser.add_argument('-r','--reader', help="Read documents in a streaming fashion and evaluate the query within each sentence (only for queries that do not change documents)", action='store_true', default=False)
+    parser.add_argument('-O','--ordered', help="Output in the order of the input files rather than as soon as a document is processed", action='store_true', default=False)
+    parser.add_argument('files', type=str, nargs='+', help="FoLiA documents, or directories containing them")
+
+    args = parser.parse_args()
+
+    files = []
+    for filename in args.files:
+        if os.path.isdir(filename):
+            files += list(folia.CorpusFiles(filename, args.extension))
+        else:
+            files.append(filename)
+
+    context = fql.Context()
+    context.format = "json"
+    try:
+        batch = fql.BatchQuery(fql.Query(args.query, context), files, args.threads, not args.dryrun, args.outputdir, args.reader, args.ordered)
+    except (fql.SyntaxError, fql.QueryError) as e:
+        print("Invalid query: " + str(e), file=sys.stderr)
+        sys.exit(2)
+
+    documents = failed = results = 0
+    for result in batch:
+        print(json.dumps(result.json()))
+        documents += 1
+        results += len(result)
+        if not result.ok():
+            failed += 1
+            print(result, file=sys.stderr)
+
+    print("Documents: ", documents, file=sys.stderr)
+    print("Failed:    ", failed, file=sys.stderr)
+    print("Results:   ", results, file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -22,7 +22,7 @@ import argparse
 import sys
 import io
 
-from pynlpl.statistics import FrequencyList, Distribution
+from pynlpl.statistics import FrequencyList, Distribution, ExternalFrequencyCounter
 from pynlpl.textprocessors import Windower, crude_tokenizer
 
 def main():
@@ -30,6 +30,11 @@ def main():
     parser.add_argument('-n','--ngramsize', help="N-gram size", type=int, action='store',default=1)
     parser.add_argument('-i','--caseinsensitive', help="Case insensitive", action="store_true")
     parser.add_argument('-e','--encoding', help="Character encoding", type=str, action='store',default='utf-8')
+    parser.add_argument('-x','--external', help="Count in external memory (for corpora whose frequency list does not fit in memory) and write the counts, sorted by type, to the specified file", type=str, action='store',default="")
+    parser.add_argument('-j','--workers', help="Number of worker processes (external mode only)", type=int, action='store',default=1)
+    parser.add_argument('-m','--maxtypes', help="Maximum number of types to hold in memory per worker before spilling to disk (external mode only)", type=int, action='store',default=1000000)
+    parser.add_argument('-t','--mincount', help="Minimum count for a type to be included (external mode only)", type=int, action='store',default=1)
+    parser.add_argument('--tmpdir', help="Directory for temporary files (external mode only)", type=str, action='store',default=None)
     parser.add_argument('files', type=str, nargs='+', help="The data sets to sample from, must be of equal size (i.e., same number of lines)")
 
 
@@ -39,6 +44,13 @@ def main():
         print("No files specified", file=sys.stderr)
         sys.exit(1)
 
+    if args.external:
+        counter = ExternalFrequencyCounter(args.ngramsize, not args.caseinsensitive, args.maxtypes, args.workers, tmpdir=args.tmpdir, encoding=args.encoding, tokenizer=crude_tokenizer)
+        counter.count(args.files, args.external, args.mincount)
+        print("Tokens:           ", counter.tokens,file=sys.stderr)
+        print("Types:            ", counter.types,file=sys.stderr)
+        return
+
     freqlist = FrequencyList(None, args.caseinsensitive)
     for filename in args.files:
         f = io.open(filename,'r',encoding=args.encoding)
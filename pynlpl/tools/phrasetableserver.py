@@ -13,6 +13,8 @@
 ###############################################################   
 
 
+from __future__ import print_function
+
 import sys
 import os
 
@@ -20,14 +22,27 @@ if __name__ == "__main__":
     sys.path.append(sys.path[0] + '/../..')
     os.environ['PYTHONPATH'] = sys.path[0] + '/../..'
     
-from pynlpl.formats.moses import PhraseTable, PhraseTableServer
+from pynlpl.formats.moses import PhraseTable, MappedPhraseTable
+
+if sys.version >= '3':
+    from pynlpl.formats.moses import AsyncPhraseTableServer
+    def PhraseTableServer(phrasetable, port):
+        AsyncPhraseTableServer(phrasetable, port).run()
+else:
+    from pynlpl.formats.moses import PhraseTableServer
 
 
 
 
 if len(sys.argv) != 3:
-    print >>sys.stderr,"Syntax: phrasetableserver.py phrasetable port"
+    print("Syntax: phrasetableserver.py phrasetable port",file=sys.stderr)
+    print("The phrase table may be a Moses phrase table, or a memory-mapped phrase table built with MappedPhraseTable.build()",file=sys.stderr)
     sys.exit(2)
 else:    
     port = int(sys.argv[2])
-    PhraseTableServer(PhraseTable(sys.argv[1]), port)
+    with open(sys.argv[1],'rb') as f:
+        mapped = (f.read(len(MappedPhraseTable.MAGIC)) == MappedPhraseTable.MAGIC)
+    if mapped:
+        PhraseTableServer(MappedPhraseTable(sys.argv[1]), port)
+    else:
+        PhraseTableServer(PhraseTable(sys.argv[1]), port)
@@ -17,6 +17,7 @@ if sys.version > '3':
             'pynlpl-computepmi = pynlpl.tools.computepmi:main',
             'pynlpl-sampler = pynlpl.tools.sampler:main',
             'pynlpl-makefreqlist = pynlpl.tools.freqlist:main',
+            'pynlpl-foliaquery = pynlpl.tools.foliaquery:main',
         ]
     }
 